@@ -0,0 +1,29 @@
+import argparse
+import sqlite3
+import sys
+import database
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica ou reconstrói as tabelas de resumo de lançamentos.")
+    parser.add_argument('acao', choices=['verificar', 'reconstruir'])
+    parser.add_argument('--banco', default=database.DATABASE_NAME, help="Arquivo SQLite a usar.")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.banco)
+    database.create_tables(conn)
+    if args.acao == 'reconstruir':
+        database.reconstruir_agregados(conn)
+        print("Tabelas de resumo reconstruídas a partir dos lançamentos.")
+    divergencias = database.verificar_agregados(conn)
+    conn.close()
+
+    for divergencia in divergencias:
+        print(f"{divergencia['tabela']} {divergencia['chave']}: esperado {divergencia['esperado']}, atual {divergencia['atual']}")
+    if divergencias:
+        print(f"{len(divergencias)} divergência(s) encontrada(s). Rode 'python agregados.py reconstruir' para corrigir.")
+        return 1
+    print("Tabelas de resumo consistentes com os lançamentos.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+import argparse
+import functools
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+import database
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # dependência opcional: só a exportação e o modo analítico precisam dela
+    pa = None
+
+# Liga o modo analítico ao iniciar o processo (ex.: OBRA_SNAPSHOT_ANALITICO=snapshot_analitico streamlit run app.py)
+VARIAVEL_AMBIENTE = 'OBRA_SNAPSHOT_ANALITICO'
+DIRETORIO_PADRAO = 'snapshot_analitico'
+TAMANHO_LOTE = 100_000
+FORMATOS = ('arrow', 'parquet')
+ARQUIVO_META = 'snapshot.json'
+MAX_RESULTADOS = 256  # resultados memorizados por snapshot
+
+# Colunas exportadas de cada tabela e seus tipos no Arrow. Datas continuam como
+# texto 'AAAA-MM-DD', como no SQLite; o mês sai dos sete primeiros caracteres.
+if pa is not None:
+    SCHEMAS = {
+        'projetos': pa.schema([
+            ('id', pa.int64()), ('nome', pa.string()), ('descricao', pa.string()),
+            ('data_inicio', pa.string()), ('data_fim_prevista', pa.string()), ('data_cadastro', pa.string()),
+        ]),
+        'fornecedores': pa.schema([
+            ('id', pa.int64()), ('nome', pa.string()), ('cnpj', pa.string()), ('telefone', pa.string()),
+            ('email', pa.string()), ('endereco', pa.string()), ('data_cadastro', pa.string()),
+        ]),
+        'orcamentos': pa.schema([
+            ('id', pa.int64()), ('projeto_id', pa.int64()), ('categoria', pa.string()), ('valor_orcado', pa.float64()),
+            ('data_cadastro', pa.string()), ('data_atualizacao', pa.string()),
+        ]),
+        'lancamentos': pa.schema([
+            ('id', pa.int64()), ('projeto_id', pa.int64()), ('data_lancamento', pa.string()),
+            ('classificacao', pa.string()), ('emissao', pa.string()), ('documento', pa.string()),
+            ('fornecedor_id', pa.int64()), ('descricao', pa.string()), ('valor_faturado', pa.float64()),
+            ('data_cadastro', pa.string()),
+        ]),
+    }
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise ImportError("O snapshot colunar precisa do pacote pyarrow (pip install pyarrow).")
+
+def _coluna(valores, tipo):
+    try:
+        return pa.array(valores, type=tipo)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # SQLite aceita qualquer tipo em qualquer coluna (ex.: documento gravado como número)
+        if pa.types.is_string(tipo):
+            return pa.array([None if v is None else str(v) for v in valores], type=tipo)
+        return pa.array(pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce'), type=tipo, from_pandas=True)
+
+def _exportar_tabela(conn, tabela, schema, destinos, tamanho_lote):
+    """Lê a tabela em lotes e grava cada lote nos arquivos de destino; retorna o número de linhas."""
+    escritores = []
+    for formato, caminho in destinos.items():
+        if formato == 'arrow':
+            escritores.append(ipc.new_file(caminho, schema))
+        else:
+            escritores.append(pq.ParquetWriter(caminho, schema))
+    linhas = 0
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(schema.names)} FROM {tabela} ORDER BY rowid")
+        while True:
+            registros = cursor.fetchmany(tamanho_lote)
+            if not registros:
+                break
+            colunas = list(zip(*registros))
+            lote = pa.record_batch([_coluna(list(c), campo.type) for c, campo in zip(colunas, schema)], schema=schema)
+            for escritor in escritores:
+                escritor.write_batch(lote)
+            linhas += len(registros)
+    finally:
+        for escritor in escritores:
+            escritor.close()
+    return linhas
+
+def exportar_snapshot(banco, diretorio=DIRETORIO_PADRAO, formatos=FORMATOS, tamanho_lote=TAMANHO_LOTE):
+    """Exporta projetos, fornecedores, orçamentos e lançamentos para arquivos colunares.
+
+    As tabelas são lidas numa única transação de leitura (todas do mesmo instante),
+    em lotes de `tamanho_lote` linhas, e gravadas em Arrow IPC (lido por memory map
+    no modo analítico) e/ou Parquet. Os arquivos só substituem os anteriores ao
+    final, e o snapshot.json é o último a ser gravado.
+    Retorna os metadados do snapshot.
+    """
+    _exigir_pyarrow()
+    inicio = time.perf_counter()
+    os.makedirs(diretorio, exist_ok=True)
+    conn = sqlite3.connect(f"file:{banco}?mode=ro", uri=True)
+    temporarios = {}
+    try:
+        conn.execute("BEGIN")
+        meta = {
+            'criado_em': datetime.now().isoformat(timespec='seconds'),
+            'banco': os.path.abspath(banco),
+            'versao_schema': database.versao_schema(conn),
+            'linhas': {},
+        }
+        for tabela, schema in SCHEMAS.items():
+            destinos = {formato: os.path.join(diretorio, f".{tabela}.{formato}.tmp") for formato in formatos}
+            temporarios.update({caminho: os.path.join(diretorio, f"{tabela}.{formato}") for formato, caminho in destinos.items()})
+            meta['linhas'][tabela] = _exportar_tabela(conn, tabela, schema, destinos, tamanho_lote)
+        conn.rollback()
+    except BaseException:
+        for caminho in temporarios:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        raise
+    finally:
+        conn.close()
+    for temporario, final in temporarios.items():
+        os.replace(temporario, final)
+    meta['formatos'] = list(formatos)
+    meta['segundos'] = round(time.perf_counter() - inicio, 2)
+    caminho_meta = os.path.join(diretorio, ARQUIVO_META)
+    with open(caminho_meta + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(caminho_meta + '.tmp', caminho_meta)
+    return meta
+
+class SnapshotColunar:
+    """Snapshot exportado, aberto por memory map: as colunas são lidas direto dos
+    arquivos .arrow, sem cópia, e só as páginas usadas chegam à memória.
+
+    Um snapshot exportado só em Parquet também serve: cada tabela é lida por
+    inteiro (descomprimida) no primeiro uso.
+    """
+
+    def __init__(self, diretorio):
+        _exigir_pyarrow()
+        self.diretorio = diretorio
+        with open(os.path.join(diretorio, ARQUIVO_META), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self._tabelas = {}
+        self._lock = threading.Lock()
+        self._resultados = {}
+
+    def _ler(self, nome):
+        if 'arrow' in self.meta.get('formatos', FORMATOS):
+            return ipc.open_file(pa.memory_map(os.path.join(self.diretorio, f"{nome}.arrow"))).read_all()
+        return pq.read_table(os.path.join(self.diretorio, f"{nome}.parquet"), memory_map=True)
+
+    def tabela(self, nome, colunas=None):
+        # As páginas consultam o snapshot de várias threads (carregar_em_paralelo)
+        with self._lock:
+            if nome not in self._tabelas:
+                self._tabelas[nome] = self._ler(nome)
+            tabela = self._tabelas[nome]
+        return tabela.select(colunas) if colunas else tabela
+
+    def consultar(self, funcao, args=(), kwargs=None):
+        """Retorna `funcao(self, *args, **kwargs)`, memorizado: o snapshot não muda depois de aberto."""
+        kwargs = kwargs or {}
+        chave = (funcao.__name__, args, tuple(sorted(kwargs.items())))
+        with self._lock:
+            resultado = self._resultados.get(chave)
+        if resultado is None:
+            resultado = funcao(self, *args, **kwargs)
+            with self._lock:
+                if len(self._resultados) >= MAX_RESULTADOS:
+                    del self._resultados[next(iter(self._resultados))]
+                self._resultados[chave] = resultado
+        # As páginas podem alterar o DataFrame recebido; o memorizado não pode mudar junto
+        return resultado.copy() if hasattr(resultado, 'copy') else resultado
+
+# Consultas do database.py reescritas sobre o snapshot; mesmas colunas e ordem do SQLite
+
+def gasto_por_classificacao(snapshot):
+    df = (
+        snapshot.tabela('lancamentos', ['classificacao', 'valor_faturado'])
+        .group_by('classificacao').aggregate([('valor_faturado', 'sum')])
+        .to_pandas()
+        .rename(columns={'valor_faturado_sum': 'total_gasto'})
+    )
+    return df[['classificacao', 'total_gasto']].sort_values('total_gasto', ascending=False, ignore_index=True)
+
+def gasto_por_fornecedor(snapshot):
+    por_fornecedor = (
+        snapshot.tabela('lancamentos', ['fornecedor_id', 'valor_faturado'])
+        .filter(pc.field('fornecedor_id').is_valid())
+        .group_by('fornecedor_id').aggregate([('valor_faturado', 'sum')])
+        .join(snapshot.tabela('fornecedores', ['id', 'nome']), 'fornecedor_id', 'id')
+        .to_pandas()
+    )
+    return (
+        por_fornecedor.groupby('nome', as_index=False)['valor_faturado_sum'].sum()
+        .rename(columns={'nome': 'fornecedor', 'valor_faturado_sum': 'total_gasto'})
+        .sort_values('total_gasto', ascending=False, ignore_index=True)
+    )
+
+def _gastos_projeto_classificacao(snapshot):
+    return (
+        snapshot.tabela('lancamentos', ['projeto_id', 'classificacao', 'valor_faturado'])
+        .group_by(['projeto_id', 'classificacao']).aggregate([('valor_faturado', 'sum')])
+        .to_pandas()
+        .rename(columns={'valor_faturado_sum': 'total_gasto'})
+    )
+
+def _orcamento_por_projeto(snapshot):
+    return (
+        snapshot.tabela('orcamentos', ['projeto_id', 'valor_orcado'])
+        .group_by('projeto_id').aggregate([('valor_orcado', 'sum')])
+        .to_pandas()
+        .rename(columns={'valor_orcado_sum': 'total_orcado'})
+    )
+
+def comparativo_orcamento_gasto_por_projeto(snapshot):
+    projetos = snapshot.tabela('projetos', ['id', 'nome']).to_pandas()
+    gasto = _gastos_projeto_classificacao(snapshot).groupby('projeto_id')['total_gasto'].sum()
+    orcado = _orcamento_por_projeto(snapshot).set_index('projeto_id')['total_orcado']
+    return pd.DataFrame({
+        'Projeto': projetos['nome'],
+        'total_orcado': projetos['id'].map(orcado).fillna(0).to_numpy(dtype=float),
+        'total_gasto': projetos['id'].map(gasto).fillna(0).to_numpy(dtype=float),
+    })
+
+def matriz_orcamento_gasto(snapshot):
+    projetos = snapshot.tabela('projetos', ['id', 'nome']).to_pandas().rename(columns={'id': 'projeto_id', 'nome': 'projeto_nome'})
+    orcado = (
+        snapshot.tabela('orcamentos', ['projeto_id', 'categoria', 'valor_orcado'])
+        .group_by(['projeto_id', 'categoria']).aggregate([('valor_orcado', 'sum')])
+        .to_pandas()
+        .rename(columns={'valor_orcado_sum': 'total_orcado'})
+    )
+    gasto = _gastos_projeto_classificacao(snapshot).rename(columns={'classificacao': 'categoria'})
+    df = (
+        orcado.merge(gasto, on=['projeto_id', 'categoria'], how='outer')
+        .fillna({'total_orcado': 0.0, 'total_gasto': 0.0})
+        .merge(projetos, on='projeto_id')
+        .sort_values(['projeto_id', 'categoria'], ignore_index=True)
+    )
+    df['variacao'] = df['total_orcado'] - df['total_gasto']
+    return df[['projeto_id', 'projeto_nome', 'categoria', 'total_orcado', 'total_gasto', 'variacao']]
+
+def resumo_projetos(snapshot):
+    return snapshot.tabela('projetos', ['nome', 'data_inicio', 'data_fim_prevista']).to_pandas()
+
+def gastos_mensais(snapshot, projeto_id=None, classificacao=None, data_inicio=None, data_fim=None):
+    lancamentos = snapshot.tabela('lancamentos', ['projeto_id', 'classificacao', 'data_lancamento', 'valor_faturado'])
+    condicoes = []
+    if projeto_id:
+        condicoes.append(pc.field('projeto_id') == projeto_id)
+    if classificacao:
+        condicoes.append(pc.field('classificacao') == classificacao)
+    if data_inicio:
+        condicoes.append(pc.field('data_lancamento') >= data_inicio.strftime('%Y-%m-%d'))
+    if data_fim:
+        condicoes.append(pc.field('data_lancamento') <= data_fim.strftime('%Y-%m-%d'))
+    if condicoes:
+        lancamentos = lancamentos.filter(functools.reduce(lambda a, b: a & b, condicoes))
+    df = (
+        pa.table({
+            'mes_ano': pc.utf8_slice_codeunits(lancamentos['data_lancamento'], 0, 7),
+            'total_gasto': lancamentos['valor_faturado'],
+        })
+        .group_by('mes_ano').aggregate([('total_gasto', 'sum')])
+        .sort_by('mes_ano')
+        .to_pandas()
+        .rename(columns={'total_gasto_sum': 'total_gasto'})
+    )
+    return database.completar_meses(
+        df[['mes_ano', 'total_gasto']],
+        data_inicio.strftime('%Y-%m') if data_inicio else None,
+        data_fim.strftime('%Y-%m') if data_fim else None,
+    )
+
+def orcamento_total_projeto(snapshot, projeto_id):
+    orcamentos = snapshot.tabela('orcamentos', ['projeto_id', 'valor_orcado']).filter(pc.field('projeto_id') == projeto_id)
+    return pc.sum(orcamentos['valor_orcado']).as_py() if orcamentos.num_rows else 0.0
+
+def dashboard_snapshot(snapshot):
+    return database.SnapshotDashboard(
+        snapshot.tabela('projetos', ['id', 'nome']).to_pandas(),
+        _orcamento_por_projeto(snapshot),
+        _gastos_projeto_classificacao(snapshot),
+        gasto_por_fornecedor(snapshot),
+    )
+
+# Função de database.py -> implementação sobre o snapshot
+FUNCOES_ANALITICAS = {
+    'get_gasto_por_classificacao': gasto_por_classificacao,
+    'get_gasto_por_fornecedor': gasto_por_fornecedor,
+    'get_comparativo_orcamento_gasto_por_projeto': comparativo_orcamento_gasto_por_projeto,
+    'get_matriz_orcamento_gasto': matriz_orcamento_gasto,
+    'get_resumo_projetos': resumo_projetos,
+    'get_gastos_mensais': gastos_mensais,
+    'get_orcamento_total_projeto': orcamento_total_projeto,
+    'get_dashboard_snapshot': dashboard_snapshot,
+}
+
+_lock = threading.Lock()
+_originais = {}  # nome -> função original de database, enquanto o modo analítico está ativo
+_snapshot = None
+_mtime_meta = None
+
+def _snapshot_atual():
+    """Retorna o snapshot aberto, reabrindo-o se uma nova exportação o substituiu."""
+    global _snapshot, _mtime_meta
+    with _lock:
+        mtime = os.stat(os.path.join(_snapshot.diretorio, ARQUIVO_META)).st_mtime_ns
+        if mtime != _mtime_meta:
+            _snapshot = SnapshotColunar(_snapshot.diretorio)
+            _mtime_meta = mtime
+        return _snapshot
+
+def _sobre_snapshot(nome, funcao):
+    @functools.wraps(getattr(database, nome))
+    def analitica(conn, *args, **kwargs):
+        if kwargs.pop('incluir_historico', False):
+            # O snapshot só cobre o banco principal: com o histórico, a consulta vai ao SQLite
+            return _originais[nome](conn, *args, incluir_historico=True, **kwargs)
+        # A conexão é ignorada: a leitura vem do snapshot e não disputa o banco com as escritas
+        return _snapshot_atual().consultar(funcao, args, kwargs)
+    return analitica
+
+def ativar_modo_analitico(diretorio=DIRETORIO_PADRAO):
+    """Passa as funções de agregação de database a ler o snapshot em `diretorio`.
+
+    Cadastros e demais escritas continuam no SQLite.
+    """
+    global _snapshot, _mtime_meta
+    _exigir_pyarrow()
+    snapshot = SnapshotColunar(diretorio)
+    with _lock:
+        _snapshot = snapshot
+        _mtime_meta = os.stat(os.path.join(diretorio, ARQUIVO_META)).st_mtime_ns
+        for nome, funcao in FUNCOES_ANALITICAS.items():
+            _originais.setdefault(nome, getattr(database, nome))
+            setattr(database, nome, _sobre_snapshot(nome, funcao))
+
+def desativar_modo_analitico():
+    """Volta a ler do SQLite."""
+    global _snapshot
+    with _lock:
+        for nome, funcao in _originais.items():
+            setattr(database, nome, funcao)
+        _originais.clear()
+        _snapshot = None
+
+def versao():
+    """Identifica o snapshot em uso (None fora do modo analítico); serve de chave para caches."""
+    if not _originais:
+        return None
+    snapshot = _snapshot_atual()
+    return (snapshot.diretorio, snapshot.meta['criado_em'], _mtime_meta)
+
+def descricao():
+    """Texto curto sobre o snapshot em uso, para as páginas; None fora do modo analítico."""
+    if not _originais:
+        return None
+    meta = _snapshot_atual().meta
+    return f"Modo analítico: dados do snapshot de {meta['criado_em']} ({meta['linhas']['lancamentos']} lançamentos)."
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta as tabelas do banco para um snapshot colunar (Arrow/Parquet).")
+    parser.add_argument('--banco', default=database.DATABASE_NAME, help="Arquivo SQLite de origem.")
+    parser.add_argument('--destino', default=DIRETORIO_PADRAO, help="Diretório do snapshot.")
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="Linhas lidas e gravadas por lote.")
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS, default=list(FORMATOS))
+    args = parser.parse_args()
+
+    try:
+        meta = exportar_snapshot(args.banco, args.destino, args.formatos, args.lote)
+    except ImportError as e:
+        print(f"Erro: {e}")
+        return 1
+    for tabela, linhas in meta['linhas'].items():
+        print(f"{tabela}: {linhas} linha(s)")
+    print(f"Snapshot gravado em {args.destino} em {meta['segundos']:.1f}s.")
+    return 0
+
+if os.environ.get(VARIAVEL_AMBIENTE):
+    ativar_modo_analitico(os.environ[VARIAVEL_AMBIENTE])
+
+if __name__ == "__main__":
+    sys.exit(main())
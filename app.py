@@ -1,4 +1,9 @@
 import streamlit as st
+import analitico  # liga o modo analítico se OBRA_SNAPSHOT_ANALITICO estiver definida
+import database
+
+# Abre o pool de conexões e aplica as migrações pendentes do schema, uma vez por processo
+database.get_pool()
 
 st.title("Controle de Obras")
 st.sidebar.success("Selecione uma página acima.")
\ No newline at end of file
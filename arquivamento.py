@@ -0,0 +1,125 @@
+import argparse
+import sqlite3
+import sys
+import time
+from datetime import date
+import database
+
+PROJETOS_POR_LOTE = 20  # projetos movidos por transação
+
+def projetos_encerrados(conn, data_referencia=None):
+    """Ids dos projetos com data_fim_prevista anterior a `data_referencia` (hoje, por padrão)
+    que ainda têm lançamentos ou orçamentos no banco principal."""
+    data_referencia = data_referencia or date.today()
+    return [linha[0] for linha in conn.execute(
+        """
+        SELECT p.id FROM projetos p
+        WHERE p.data_fim_prevista < ?
+          AND (EXISTS (SELECT 1 FROM lancamentos l WHERE l.projeto_id = p.id)
+               OR EXISTS (SELECT 1 FROM orcamentos o WHERE o.projeto_id = p.id))
+        ORDER BY p.id
+        """,
+        (data_referencia.strftime('%Y-%m-%d'),)
+    )]
+
+def preparar_historico(caminho):
+    """Cria o banco histórico, ou aplica as migrações pendentes, com o mesmo schema do principal."""
+    conn = database.configurar_conexao(sqlite3.connect(caminho))
+    try:
+        database.migrar(conn)
+    finally:
+        conn.close()
+
+def _colunas(conn, tabela, excluir=()):
+    # table_info não lista colunas geradas (ex.: mes), que o destino calcula sozinho
+    return ', '.join(linha[1] for linha in conn.execute(f"PRAGMA main.table_info({tabela})") if linha[1] not in excluir)
+
+def arquivar_projetos(conn, projeto_ids, projetos_por_lote=PROJETOS_POR_LOTE):
+    """Move lançamentos e orçamentos dos `projeto_ids` para o banco histórico, em lotes de projetos.
+
+    Cada lote é copiado e confirmado no histórico antes de ser apagado do banco principal:
+    uma interrupção no meio deixa linhas nos dois bancos (arquivar de novo as resolve), nunca
+    as perde. Os triggers de cada banco mantêm resumos e busca; o cadastro do projeto é
+    copiado e continua no principal. Retorna as contagens movidas e o tempo gasto.
+    """
+    inicio = time.perf_counter()
+    caminho = database.caminho_historico(conn)
+    if caminho is None:
+        raise ValueError("Bancos em memória não têm banco histórico.")
+    preparar_historico(caminho)
+    colunas_projetos = _colunas(conn, 'projetos')
+    colunas_lancamentos = _colunas(conn, 'lancamentos')
+    colunas_orcamentos = _colunas(conn, 'orcamentos', excluir=('id',))  # o histórico numera os seus
+    movidos = {'projetos': 0, 'lancamentos': 0, 'orcamentos': 0}
+
+    conn.execute("ATTACH DATABASE ? AS historico", (caminho,))
+    try:
+        for i in range(0, len(projeto_ids), projetos_por_lote):
+            lote = list(projeto_ids[i:i + projetos_por_lote])
+            filtro = f"IN ({', '.join('?' * len(lote))})"
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    f"INSERT OR REPLACE INTO historico.projetos ({colunas_projetos}) SELECT {colunas_projetos} FROM main.projetos WHERE id {filtro}",
+                    lote
+                )
+                # OR IGNORE: lançamentos de uma tentativa interrompida já estão lá com o mesmo id
+                conn.execute(
+                    f"INSERT OR IGNORE INTO historico.lancamentos ({colunas_lancamentos}) SELECT {colunas_lancamentos} FROM main.lancamentos WHERE projeto_id {filtro}",
+                    lote
+                )
+                conn.execute(
+                    f"""
+                    INSERT INTO historico.orcamentos ({colunas_orcamentos}) SELECT {colunas_orcamentos} FROM main.orcamentos WHERE projeto_id {filtro}
+                    ON CONFLICT (projeto_id, categoria) DO UPDATE
+                    SET valor_orcado = excluded.valor_orcado, data_atualizacao = excluded.data_atualizacao
+                    """,
+                    lote
+                )
+                conn.commit()
+
+                conn.execute("BEGIN IMMEDIATE")
+                movidos['lancamentos'] += conn.execute(f"DELETE FROM main.lancamentos WHERE projeto_id {filtro}", lote).rowcount
+                movidos['orcamentos'] += conn.execute(f"DELETE FROM main.orcamentos WHERE projeto_id {filtro}", lote).rowcount
+                database.commit_escrita(conn, 'lancamentos', 'orcamentos')
+                movidos['projetos'] += len(lote)
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+    finally:
+        conn.execute("DETACH DATABASE historico")
+    return {**movidos, 'segundos': time.perf_counter() - inicio}
+
+def main():
+    parser = argparse.ArgumentParser(description="Move lançamentos e orçamentos de projetos encerrados para o banco histórico.")
+    parser.add_argument('--banco', default=database.DATABASE_NAME, help="Arquivo SQLite principal.")
+    parser.add_argument('--ate', type=date.fromisoformat, default=date.today(),
+                        help="Arquiva projetos com fim previsto antes desta data (AAAA-MM-DD; padrão: hoje).")
+    parser.add_argument('--projeto', type=int, nargs='+', help="Arquiva estes projetos (encerrados), independente da data.")
+    parser.add_argument('--lote', type=int, default=PROJETOS_POR_LOTE, help="Projetos movidos por transação.")
+    parser.add_argument('--compactar', action='store_true', help="Executa VACUUM no banco principal ao final.")
+    parser.add_argument('--simular', action='store_true', help="Só lista os projetos que seriam arquivados.")
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = args.banco
+    conn = database.create_connection()
+    database.create_tables(conn)
+    try:
+        projeto_ids = args.projeto or projetos_encerrados(conn, args.ate)
+        if args.simular or not projeto_ids:
+            print(f"{len(projeto_ids)} projeto(s) a arquivar: {projeto_ids}")
+            return 0
+        resultado = arquivar_projetos(conn, projeto_ids, args.lote)
+        print(f"{resultado['projetos']} projeto(s) arquivado(s) em {database.caminho_historico(conn)}: "
+              f"{resultado['lancamentos']} lançamento(s) e {resultado['orcamentos']} orçamento(s) em {resultado['segundos']:.1f}s.")
+        if args.compactar:
+            inicio = time.perf_counter()
+            conn.execute("VACUUM")
+            print(f"Banco principal compactado em {time.perf_counter() - inicio:.1f}s.")
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
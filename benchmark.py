@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime
+import numpy as np
+import database
+import populate
+import verificar_planos
+
+TAMANHOS_PADRAO = [1_000, 100_000, 1_000_000]
+REPETICOES_PADRAO = 20
+LIMITE_REGRESSAO = 0.20  # 20% mais lento que a base
+MINIMO_REGRESSAO_MS = 0.5  # ignora diferenças absolutas menores que isso (ruído)
+SEMENTE = 42
+
+def _parametros_dataset(num_lancamentos):
+    """Número de projetos e fornecedores proporcional ao volume de lançamentos."""
+    return {
+        'num_projetos': max(5, min(500, num_lancamentos // 5000)),
+        'num_fornecedores': max(20, min(5000, num_lancamentos // 200)),
+        'num_lancamentos': num_lancamentos,
+    }
+
+def preparar_banco(diretorio, num_lancamentos, recriar=False):
+    """Gera (ou reaproveita) o banco sintético de `num_lancamentos` lançamentos e retorna o caminho."""
+    caminho = os.path.join(diretorio, f"bench_{num_lancamentos}_{SEMENTE}.db")
+    if os.path.exists(caminho) and not recriar:
+        return caminho
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+    conn = database.configurar_conexao(sqlite3.connect(caminho))
+    populate.gerar_dados(conn, semente=SEMENTE, **_parametros_dataset(num_lancamentos))
+    conn.close()
+    return caminho
+
+def _medir(funcao, repeticoes):
+    """Executa `funcao` e retorna latências (ms), o pico de memória Python (KB) de uma execução extra
+    e a memória ocupada pelo resultado (KB), que é o que fica no cache de consultas."""
+    funcao()  # aquecimento: page cache do SQLite e imports preguiçosos do pandas
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tracemalloc.start()
+    resultado = funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'p50_ms': round(float(np.percentile(tempos, 50)), 3),
+        'p95_ms': round(float(np.percentile(tempos, 95)), 3),
+        'media_ms': round(float(np.mean(tempos)), 3),
+        'pico_memoria_kb': round(pico / 1024, 1),
+        'memoria_resultado_kb': round(database._tamanho_resultado(resultado) / 1024, 1),
+        'repeticoes': repeticoes,
+    }
+
+def _casos_leitura(conn):
+    """Uma chamada por função get_* (sem cache) e por combinação de parâmetros opcionais."""
+    exemplos = verificar_planos.valores_exemplo(conn)
+    casos = {}
+    for nome, funcao in verificar_planos.funcoes_consulta():
+        for kwargs in verificar_planos.chamadas_exemplo(funcao, exemplos):
+            rotulo = nome + ('(' + ', '.join(f"{k}={v!r}" for k, v in kwargs.items()) + ')' if kwargs else '')
+            casos[rotulo] = (lambda f, kw: lambda: f(conn, **kw))(funcao, kwargs)
+    return casos
+
+SESSOES_ESCRITA = 8
+ESCRITAS_POR_SESSAO = 50
+
+def _escritas_concorrentes(escrever):
+    """Executa `escrever()` ESCRITAS_POR_SESSAO vezes em cada uma de SESSOES_ESCRITA threads."""
+    def sessao():
+        for _ in range(ESCRITAS_POR_SESSAO):
+            escrever()
+    threads = [threading.Thread(target=sessao) for _ in range(SESSOES_ESCRITA)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def _salvar_com_conexao_escrita(pool, lancamento):
+    with pool.escrita() as conn:
+        database.salvar_lancamento(conn, *lancamento)
+
+def _casos_escrita(conn, pool, fila):
+    """Caminhos de escrita; cada execução grava dados novos para não colidir em chaves únicas.
+
+    Os casos concorrentes comparam sessões disputando a conexão de escrita do `pool`
+    com as mesmas sessões enviando para a `fila` (group commit).
+    """
+    exemplos = verificar_planos.valores_exemplo(conn)
+    projeto_id = exemplos['projeto_id']
+    fornecedor_id = conn.execute("SELECT MIN(id) FROM fornecedores").fetchone()[0]
+    contador = iter(range(10 ** 9))
+    hoje = date.today()
+    lancamento = (projeto_id, hoje, exemplos['classificacao'], hoje, 'NF-BENCH', fornecedor_id, 'Benchmark', 123.45)
+    lote = [
+        (projeto_id, hoje.isoformat(), exemplos['classificacao'], None, 'NF-LOTE', fornecedor_id, 'Benchmark', 10.0)
+    ] * 1000
+    return {
+        'salvar_lancamento': lambda: database.salvar_lancamento(conn, *lancamento),
+        'salvar_fornecedor': lambda: database.salvar_fornecedor(
+            conn, 'Fornecedor Benchmark', f"BENCH-{next(contador)}", '', '', ''
+        ),
+        'salvar_projeto': lambda: database.salvar_projeto(conn, 'Projeto Benchmark', '', hoje, hoje),
+        'salvar_orcamento': lambda: database.salvar_orcamento(conn, projeto_id, exemplos['classificacao'], 1000.0 + next(contador)),
+        'salvar_orcamentos(8 categorias)': lambda: database.salvar_orcamentos(
+            conn, projeto_id, dict.fromkeys(database.CATEGORIAS_ORCAMENTO, 1000.0 + next(contador))
+        ),
+        'salvar_lancamentos_em_lote(1000)': lambda: database.salvar_lancamentos_em_lote(conn, [lote]),
+        f'salvar_lancamento {SESSOES_ESCRITA}x{ESCRITAS_POR_SESSAO} conexao_escrita': lambda: _escritas_concorrentes(
+            lambda: _salvar_com_conexao_escrita(pool, lancamento)
+        ),
+        f'salvar_lancamento {SESSOES_ESCRITA}x{ESCRITAS_POR_SESSAO} fila_escrita': lambda: _escritas_concorrentes(
+            lambda: fila.enviar(database.salvar_lancamento, *lancamento).result()
+        ),
+    }
+
+def executar(tamanhos, repeticoes, diretorio, recriar=False, filtro=None):
+    """Mede todas as funções de leitura e escrita em cada tamanho de banco."""
+    resultados = []
+    for tamanho in tamanhos:
+        caminho = preparar_banco(diretorio, tamanho, recriar)
+        # Leituras no banco original; escritas numa cópia, para o dataset continuar reprodutível
+        conn = database.configurar_conexao(sqlite3.connect(caminho))
+        database.create_tables(conn)
+        casos = [('leitura', _casos_leitura(conn), conn)]
+        copia = os.path.join(diretorio, f"bench_{tamanho}_escrita.db")
+        shutil.copyfile(caminho, copia)
+        conn_escrita = database.configurar_conexao(sqlite3.connect(copia))
+        pool_escrita = database.PoolConexoes(copia)
+        fila_escrita = database.FilaEscrita(pool_escrita)
+        casos.append(('escrita', _casos_escrita(conn_escrita, pool_escrita, fila_escrita), conn_escrita))
+
+        for tipo, funcoes, _ in casos:
+            for nome, funcao in funcoes.items():
+                if filtro and filtro not in nome:
+                    continue
+                # Consultas pesadas em bancos grandes não precisam de tantas repetições
+                medicao = _medir(funcao, repeticoes if tamanho < 1_000_000 else max(3, repeticoes // 4))
+                resultados.append({'tamanho': tamanho, 'tipo': tipo, 'funcao': nome, **medicao})
+                print(f"{tamanho:>9} {tipo:<8} {nome:<60} p50={medicao['p50_ms']:>9.2f}ms p95={medicao['p95_ms']:>9.2f}ms pico={medicao['pico_memoria_kb']:>9.0f}KB resultado={medicao['memoria_resultado_kb']:>9.0f}KB")
+        conn.close()
+        conn_escrita.close()
+        fila_escrita.fechar()
+        pool_escrita.fechar()
+        os.remove(copia)
+    return {
+        'meta': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'semente': SEMENTE,
+        },
+        'resultados': resultados,
+    }
+
+def comparar(base, atual, limite=LIMITE_REGRESSAO, minimo_ms=MINIMO_REGRESSAO_MS):
+    """Compara dois resultados pelo p50 e retorna a lista de regressões acima do limite."""
+    indice_base = {(r['tamanho'], r['funcao']): r for r in base['resultados']}
+    regressoes = []
+    for r in atual['resultados']:
+        anterior = indice_base.get((r['tamanho'], r['funcao']))
+        if anterior is None or anterior['p50_ms'] <= 0:
+            continue
+        variacao = r['p50_ms'] / anterior['p50_ms'] - 1
+        if variacao > limite and r['p50_ms'] - anterior['p50_ms'] > minimo_ms:
+            regressoes.append({
+                'tamanho': r['tamanho'],
+                'funcao': r['funcao'],
+                'p50_base_ms': anterior['p50_ms'],
+                'p50_atual_ms': r['p50_ms'],
+                'variacao': round(variacao, 3),
+            })
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das consultas e escritas de database.py.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    p_executar = subparsers.add_parser('executar', help="Mede as funções e grava o resultado em JSON.")
+    p_executar.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO, help="Quantidades de lançamentos.")
+    p_executar.add_argument('--repeticoes', type=int, default=REPETICOES_PADRAO)
+    p_executar.add_argument('--diretorio', default=os.path.join(tempfile.gettempdir(), 'obra_controle_bench'),
+                            help="Onde ficam os bancos gerados (reaproveitados entre execuções).")
+    p_executar.add_argument('--recriar', action='store_true', help="Gera os bancos novamente.")
+    p_executar.add_argument('--filtro', help="Mede apenas funções cujo nome contenha este texto.")
+    p_executar.add_argument('--saida', default='benchmark.json')
+    p_executar.add_argument('--base', help="JSON de uma execução anterior para comparar.")
+    p_executar.add_argument('--limite', type=float, default=LIMITE_REGRESSAO)
+    p_comparar = subparsers.add_parser('comparar', help="Compara dois JSONs e falha se houver regressão.")
+    p_comparar.add_argument('base')
+    p_comparar.add_argument('atual')
+    p_comparar.add_argument('--limite', type=float, default=LIMITE_REGRESSAO)
+    args = parser.parse_args()
+
+    if args.comando == 'executar':
+        os.makedirs(args.diretorio, exist_ok=True)
+        atual = executar(args.tamanhos, args.repeticoes, args.diretorio, args.recriar, args.filtro)
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(atual, f, ensure_ascii=False, indent=2)
+        print(f"Resultados gravados em {args.saida}.")
+        if not args.base:
+            return 0
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+    else:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.atual, encoding='utf-8') as f:
+            atual = json.load(f)
+
+    regressoes = comparar(base, atual, args.limite)
+    for r in regressoes:
+        print(f"REGRESSÃO {r['tamanho']:>9} {r['funcao']}: {r['p50_base_ms']:.2f}ms -> {r['p50_atual_ms']:.2f}ms (+{r['variacao']:.0%})")
+    if regressoes:
+        return 1
+    print(f"Nenhuma regressão acima de {args.limite:.0%}.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
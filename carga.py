@@ -0,0 +1,391 @@
+import argparse
+import inspect
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+import numpy as np
+import streamlit
+from streamlit.testing.v1 import AppTest
+import benchmark
+import database
+import visualizations
+
+try:
+    import resource
+except ImportError:  # Windows: sem pico de memória do processo
+    resource = None
+
+try:
+    # Internos do Streamlit substituídos por _apptest_em_threads; _verificar_streamlit confere se existem
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.pages_manager import PagesManager
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+except ImportError:
+    Runtime = PagesManager = ScriptCache = app_test = None
+
+STREAMLIT_TESTADO = '1.66'  # versão em que _apptest_em_threads foi validada (a mesma do requirements.txt)
+
+SESSOES_PADRAO = 8
+DURACAO_PADRAO = 60.0  # segundos de carga, sem contar a abertura das sessões
+LANCAMENTOS_PADRAO = 100_000
+TIMEOUT_RERUN = 120  # segundos; uma execução de página mais lenta que isso conta como erro
+PERCENTIS = (50, 90, 95, 99)
+MAX_EXEMPLOS_ERRO = 20
+
+DIRETORIO_APP = os.path.dirname(os.path.abspath(__file__))
+PAGINAS = {
+    'inicio': 'app.py',
+    'visao_geral': 'pages/1_🏠_Visão_Geral.py',
+    'cadastros': 'pages/2_⚙️_Cadastros.py',
+    'dashboard': 'pages/3_📊_Dashboard.py',
+}
+
+# Mistura de fluxos de uma sessão: a maior parte do uso é consulta ao Dashboard
+PESOS_FLUXOS = {
+    'dashboard': 0.5,
+    'cadastro_lancamento': 0.3,
+    'visao_geral': 0.2,
+}
+
+def _rss_mb():
+    """Memória residente atual do processo (MB), ou None fora do Linux."""
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _pico_rss_mb():
+    """Maior memória residente do processo até agora (MB), ou None se o sistema não informar."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)  # macOS informa em bytes
+
+def _classe_sem_reset(classe, atributo):
+    """Subclasse de `classe` em que atribuir `atributo` altera a classe original, exceto para None.
+
+    O AppTest zera alguns atributos de classe a cada rerun; com sessões em threads, isso
+    apagaria o valor que outra sessão está usando no meio da execução.
+    """
+    class Meta(type(classe)):
+        def __setattr__(cls, nome, valor):
+            if nome != atributo:
+                super().__setattr__(nome, valor)
+            elif valor is not None:
+                setattr(classe, atributo, valor)
+    return Meta(classe.__name__, (classe,), {})
+
+def _verificar_streamlit():
+    """Confere se o Streamlit instalado tem os internos que _apptest_em_threads substitui.
+
+    Levanta RuntimeError com o que faltou: numa versão que os mudou, o teste de carga
+    falharia no meio da execução ou mediria outra coisa sem avisar.
+    """
+    necessarios = {
+        'Runtime._instance': (Runtime, '_instance'),
+        'PagesManager.uses_pages_directory': (PagesManager, 'uses_pages_directory'),
+        'ScriptCache.get_bytecode': (ScriptCache, 'get_bytecode'),
+        'app_test.Runtime': (app_test, 'Runtime'),
+        'app_test.PagesManager': (app_test, 'PagesManager'),
+        'app_test.patch_config_options': (app_test, 'patch_config_options'),
+    }
+    problemas = [nome for nome, (objeto, atributo) in necessarios.items() if objeto is None or not hasattr(objeto, atributo)]
+    if not problemas:
+        # O AppTest precisa usar as mesmas classes, senão a substituição não teria efeito
+        problemas += [f"app_test.{nome} não é o {nome} do runtime" for nome, classe in (('Runtime', Runtime), ('PagesManager', PagesManager))
+                      if getattr(app_test, nome) is not classe]
+        if list(inspect.signature(ScriptCache.get_bytecode).parameters) != ['self', 'script_path']:
+            problemas.append("ScriptCache.get_bytecode mudou de assinatura")
+    if problemas:
+        raise RuntimeError(
+            f"O teste de carga depende de internos do Streamlit {STREAMLIT_TESTADO}, e o Streamlit "
+            f"{streamlit.__version__} instalado não os tem como esperado: {'; '.join(problemas)}. "
+            "Instale a versão do requirements.txt."
+        )
+
+@contextmanager
+def _apptest_em_threads():
+    """Permite várias sessões AppTest simultâneas no mesmo processo, como no servidor do Streamlit.
+
+    O AppTest foi feito para uma execução por vez: a cada rerun ele troca estado global do
+    processo, que sessões em threads desfariam umas das outras. Durante o bloco:
+    - cada página é compilada uma vez para todas as sessões (o AppTest recompila a cada
+      rerun, e o `ast` do CPython 3.11 falha com compilações simultâneas);
+    - a opção global.appTest fica ligada do início ao fim, em vez de ligada e desligada por rerun;
+    - o runtime simulado e a detecção da pasta pages/ não são zerados a cada rerun, o que
+      faria outra sessão sem runtime ou executar app.py no lugar da página pedida.
+    """
+    _verificar_streamlit()
+    originais = (ScriptCache.get_bytecode, app_test.Runtime, app_test.PagesManager, app_test.patch_config_options)
+    compartilhado = ScriptCache()
+    ScriptCache.get_bytecode = lambda self, script_path: originais[0](compartilhado, script_path)
+    app_test.Runtime = _classe_sem_reset(Runtime, '_instance')
+    app_test.PagesManager = _classe_sem_reset(PagesManager, 'uses_pages_directory')
+    app_test.patch_config_options = lambda opcoes: nullcontext()
+    try:
+        with originais[3]({'global.appTest': True}):
+            yield
+    finally:
+        ScriptCache.get_bytecode, app_test.Runtime, app_test.PagesManager, app_test.patch_config_options = originais
+        Runtime._instance = None
+        PagesManager.uses_pages_directory = None
+
+def _erro_de_bloqueio(mensagem):
+    mensagem = mensagem.lower()
+    return 'database is locked' in mensagem or 'database is busy' in mensagem or 'database table is locked' in mensagem
+
+class SessaoSimulada:
+    """Um usuário navegando pelo app: um AppTest que começa em app.py e troca de página como no navegador.
+
+    Cada execução de página (abrir, trocar um selectbox, enviar um formulário) é medida e
+    registrada em `registros` como (pagina, acao, ms, erro, bloqueio).
+    """
+
+    def __init__(self, numero, semente, fornecedor_ids, registros, lock):
+        self.numero = numero
+        self.rng = np.random.default_rng(semente + numero)
+        self.fornecedor_ids = fornecedor_ids
+        self.registros = registros
+        self.lock = lock
+        self.lancamentos_gravados = 0
+        self.pagina = 'inicio'
+        self.at = AppTest.from_file(os.path.join(DIRETORIO_APP, PAGINAS['inicio']), default_timeout=TIMEOUT_RERUN)
+        self._executar('abrir', self.at.run)
+
+    def _executar(self, acao, rerun):
+        """Mede uma execução da página atual e registra erros e exceções que ela mostrou."""
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            rerun()
+            mensagens = [e.message for e in self.at.exception] + [e.value for e in self.at.error]
+            if mensagens:
+                erro = mensagens[0]
+        except Exception as e:
+            erro = f"{type(e).__name__}: {e}"
+        ms = (time.perf_counter() - inicio) * 1000
+        with self.lock:
+            self.registros.append((self.pagina, acao, ms, erro, erro is not None and _erro_de_bloqueio(erro)))
+        return erro is None
+
+    def _ir_para(self, pagina):
+        self.pagina = pagina
+        return self._executar('abrir', lambda: self.at.switch_page(PAGINAS[pagina]).run())
+
+    def _escolher(self, acao, chave):
+        """Troca o selectbox `chave` para outra opção sorteada, se ele estiver na página."""
+        try:
+            selectbox = self.at.selectbox(key=chave)
+        except KeyError:
+            return False
+        if len(selectbox.options) < 2:
+            return False
+        # Sorteia entre as outras opções: escolher a mesma não faria o Streamlit executar a página
+        indice = int(self.rng.integers(len(selectbox.options) - 1))
+        indice += indice >= (selectbox.index or 0)
+        return self._executar(acao, lambda: selectbox.select_index(indice).run())
+
+    def _widget_formulario(self, elementos, formulario, rotulo):
+        return next((w for w in elementos if w.form_id == formulario and w.label == rotulo), None)
+
+    def fluxo_dashboard(self):
+        """Abre o Dashboard e troca projeto, classificação e medida da matriz."""
+        if self._ir_para('dashboard'):
+            self._escolher('trocar_projeto', 'selectbox_gastos_mensais_projeto')
+            self._escolher('trocar_classificacao', 'selectbox_filtro_classificacao')
+            self._escolher('trocar_medida_matriz', 'selectbox_medida_matriz')
+
+    def fluxo_cadastro_lancamento(self):
+        """Abre Cadastros, escolhe o projeto, busca um fornecedor e envia um lançamento."""
+        if not self._ir_para('cadastros') or not self._escolher('escolher_projeto', 'selectbox_lancamento_projeto_cadastro'):
+            return
+        # Digita o número de um fornecedor, como quem procura pelo nome
+        fornecedor_id = int(self.fornecedor_ids[self.rng.integers(len(self.fornecedor_ids))])
+        if not self._executar('buscar_fornecedor', lambda: self.at.text_input(key='busca_fornecedor_lancamento').input(f"{fornecedor_id:05d}").run()):
+            return
+        classificacao = self._widget_formulario(self.at.selectbox, 'novo_lancamento', 'Classificação:')
+        fornecedor = self._widget_formulario(self.at.selectbox, 'novo_lancamento', 'Fornecedor:')
+        valor = self._widget_formulario(self.at.number_input, 'novo_lancamento', 'Valor Faturado:')
+        enviar = self._widget_formulario(self.at.button, 'novo_lancamento', 'Salvar Lançamento')
+        if None in (classificacao, fornecedor, valor, enviar) or not classificacao.options or not fornecedor.options:
+            return  # projeto sem orçamento ou fornecedor não encontrado: nada a enviar
+        classificacao.set_value(classificacao.options[self.rng.integers(len(classificacao.options))])
+        fornecedor.set_value(fornecedor_id if fornecedor_id in fornecedor.options else fornecedor.options[0])
+        valor.set_value(round(float(self.rng.uniform(10, 5000)), 2))
+        if self._executar('salvar_lancamento', lambda: enviar.click().run()) and any(m.value.startswith("Lançamento") for m in self.at.success):
+            self.lancamentos_gravados += 1
+
+    def fluxo_visao_geral(self):
+        """Volta à página inicial e abre a Visão Geral."""
+        if self._ir_para('inicio'):
+            self._ir_para('visao_geral')
+
+    def executar_ate(self, limite, pausa=0.0):
+        """Sorteia e executa fluxos até o instante `limite` (time.monotonic)."""
+        fluxos = list(PESOS_FLUXOS)
+        pesos = np.array(list(PESOS_FLUXOS.values()))
+        while time.monotonic() < limite:
+            getattr(self, 'fluxo_' + fluxos[self.rng.choice(len(fluxos), p=pesos / pesos.sum())])()
+            if pausa:
+                time.sleep(pausa)
+
+def _resumo_latencias(registros):
+    tempos = np.array([r[2] for r in registros])
+    return {
+        'reruns': len(registros),
+        **{f'p{p}_ms': round(float(np.percentile(tempos, p)), 1) for p in PERCENTIS},
+        'media_ms': round(float(tempos.mean()), 1),
+        'max_ms': round(float(tempos.max()), 1),
+        'erros': sum(1 for r in registros if r[3] is not None),
+    }
+
+def _agrupar(registros, chave):
+    grupos = {}
+    for registro in registros:
+        grupos.setdefault(chave(registro), []).append(registro)
+    return {nome: _resumo_latencias(grupo) for nome, grupo in sorted(grupos.items())}
+
+def _contar_lancamentos(caminho):
+    conn = sqlite3.connect(caminho)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM lancamentos").fetchone()[0]
+    finally:
+        conn.close()
+
+def executar(sessoes, duracao, num_lancamentos, diretorio, recriar=False, pausa=0.0, semente=benchmark.SEMENTE):
+    """Roda `sessoes` sessões simuladas por `duracao` segundos num banco gerado e retorna o relatório.
+
+    O banco sintético é o do benchmark (reaproveitado entre execuções); a carga roda numa
+    cópia, porque os lançamentos enviados pelas sessões ficam gravados.
+    """
+    _verificar_streamlit()  # antes de gerar o banco, que pode levar minutos
+    caminho = benchmark.preparar_banco(diretorio, num_lancamentos, recriar)
+    copia = os.path.join(diretorio, f"carga_{num_lancamentos}.db")
+    for sufixo in ('-wal', '-shm'):
+        if os.path.exists(copia + sufixo):
+            os.remove(copia + sufixo)
+    shutil.copyfile(caminho, copia)
+    lancamentos_antes = _contar_lancamentos(copia)
+    # As páginas usam o pool e a fila de escrita do processo, criados no primeiro uso com este banco
+    database.DATABASE_NAME = copia
+    with database.conexao_leitura() as conn:
+        fornecedor_ids = [linha[0] for linha in conn.execute("SELECT id FROM fornecedores")]
+
+    registros = []
+    lock = threading.Lock()
+    rss_inicial = _rss_mb()
+    with _apptest_em_threads():
+        # Sessões abertas uma a uma: a primeira execução de cada uma (imports, pool, caches frios) fica fora da janela medida
+        abertura = time.perf_counter()
+        simuladas = [SessaoSimulada(i, semente, fornecedor_ids, registros, lock) for i in range(sessoes)]
+        segundos_abertura = time.perf_counter() - abertura
+        with lock:
+            registros.clear()
+
+        limite = time.monotonic() + duracao
+        inicio = time.perf_counter()
+        threads = [threading.Thread(target=s.executar_ate, args=(limite, pausa), name=f"sessao-{s.numero}") for s in simuladas]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        segundos = time.perf_counter() - inicio
+
+    lancamentos_enviados = sum(s.lancamentos_gravados for s in simuladas)
+    lancamentos_no_banco = _contar_lancamentos(copia) - lancamentos_antes
+    erros = [r for r in registros if r[3] is not None]
+    exemplos = list(dict.fromkeys(f"{r[0]}/{r[1]}: {r[3]}" for r in erros))[:MAX_EXEMPLOS_ERRO]
+    relatorio = {
+        'meta': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'semente': semente,
+            'sessoes': sessoes,
+            'duracao_s': duracao,
+            'pausa_s': pausa,
+            'lancamentos_banco': num_lancamentos,
+            'pesos_fluxos': PESOS_FLUXOS,
+        },
+        'geral': _resumo_latencias(registros) if registros else {'reruns': 0},
+        'paginas': _agrupar(registros, lambda r: r[0]),
+        'acoes': _agrupar(registros, lambda r: f"{r[0]}/{r[1]}"),
+        'vazao': {
+            'segundos': round(segundos, 2),
+            'abertura_sessoes_s': round(segundos_abertura, 2),
+            'reruns_por_s': round(len(registros) / segundos, 2),
+            'lancamentos_enviados': lancamentos_enviados,
+            'lancamentos_gravados': lancamentos_no_banco,
+            'lancamentos_por_s': round(lancamentos_no_banco / segundos, 2),
+        },
+        'erros': {
+            'total': len(erros),
+            'bloqueio_sqlite': sum(1 for r in erros if r[4]),
+            'exemplos': exemplos,
+        },
+        'memoria': {
+            'rss_inicial_mb': rss_inicial,
+            'rss_final_mb': _rss_mb(),
+            'pico_rss_mb': _pico_rss_mb(),
+        },
+        'pool': database.estatisticas_pool(),
+        'fila_escrita': database.estatisticas_fila_escrita(),
+        'cache': database.estatisticas_cache(),
+        'cache_figuras': visualizations.estatisticas_cache_figuras(),
+    }
+    database.get_fila_escrita().fechar()
+    database.get_pool().fechar()
+    os.remove(copia)
+    return relatorio
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga: sessões simuladas (AppTest) navegando pelas páginas do app.")
+    parser.add_argument('--sessoes', type=int, default=SESSOES_PADRAO, help="Sessões simultâneas.")
+    parser.add_argument('--duracao', type=float, default=DURACAO_PADRAO, help="Segundos de carga.")
+    parser.add_argument('--lancamentos', type=int, default=LANCAMENTOS_PADRAO, help="Lançamentos do banco gerado.")
+    parser.add_argument('--pausa', type=float, default=0.0, help="Segundos entre um fluxo e o próximo de cada sessão (tempo de leitura do usuário).")
+    parser.add_argument('--diretorio', default=os.path.join(tempfile.gettempdir(), 'obra_controle_bench'),
+                        help="Onde ficam os bancos gerados (os mesmos do benchmark.py).")
+    parser.add_argument('--recriar', action='store_true', help="Gera o banco novamente.")
+    parser.add_argument('--semente', type=int, default=benchmark.SEMENTE)
+    parser.add_argument('--saida', default='carga.json')
+    parser.add_argument('--limite-p95', type=float, help="Falha se o p95 de alguma página passar deste valor (ms).")
+    args = parser.parse_args()
+
+    os.makedirs(args.diretorio, exist_ok=True)
+    try:
+        relatorio = executar(args.sessoes, args.duracao, args.lancamentos, args.diretorio, args.recriar, args.pausa, args.semente)
+    except RuntimeError as e:
+        print(f"Erro: {e}")
+        return 1
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    for pagina, resumo in relatorio['paginas'].items():
+        print(f"{pagina:<12} {resumo['reruns']:>6} reruns p50={resumo['p50_ms']:>8.1f}ms p95={resumo['p95_ms']:>8.1f}ms "
+              f"p99={resumo['p99_ms']:>8.1f}ms erros={resumo['erros']}")
+    vazao, erros, memoria = relatorio['vazao'], relatorio['erros'], relatorio['memoria']
+    print(f"{vazao['reruns_por_s']} reruns/s, {vazao['lancamentos_por_s']} lançamentos/s; {erros['total']} erro(s), "
+          f"{erros['bloqueio_sqlite']} de bloqueio do SQLite; pico de memória {memoria['pico_rss_mb']} MB.")
+    print(f"Relatório gravado em {args.saida}.")
+    if args.limite_p95 is None:
+        return 0
+    lentas = [pagina for pagina, resumo in relatorio['paginas'].items() if resumo['p95_ms'] > args.limite_p95]
+    for pagina in lentas:
+        print(f"LENTA {pagina}: p95 {relatorio['paginas'][pagina]['p95_ms']:.1f}ms > {args.limite_p95:.1f}ms")
+    return 1 if lentas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
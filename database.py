@@ -1,16 +1,684 @@
+import functools
+import inspect
+import os
+import queue
+import re
 import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as TempoEsgotadoFuturo
+from contextlib import contextmanager
+from datetime import timedelta
+import numpy as np
 import pandas as pd
 
 DATABASE_NAME = 'obra_controle.db'
 
+# Parâmetros aplicados uma única vez em cada conexão aberta
+MMAP_SIZE = 256 * 1024 * 1024  # 256 MB
+CACHE_SIZE_KB = 64 * 1024  # 64 MB de page cache por conexão
+BUSY_TIMEOUT = 30.0  # segundos
+TAMANHO_POOL = 8
+
+# Limites do cache de resultados das funções get_*
+CACHE_MAX_ENTRADAS = 512
+CACHE_MAX_BYTES = 128 * 1024 * 1024  # 128 MB
+
+def configurar_conexao(conn):
+    """Aplica os pragmas de desempenho (WAL, synchronous, mmap e cache) a uma conexão."""
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    return conn
+
+class _Conexao(sqlite3.Connection):
+    """Conexão SQLite que aceita referências fracas (usadas pelo cache de consultas)."""
+
 def create_connection():
     """Cria e retorna uma conexão com o banco de dados SQLite."""
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = sqlite3.connect(DATABASE_NAME, timeout=BUSY_TIMEOUT, factory=_Conexao)
+    configurar_conexao(conn)
     return conn
 
-def create_tables(conn):
-    """Cria as tabelas no banco de dados se não existirem."""
-    cursor = conn.cursor()
+class PoolConexoes:
+    """Pool de conexões SQLite compartilhado por todas as sessões do processo.
+
+    As leituras usam conexões somente-leitura reaproveitadas entre execuções das
+    páginas; as escritas passam por uma única conexão dedicada, serializada por um
+    lock, para que leitores nunca fiquem bloqueados atrás de escritores (WAL).
+    """
+
+    def __init__(self, caminho=DATABASE_NAME, tamanho_maximo=TAMANHO_POOL, timeout=BUSY_TIMEOUT):
+        self.caminho = caminho
+        self.tamanho_maximo = tamanho_maximo
+        self.timeout = timeout
+        self._condicao = threading.Condition()
+        self._ociosas = []
+        self._abertas = 0
+        self._conexao_escrita = None
+        self._lock_escrita = threading.Lock()
+        self._fechado = False
+        self._hits = 0
+        self._misses = 0
+        self._esperas = 0
+        self._escritas = 0
+        self._esperas_escrita = 0
+
+    def _abrir(self, somente_leitura):
+        conn = sqlite3.connect(self.caminho, timeout=self.timeout, check_same_thread=False, factory=_Conexao)
+        configurar_conexao(conn)
+        if somente_leitura:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def adquirir(self):
+        """Retorna uma conexão de leitura do pool, abrindo uma nova se houver espaço."""
+        with self._condicao:
+            esperou = False
+            while not self._ociosas and self._abertas >= self.tamanho_maximo:
+                if not esperou:
+                    self._esperas += 1
+                    esperou = True
+                if not self._condicao.wait(self.timeout):
+                    raise sqlite3.OperationalError("Tempo esgotado aguardando conexão livre no pool")
+            if self._ociosas:
+                self._hits += 1
+                return self._ociosas.pop()
+            self._abertas += 1
+            self._misses += 1
+        try:
+            return self._abrir(somente_leitura=True)
+        except sqlite3.Error:
+            with self._condicao:
+                self._abertas -= 1
+                self._condicao.notify()
+            raise
+
+    def liberar(self, conn):
+        """Devolve uma conexão de leitura ao pool."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._condicao:
+            if self._fechado:
+                self._abertas -= 1
+                conn.close()
+            else:
+                self._ociosas.append(conn)
+            self._condicao.notify()
+
+    @contextmanager
+    def leitura(self):
+        """Context manager que empresta uma conexão de leitura e a devolve ao final."""
+        conn = self.adquirir()
+        try:
+            yield conn
+        finally:
+            self.liberar(conn)
+
+    @contextmanager
+    def escrita(self):
+        """Context manager que dá acesso exclusivo à conexão dedicada de escrita."""
+        if not self._lock_escrita.acquire(blocking=False):
+            with self._condicao:
+                self._esperas_escrita += 1
+            if not self._lock_escrita.acquire(timeout=self.timeout):
+                raise sqlite3.OperationalError("Tempo esgotado aguardando a conexão de escrita")
+        try:
+            if self._conexao_escrita is None:
+                self._conexao_escrita = self._abrir(somente_leitura=False)
+            with self._condicao:
+                self._escritas += 1
+            try:
+                yield self._conexao_escrita
+            except BaseException:
+                if self._conexao_escrita.in_transaction:
+                    self._conexao_escrita.rollback()
+                raise
+        finally:
+            self._lock_escrita.release()
+
+    def estatisticas(self):
+        """Retorna os contadores do pool para dimensionamento."""
+        with self._condicao:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'esperas': self._esperas,
+                'conexoes_abertas': self._abertas + (1 if self._conexao_escrita is not None else 0),
+                'conexoes_leitura_abertas': self._abertas,
+                'conexoes_leitura_ociosas': len(self._ociosas),
+                'tamanho_maximo': self.tamanho_maximo,
+                'escritas': self._escritas,
+                'esperas_escrita': self._esperas_escrita,
+            }
+
+    def fechar(self):
+        """Fecha as conexões ociosas e a de escrita; as emprestadas fecham ao serem devolvidas."""
+        with self._condicao:
+            self._fechado = True
+            while self._ociosas:
+                self._ociosas.pop().close()
+                self._abertas -= 1
+        with self._lock_escrita:
+            if self._conexao_escrita is not None:
+                self._conexao_escrita.close()
+                self._conexao_escrita = None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Retorna o pool de conexões do processo, criando-o no primeiro uso.
+
+    A criação aplica as migrações pendentes do schema, então isso acontece uma
+    vez por processo, e não a cada execução das páginas.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = PoolConexoes(DATABASE_NAME)
+            try:
+                with pool.escrita() as conn:
+                    migrar(conn)
+            except BaseException:
+                pool.fechar()
+                raise
+            _pool = pool
+        return _pool
+
+def conexao_leitura():
+    """Atalho para `get_pool().leitura()`."""
+    return get_pool().leitura()
+
+def conexao_escrita():
+    """Atalho para `get_pool().escrita()`."""
+    return get_pool().escrita()
+
+def estatisticas_pool():
+    """Retorna as estatísticas do pool de conexões do processo."""
+    return get_pool().estatisticas()
+
+# Carga paralela de consultas independentes (ex.: um gráfico por tarefa). As threads
+# são compartilhadas pelas sessões, então o total de consultas simultâneas é limitado.
+TAMANHO_POOL_TAREFAS = 4
+TIMEOUT_TAREFA = 10.0  # segundos
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TAMANHO_POOL_TAREFAS, thread_name_prefix='carga_paralela')
+        return _executor
+
+def _executar_tarefa(nome, funcao, args, conexoes, lock):
+    with conexao_leitura() as conn:
+        with lock:
+            conexoes[nome] = conn
+        try:
+            return funcao(conn, *args)
+        finally:
+            # Sai do registro antes de voltar ao pool: um interrupt atrasado não pode atingir outra consulta
+            with lock:
+                conexoes.pop(nome, None)
+
+def carregar_em_paralelo(tarefas, timeout=TIMEOUT_TAREFA):
+    """Executa consultas independentes em paralelo, cada uma com sua conexão de leitura do pool.
+
+    `tarefas` mapeia um nome para `(funcao, *args)`; cada tarefa chama `funcao(conn, *args)`.
+    Retorna `(resultados, erros)`, dicionários por nome. Uma tarefa que falha ou não
+    termina em `timeout` segundos aparece só em `erros` (a exceção, ou TimeoutError)
+    e não impede as demais; a consulta que passou do tempo é interrompida.
+    """
+    executor = _get_executor()
+    conexoes = {}
+    lock = threading.Lock()
+    futuros = {
+        nome: executor.submit(_executar_tarefa, nome, tarefa[0], tarefa[1:], conexoes, lock)
+        for nome, tarefa in tarefas.items()
+    }
+    limite = time.monotonic() + timeout
+    resultados = {}
+    erros = {}
+    for nome, futuro in futuros.items():
+        try:
+            resultados[nome] = futuro.result(timeout=max(0.0, limite - time.monotonic()))
+        except TempoEsgotadoFuturo:
+            futuro.cancel()
+            with lock:
+                conn = conexoes.get(nome)
+                if conn is not None:
+                    conn.interrupt()
+            erros[nome] = TimeoutError(f"A consulta '{nome}' passou de {timeout:.0f}s.")
+        except Exception as e:
+            erros[nome] = e
+    return resultados, erros
+
+def _ler_versoes_tabelas(conn):
+    """Lê as versões gravadas em versoes_tabelas (vazio se o schema ainda não foi criado)."""
+    try:
+        return dict(conn.execute("SELECT tabela, versao FROM versoes_tabelas").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+class CacheConsultas:
+    """Cache LRU dos resultados das funções get_*, invalidado por versão de tabela.
+
+    Cada entrada guarda a versão das tabelas que a consulta lê. As funções salvar_*
+    incrementam a versão das tabelas alteradas em versoes_tabelas, na mesma transação
+    da escrita; as conexões detectam commits de outras conexões (inclusive de outros
+    processos) por `PRAGMA data_version` e só então releem essas versões. Um commit
+    externo que não passe por database.py invalida o cache inteiro.
+    """
+
+    def __init__(self, max_entradas=CACHE_MAX_ENTRADAS, max_bytes=CACHE_MAX_BYTES):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (versões, resultado, tamanho)
+        self._bytes = 0
+        self._versoes_banco = {}  # banco -> {tabela: versão gravada no banco}
+        self._tokens = {}  # banco -> {tabela: contador local de invalidações}
+        self._conexoes = weakref.WeakKeyDictionary()  # conn -> (banco, data_version, versões vistas)
+        self._hits = 0
+        self._misses = 0
+        self._obsoletas = 0
+        self._remocoes = 0
+        self._invalidacoes = 0
+
+    def _aplicar_versoes(self, banco, versoes_db, escrita_externa=False):
+        """Incrementa o token das tabelas cuja versão no banco avançou."""
+        with self._lock:
+            conhecidas = self._versoes_banco.setdefault(banco, {})
+            tokens = self._tokens.setdefault(banco, {})
+            for tabela, versao in versoes_db.items():
+                if versao > conhecidas.get(tabela, 0):
+                    conhecidas[tabela] = versao
+                    tokens[tabela] = tokens.get(tabela, 0) + 1
+                    self._invalidacoes += 1
+            if escrita_externa:
+                tokens['*'] = tokens.get('*', 0) + 1
+                self._invalidacoes += 1
+
+    def sincronizar(self, conn, forcar=False):
+        """Atualiza as versões conhecidas a partir da conexão e retorna o arquivo do banco."""
+        try:
+            banco, data_version_anterior, versoes_vistas = self._conexoes.get(conn, (None, None, None))
+            rastreavel = True
+        except TypeError:
+            banco, data_version_anterior, versoes_vistas = None, None, None
+            rastreavel = False
+        if banco is None:
+            banco = conn.execute("PRAGMA database_list").fetchone()[2]
+        if not banco:
+            return None  # banco em memória: não há como identificar nem compartilhar
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if forcar or data_version != data_version_anterior:
+            versoes_db = _ler_versoes_tabelas(conn)
+            # data_version mudou mas nenhuma versão avançou: alguém escreveu sem passar por aqui
+            escrita_externa = data_version_anterior is not None and versoes_db == versoes_vistas and not forcar
+            self._aplicar_versoes(banco, versoes_db, escrita_externa)
+            versoes_vistas = versoes_db
+        if rastreavel:
+            self._conexoes[conn] = (banco, data_version, versoes_vistas)
+        return banco
+
+    def _versoes(self, banco, tabelas):
+        tokens = self._tokens.get(banco, {})
+        return tuple(tokens.get(tabela, 0) for tabela in tabelas) + (tokens.get('*', 0),)
+
+    def executar(self, funcao, tabelas, conn, args, kwargs):
+        """Retorna o resultado em cache de `funcao(conn, *args, **kwargs)` ou o calcula."""
+        banco = self.sincronizar(conn)
+        chave = (banco, funcao.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(chave)
+        except TypeError:
+            banco = None
+        if banco is None:
+            return funcao(conn, *args, **kwargs)
+
+        with self._lock:
+            versoes = self._versoes(banco, tabelas)
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] == versoes:
+                self._entradas.move_to_end(chave)
+                self._hits += 1
+                return _copiar_resultado(entrada[1])
+            self._misses += 1
+            if entrada is not None:
+                self._obsoletas += 1
+
+        resultado = funcao(conn, *args, **kwargs)
+        tamanho = _tamanho_resultado(resultado)
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[2]
+            if tamanho <= self.max_bytes:
+                self._entradas[chave] = (versoes, resultado, tamanho)
+                self._bytes += tamanho
+                while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                    _, (_, _, tamanho_removido) = self._entradas.popitem(last=False)
+                    self._bytes -= tamanho_removido
+                    self._remocoes += 1
+        return _copiar_resultado(resultado)
+
+    def versao(self, conn, tabelas):
+        """Identificador da versão atual das `tabelas` (None para bancos em memória)."""
+        banco = self.sincronizar(conn)
+        if banco is None:
+            return None
+        with self._lock:
+            return (banco,) + self._versoes(banco, tabelas)
+
+    def limpar(self):
+        """Descarta todas as entradas (as versões conhecidas são mantidas)."""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        """Retorna os contadores de uso do cache."""
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'obsoletas': self._obsoletas,
+                'remocoes': self._remocoes,
+                'invalidacoes': self._invalidacoes,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_entradas': self.max_entradas,
+                'max_bytes': self.max_bytes,
+            }
+
+def _tamanho_resultado(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return int(resultado.memory_usage(index=True, deep=True).sum())
+    if isinstance(resultado, pd.Series):
+        return int(resultado.memory_usage(index=True, deep=True))
+    if isinstance(resultado, tuple):
+        return sum(_tamanho_resultado(item) for item in resultado)
+    if isinstance(resultado, SnapshotDashboard):
+        return sum(_tamanho_resultado(valor) for valor in vars(resultado).values())
+    return sys.getsizeof(resultado)
+
+def _copiar_resultado(resultado):
+    # As páginas podem alterar o DataFrame recebido; a entrada do cache não pode mudar junto
+    if isinstance(resultado, (pd.DataFrame, pd.Series, SnapshotDashboard)):
+        return resultado.copy()
+    if isinstance(resultado, tuple):
+        return tuple(_copiar_resultado(item) for item in resultado)
+    return resultado
+
+_cache = CacheConsultas()
+
+def _cacheado(*tabelas):
+    """Decorador que passa uma função get_* pelo cache, dependente das `tabelas` informadas."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def wrapper(conn, *args, **kwargs):
+            return _cache.executar(funcao, tabelas, conn, args, kwargs)
+        return wrapper
+    return decorador
+
+def commit_escrita(conn, *tabelas):
+    """Incrementa a versão das tabelas alteradas, faz o commit e invalida o cache."""
+    for tabela in tabelas:
+        conn.execute(
+            "INSERT INTO versoes_tabelas (tabela, versao) VALUES (?, 1) ON CONFLICT (tabela) DO UPDATE SET versao = versao + 1",
+            (tabela,)
+        )
+    conn.commit()
+    _cache.sincronizar(conn, forcar=True)
+
+def versao_dados(conn, *tabelas):
+    """Retorna um valor que muda sempre que alguma das `tabelas` é alterada.
+
+    Serve de chave para caches fora deste módulo (ex.: figuras do Dashboard).
+    """
+    return _cache.versao(conn, tabelas)
+
+def estatisticas_cache():
+    """Retorna as estatísticas do cache de resultados das funções get_*."""
+    return _cache.estatisticas()
+
+def limpar_cache():
+    """Descarta os resultados em cache das funções get_*."""
+    _cache.limpar()
+
+# Escritas: as funções salvar_* só executam o SQL; o commit (e a versão das tabelas) fica
+# com _gravar_lote, que junta várias delas numa única transação.
+TAMANHO_FILA_ESCRITA = 1000
+LOTE_MAXIMO_ESCRITA = 200
+TENTATIVAS_ESCRITA = 5
+ESPERA_RETENTATIVA = 0.05  # segundos; dobra a cada nova tentativa
+TIMEOUT_ESCRITA = BUSY_TIMEOUT
+
+def _banco_ocupado(erro):
+    """Indica se o erro é SQLITE_BUSY/SQLITE_LOCKED, que vale a pena tentar de novo."""
+    codigo = getattr(erro, 'sqlite_errorcode', None)
+    if codigo is None:
+        return isinstance(erro, sqlite3.OperationalError) and ('locked' in str(erro) or 'busy' in str(erro))
+    return codigo & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+def _gravar_lote(conn, escritas):
+    """Executa `escritas` [(salvar, args)] numa única transação e faz um só commit.
+
+    Cada escrita roda num savepoint: a que falhar é desfeita sem derrubar as
+    outras. Retorna [(resultado, erro)] na ordem de `escritas`. Banco ocupado
+    desfaz o lote inteiro e relança o erro, para quem chamou tentar de novo.
+    """
+    indices = {salvar.indice for salvar, _ in escritas if salvar.indice}
+    versoes_anteriores = {tabela: versao_dados(conn, tabela) for tabela in indices}
+    resultados = []
+    tabelas = set()
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        for salvar, args in escritas:
+            conn.execute("SAVEPOINT escrita")
+            try:
+                resultado = salvar.operacao(conn, *args)
+            except Exception as e:
+                if _banco_ocupado(e):
+                    raise
+                conn.execute("ROLLBACK TO escrita")
+                resultados.append((None, e))
+            else:
+                tabelas.update(salvar.tabelas)
+                resultados.append((resultado, None))
+            conn.execute("RELEASE escrita")
+        if tabelas:
+            commit_escrita(conn, *sorted(tabelas))
+        else:
+            conn.rollback()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    for tabela in indices:
+        registros = [
+            (resultado, args[0])
+            for (salvar, args), (resultado, erro) in zip(escritas, resultados)
+            if salvar.indice == tabela and erro is None
+        ]
+        _acrescentar_ao_indice(conn, tabela, versoes_anteriores[tabela], registros)
+    return resultados
+
+def _escrita(*tabelas, indice=None):
+    """Decorador das funções salvar_*, dependentes das `tabelas` que alteram.
+
+    A função decorada recebe a conexão e só executa o SQL, sem commit. Chamada
+    diretamente, grava na hora e retorna True/False; `enviar_escrita(salvar_x, ...)`
+    manda a mesma operação para a fila do gravador. Com `indice`, o id retornado e
+    o primeiro argumento (o nome) entram no IndiceNomes da tabela após o commit.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def wrapper(conn, *args):
+            try:
+                [(_, erro)] = _gravar_lote(conn, [(wrapper, args)])
+            except sqlite3.Error as e:
+                erro = e
+            if erro is None:
+                return True
+            if not isinstance(erro, sqlite3.Error):
+                raise erro
+            print(f"Erro em {funcao.__name__}: {erro}")
+            return False
+        wrapper.operacao = funcao
+        wrapper.tabelas = tabelas
+        wrapper.indice = indice
+        return wrapper
+    return decorador
+
+class FilaEscrita:
+    """Fila limitada de escritas, gravadas por uma única thread com group commit.
+
+    Cada `enviar` retorna um Future; a thread gravadora pega tudo o que estiver
+    pendente (até `lote_maximo`), grava numa única transação pela conexão de escrita
+    do pool e só então resolve os Futures. Banco ocupado é tentado de novo, com
+    espera crescente, antes de falhar o lote.
+    """
+
+    def __init__(self, pool, tamanho_maximo=TAMANHO_FILA_ESCRITA, lote_maximo=LOTE_MAXIMO_ESCRITA, tentativas=TENTATIVAS_ESCRITA):
+        self._pool = pool
+        self.lote_maximo = lote_maximo
+        self.tentativas = tentativas
+        self._fila = queue.Queue(tamanho_maximo)
+        self._lock = threading.Lock()
+        self._enviadas = 0
+        self._gravadas = 0
+        self._falhas = 0
+        self._lotes = 0
+        self._maior_lote = 0
+        self._retentativas = 0
+        self._recusadas = 0
+        self._thread = threading.Thread(target=self._executar, name='gravador', daemon=True)
+        self._thread.start()
+
+    def enviar(self, salvar, *args, timeout=TIMEOUT_ESCRITA):
+        """Enfileira `salvar(conn, *args)` e retorna um Future com o resultado da operação.
+
+        Espera até `timeout` segundos por espaço na fila; esgotado, levanta OperationalError.
+        """
+        futuro = Future()
+        try:
+            self._fila.put((salvar, args, futuro), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._recusadas += 1
+            raise sqlite3.OperationalError("Tempo esgotado aguardando espaço na fila de escrita") from None
+        with self._lock:
+            self._enviadas += 1
+        return futuro
+
+    def _executar(self):
+        encerrar = False
+        while not encerrar:
+            pendentes = [self._fila.get()]
+            while len(pendentes) < self.lote_maximo:
+                try:
+                    pendentes.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            if None in pendentes:
+                encerrar = True
+                pendentes = [item for item in pendentes if item is not None]
+            pendentes = [item for item in pendentes if item[2].set_running_or_notify_cancel()]
+            if pendentes:
+                self._gravar(pendentes)
+
+    def _gravar(self, pendentes):
+        escritas = [(salvar, args) for salvar, args, _ in pendentes]
+        for tentativa in range(self.tentativas):
+            try:
+                with self._pool.escrita() as conn:
+                    resultados = _gravar_lote(conn, escritas)
+                break
+            except Exception as e:
+                if _banco_ocupado(e) and tentativa < self.tentativas - 1:
+                    with self._lock:
+                        self._retentativas += 1
+                    time.sleep(ESPERA_RETENTATIVA * 2 ** tentativa)
+                    continue
+                resultados = [(None, e)] * len(escritas)
+                break
+        with self._lock:
+            self._lotes += 1
+            self._maior_lote = max(self._maior_lote, len(escritas))
+            for resultado, erro in resultados:
+                if erro is None:
+                    self._gravadas += 1
+                else:
+                    self._falhas += 1
+        for (_, _, futuro), (resultado, erro) in zip(pendentes, resultados):
+            if erro is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(erro)
+
+    def estatisticas(self):
+        """Retorna os contadores da fila (o tamanho médio do lote mede o group commit)."""
+        with self._lock:
+            return {
+                'enviadas': self._enviadas,
+                'gravadas': self._gravadas,
+                'falhas': self._falhas,
+                'lotes': self._lotes,
+                'media_por_lote': round((self._gravadas + self._falhas) / self._lotes, 2) if self._lotes else 0.0,
+                'maior_lote': self._maior_lote,
+                'retentativas': self._retentativas,
+                'recusadas': self._recusadas,
+                'pendentes': self._fila.qsize(),
+            }
+
+    def fechar(self):
+        """Grava o que já está na fila e encerra a thread gravadora."""
+        self._fila.put(None)
+        self._thread.join()
+
+_fila_escrita = None
+_fila_escrita_lock = threading.Lock()
+
+def get_fila_escrita():
+    """Retorna a fila de escrita do processo, criando a thread gravadora no primeiro uso."""
+    global _fila_escrita
+    with _fila_escrita_lock:
+        if _fila_escrita is None:
+            _fila_escrita = FilaEscrita(get_pool())
+        return _fila_escrita
+
+def enviar_escrita(salvar, *args):
+    """Atalho para `get_fila_escrita().enviar(salvar, *args)`."""
+    return get_fila_escrita().enviar(salvar, *args)
+
+def gravar(salvar, *args, timeout=TIMEOUT_ESCRITA):
+    """Envia `salvar(conn, *args)` para a fila e espera a gravação; retorna o resultado da operação.
+
+    Erros de banco chegam como sqlite3.Error. Se `timeout` se esgotar, levanta
+    OperationalError, mas a escrita continua na fila e ainda pode ser gravada.
+    """
+    futuro = enviar_escrita(salvar, *args)
+    try:
+        return futuro.result(timeout=timeout)
+    except TempoEsgotadoFuturo:
+        raise sqlite3.OperationalError("Tempo esgotado aguardando a gravação") from None
+
+def estatisticas_fila_escrita():
+    """Retorna as estatísticas da fila de escrita do processo."""
+    return get_fila_escrita().estatisticas()
+
+def _criar_tabelas_base(cursor):
+    """Migração 1: tabelas de cadastro, lançamentos e orçamentos."""
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS fornecedores (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -67,117 +735,948 @@ def create_tables(conn):
             UPDATE orcamentos SET data_atualizacao = STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW') WHERE id = NEW.id;
         END;
     ''')
-    conn.commit()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS versoes_tabelas (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
 
-def salvar_fornecedor(conn, nome, cnpj, telefone, email, endereco):
-    """Salva os dados de um novo fornecedor no banco de dados."""
-    cursor = conn.cursor()
+# Índices secundários gerenciados: cada um cobre uma das consultas de agregação
+# sobre lancamentos, para que o SQLite responda lendo apenas o índice.
+INDICES = {
+    'idx_lancamentos_projeto_data':
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_projeto_data ON lancamentos (projeto_id, data_lancamento)",
+    'idx_lancamentos_projeto_classificacao':
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_projeto_classificacao ON lancamentos (projeto_id, classificacao, valor_faturado)",
+    'idx_lancamentos_classificacao':
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_classificacao ON lancamentos (classificacao, valor_faturado)",
+    'idx_lancamentos_fornecedor':
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_fornecedor ON lancamentos (fornecedor_id, valor_faturado)",
+    'idx_lancamentos_mes_classificacao':
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_mes_classificacao ON lancamentos (mes, classificacao, data_lancamento, valor_faturado)",
+    'idx_lancamentos_projeto_mes':
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_projeto_mes ON lancamentos (projeto_id, mes, classificacao, data_lancamento, valor_faturado)",
+    # Matriz projeto x categoria: lê os valores orçados sem tocar na tabela
+    'idx_orcamentos_projeto_categoria_valor':
+        "CREATE INDEX IF NOT EXISTS idx_orcamentos_projeto_categoria_valor ON orcamentos (projeto_id, categoria, valor_orcado)",
+}
+
+# Colunas geradas de lancamentos. São VIRTUAL (o ALTER TABLE não aceita STORED):
+# o valor é calculado na leitura e fica gravado apenas nos índices que as usam.
+COLUNAS_GERADAS = {
+    'mes': "TEXT GENERATED ALWAYS AS (STRFTIME('%Y-%m', data_lancamento)) VIRTUAL",
+}
+
+def _criar_colunas_geradas(cursor):
+    existentes = {row[1] for row in cursor.execute("PRAGMA table_xinfo(lancamentos)")}
+    for nome, definicao in COLUNAS_GERADAS.items():
+        if nome not in existentes:
+            cursor.execute(f"ALTER TABLE lancamentos ADD COLUMN {nome} {definicao}")
+
+def _sincronizar_indices(cursor):
+    """Cria os índices gerenciados que faltam e remove os `idx_*` que saíram da lista.
+
+    Retorna True se algum índice mudou (as estatísticas do planejador precisam ser refeitas).
+    """
+    _criar_colunas_geradas(cursor)  # alguns índices dependem delas
+    existentes = {
+        row[0] for row in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx\\_%' ESCAPE '\\'"
+        )
+    }
+    for nome in existentes - INDICES.keys():
+        cursor.execute(f"DROP INDEX IF EXISTS {nome}")
+    for ddl in INDICES.values():
+        cursor.execute(ddl)
+    return existentes != INDICES.keys()
+
+# Tabelas de resumo mantidas por triggers: o Dashboard lê os totais já agregados,
+# então o custo de cada gráfico depende do número de grupos e não de lançamentos.
+TABELAS_AGREGADOS = {
+    'gastos_projeto_classificacao': '''
+        CREATE TABLE IF NOT EXISTS gastos_projeto_classificacao (
+            projeto_id INTEGER NOT NULL,
+            classificacao TEXT NOT NULL,
+            total_gasto REAL NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (projeto_id, classificacao)
+        ) WITHOUT ROWID
+    ''',
+    'gastos_fornecedor': '''
+        CREATE TABLE IF NOT EXISTS gastos_fornecedor (
+            fornecedor_id INTEGER NOT NULL,
+            total_gasto REAL NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (fornecedor_id)
+        ) WITHOUT ROWID
+    ''',
+    'gastos_mensais': '''
+        CREATE TABLE IF NOT EXISTS gastos_mensais (
+            projeto_id INTEGER NOT NULL,
+            classificacao TEXT NOT NULL,
+            mes TEXT NOT NULL,
+            total_gasto REAL NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (projeto_id, classificacao, mes)
+        ) WITHOUT ROWID
+    ''',
+}
+
+# Consulta que recalcula cada tabela de resumo a partir dos lançamentos brutos
+CONSULTAS_AGREGADOS = {
+    'gastos_projeto_classificacao': (
+        ('projeto_id', 'classificacao'),
+        "SELECT projeto_id, classificacao, SUM(valor_faturado), COUNT(*) FROM lancamentos GROUP BY projeto_id, classificacao",
+    ),
+    'gastos_fornecedor': (
+        ('fornecedor_id',),
+        "SELECT fornecedor_id, SUM(valor_faturado), COUNT(*) FROM lancamentos WHERE fornecedor_id IS NOT NULL GROUP BY fornecedor_id",
+    ),
+    'gastos_mensais': (
+        ('projeto_id', 'classificacao', 'mes'),
+        "SELECT projeto_id, classificacao, mes, SUM(valor_faturado), COUNT(*) FROM lancamentos GROUP BY 1, 2, 3",
+    ),
+}
+
+def _sql_soma_agregados(linha, sinal):
+    """Gera os upserts que somam (sinal '+') ou subtraem (sinal '-') um lançamento dos resumos."""
+    return f'''
+            INSERT INTO gastos_projeto_classificacao (projeto_id, classificacao, total_gasto, quantidade)
+            VALUES ({linha}.projeto_id, {linha}.classificacao, {sinal}{linha}.valor_faturado, {sinal}1)
+            ON CONFLICT (projeto_id, classificacao) DO UPDATE SET
+                total_gasto = total_gasto + excluded.total_gasto, quantidade = quantidade + excluded.quantidade;
+            INSERT INTO gastos_fornecedor (fornecedor_id, total_gasto, quantidade)
+            SELECT {linha}.fornecedor_id, {sinal}{linha}.valor_faturado, {sinal}1 WHERE {linha}.fornecedor_id IS NOT NULL
+            ON CONFLICT (fornecedor_id) DO UPDATE SET
+                total_gasto = total_gasto + excluded.total_gasto, quantidade = quantidade + excluded.quantidade;
+            INSERT INTO gastos_mensais (projeto_id, classificacao, mes, total_gasto, quantidade)
+            VALUES ({linha}.projeto_id, {linha}.classificacao, STRFTIME('%Y-%m', {linha}.data_lancamento), {sinal}{linha}.valor_faturado, {sinal}1)
+            ON CONFLICT (projeto_id, classificacao, mes) DO UPDATE SET
+                total_gasto = total_gasto + excluded.total_gasto, quantidade = quantidade + excluded.quantidade;
+    '''
+
+def _sql_limpa_agregados(linha):
+    """Gera os deletes das linhas de resumo que o lançamento `linha` zerou.
+
+    Só as chaves do próprio lançamento: varrer os resumos inteiros a cada linha
+    tornava lento apagar muitos lançamentos de uma vez (arquivamento).
+    """
+    return f'''
+            DELETE FROM gastos_projeto_classificacao
+            WHERE projeto_id = {linha}.projeto_id AND classificacao = {linha}.classificacao AND quantidade = 0;
+            DELETE FROM gastos_fornecedor WHERE fornecedor_id = {linha}.fornecedor_id AND quantidade = 0;
+            DELETE FROM gastos_mensais
+            WHERE projeto_id = {linha}.projeto_id AND classificacao = {linha}.classificacao
+              AND mes = STRFTIME('%Y-%m', {linha}.data_lancamento) AND quantidade = 0;
+    '''
+
+TRIGGERS_AGREGADOS = {
+    'lancamentos_agregados_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS lancamentos_agregados_insert
+        AFTER INSERT ON lancamentos
+        BEGIN
+            {_sql_soma_agregados('NEW', '+')}
+        END
+    ''',
+    'lancamentos_agregados_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS lancamentos_agregados_delete
+        AFTER DELETE ON lancamentos
+        BEGIN
+            {_sql_soma_agregados('OLD', '-')}
+            {_sql_limpa_agregados('OLD')}
+        END
+    ''',
+    'lancamentos_agregados_update': f'''
+        CREATE TRIGGER IF NOT EXISTS lancamentos_agregados_update
+        AFTER UPDATE OF projeto_id, classificacao, fornecedor_id, data_lancamento, valor_faturado ON lancamentos
+        BEGIN
+            {_sql_soma_agregados('OLD', '-')}
+            {_sql_soma_agregados('NEW', '+')}
+            {_sql_limpa_agregados('OLD')}
+        END
+    ''',
+}
+
+def _criar_agregados(cursor):
+    """Cria as tabelas de resumo e seus triggers, populando-as na primeira vez."""
+    existentes = {
+        row[0] for row in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (%s)" % ','.join('?' * len(TABELAS_AGREGADOS)),
+            tuple(TABELAS_AGREGADOS)
+        )
+    }
+    for ddl in TABELAS_AGREGADOS.values():
+        cursor.execute(ddl)
+    for ddl in TRIGGERS_AGREGADOS.values():
+        cursor.execute(ddl)
+    if existentes != TABELAS_AGREGADOS.keys():
+        _recalcular_agregados(cursor)
+
+def _recriar_triggers_agregados(cursor):
+    """Troca os triggers dos resumos pela versão atual de TRIGGERS_AGREGADOS (IF NOT EXISTS não os altera)."""
+    for nome, ddl in TRIGGERS_AGREGADOS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        cursor.execute(ddl)
+
+def _recalcular_agregados(cursor):
+    for tabela, (chave, consulta) in CONSULTAS_AGREGADOS.items():
+        colunas = ', '.join(chave + ('total_gasto', 'quantidade'))
+        cursor.execute(f"DELETE FROM {tabela}")
+        cursor.execute(f"INSERT INTO {tabela} ({colunas}) {consulta}")
+
+def reconstruir_agregados(conn):
+    """Recalcula todas as tabelas de resumo a partir de lancamentos, numa única transação."""
     try:
-        cursor.execute(
-            "INSERT INTO fornecedores (nome, cnpj, telefone, email, endereco) VALUES (?, ?, ?, ?, ?)",
-            (nome, cnpj, telefone, email, endereco)
+        _recalcular_agregados(conn.cursor())
+        commit_escrita(conn, 'lancamentos')
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def verificar_agregados(conn, tolerancia=0.005):
+    """Compara as tabelas de resumo com os lançamentos brutos.
+
+    Retorna uma lista de divergências (tabela, chave, valor esperado e valor atual);
+    lista vazia significa que os resumos estão consistentes.
+    """
+    divergencias = []
+    for tabela, (chave, consulta) in CONSULTAS_AGREGADOS.items():
+        n = len(chave)
+        esperado = {row[:n]: row[n:] for row in conn.execute(consulta)}
+        atual = {
+            row[:n]: row[n:]
+            for row in conn.execute(f"SELECT {', '.join(chave)}, total_gasto, quantidade FROM {tabela}")
+        }
+        for k in esperado.keys() | atual.keys():
+            total_esperado, quantidade_esperada = esperado.get(k, (0.0, 0))
+            total_atual, quantidade_atual = atual.get(k, (0.0, 0))
+            if quantidade_esperada != quantidade_atual or abs(total_esperado - total_atual) > tolerancia:
+                divergencias.append({
+                    'tabela': tabela,
+                    'chave': dict(zip(chave, k)),
+                    'esperado': (total_esperado, quantidade_esperada),
+                    'atual': (total_atual, quantidade_atual),
+                })
+    return divergencias
+
+# Índices de busca textual (FTS5), mantidos por triggers como os resumos. O de lançamentos
+# usa a própria tabela como conteúdo (só guarda o índice invertido); o de fornecedores é
+# pequeno e guarda o CNPJ também só com dígitos, para achar "12345678" em "12.345.678/0001-90".
+# `prefix` indexa os prefixos de 2 e 3 letras, que são a maior parte das buscas do autocompletar.
+TABELAS_BUSCA = {
+    'busca_lancamentos': '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS busca_lancamentos USING fts5(
+            descricao, documento,
+            content='lancamentos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''',
+    'busca_fornecedores': '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS busca_fornecedores USING fts5(
+            nome, cnpj,
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
         )
+    ''',
+}
+
+def _sql_cnpj_busca(linha):
+    digitos = f"REPLACE(REPLACE(REPLACE(REPLACE({linha}.cnpj, '.', ''), '/', ''), '-', ''), ' ', '')"
+    return f"COALESCE({linha}.cnpj || ' ' || {digitos}, '')"
+
+_SQL_INSERE_BUSCA_LANCAMENTO = '''
+            INSERT INTO busca_lancamentos (rowid, descricao, documento) VALUES (NEW.id, NEW.descricao, NEW.documento);
+'''
+_SQL_REMOVE_BUSCA_LANCAMENTO = '''
+            INSERT INTO busca_lancamentos (busca_lancamentos, rowid, descricao, documento) VALUES ('delete', OLD.id, OLD.descricao, OLD.documento);
+'''
+_SQL_INSERE_BUSCA_FORNECEDOR = f'''
+            INSERT INTO busca_fornecedores (rowid, nome, cnpj) VALUES (NEW.id, NEW.nome, {_sql_cnpj_busca('NEW')});
+'''
+_SQL_REMOVE_BUSCA_FORNECEDOR = '''
+            DELETE FROM busca_fornecedores WHERE rowid = OLD.id;
+'''
+
+TRIGGERS_BUSCA = {
+    'lancamentos_busca_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS lancamentos_busca_insert
+        AFTER INSERT ON lancamentos
+        BEGIN
+            {_SQL_INSERE_BUSCA_LANCAMENTO}
+        END
+    ''',
+    'lancamentos_busca_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS lancamentos_busca_delete
+        AFTER DELETE ON lancamentos
+        BEGIN
+            {_SQL_REMOVE_BUSCA_LANCAMENTO}
+        END
+    ''',
+    'lancamentos_busca_update': f'''
+        CREATE TRIGGER IF NOT EXISTS lancamentos_busca_update
+        AFTER UPDATE OF descricao, documento ON lancamentos
+        BEGIN
+            {_SQL_REMOVE_BUSCA_LANCAMENTO}
+            {_SQL_INSERE_BUSCA_LANCAMENTO}
+        END
+    ''',
+    'fornecedores_busca_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS fornecedores_busca_insert
+        AFTER INSERT ON fornecedores
+        BEGIN
+            {_SQL_INSERE_BUSCA_FORNECEDOR}
+        END
+    ''',
+    'fornecedores_busca_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS fornecedores_busca_delete
+        AFTER DELETE ON fornecedores
+        BEGIN
+            {_SQL_REMOVE_BUSCA_FORNECEDOR}
+        END
+    ''',
+    'fornecedores_busca_update': f'''
+        CREATE TRIGGER IF NOT EXISTS fornecedores_busca_update
+        AFTER UPDATE OF nome, cnpj ON fornecedores
+        BEGIN
+            {_SQL_REMOVE_BUSCA_FORNECEDOR}
+            {_SQL_INSERE_BUSCA_FORNECEDOR}
+        END
+    ''',
+}
+
+def _criar_busca(cursor):
+    """Cria os índices de busca textual e seus triggers, populando-os na primeira vez."""
+    existentes = {
+        row[0] for row in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (%s)" % ','.join('?' * len(TABELAS_BUSCA)),
+            tuple(TABELAS_BUSCA)
+        )
+    }
+    for ddl in TABELAS_BUSCA.values():
+        cursor.execute(ddl)
+    for ddl in TRIGGERS_BUSCA.values():
+        cursor.execute(ddl)
+    if existentes != TABELAS_BUSCA.keys():
+        _recalcular_busca(cursor)
+
+def _recalcular_busca(cursor):
+    cursor.execute("INSERT INTO busca_lancamentos (busca_lancamentos) VALUES ('rebuild')")
+    cursor.execute("DELETE FROM busca_fornecedores")
+    cursor.execute(f"INSERT INTO busca_fornecedores (rowid, nome, cnpj) SELECT id, nome, {_sql_cnpj_busca('fornecedores')} FROM fornecedores")
+
+def reconstruir_busca(conn):
+    """Refaz os índices de busca a partir de lancamentos e fornecedores, numa única transação."""
+    try:
+        _recalcular_busca(conn.cursor())
+        commit_escrita(conn, 'lancamentos', 'fornecedores')
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def _expressao_busca(texto):
+    """Converte o texto digitado numa consulta FTS5.
+
+    Cada palavra vira uma busca por prefixo e todas precisam aparecer; pontuação dentro
+    da palavra (ex.: "12.345/0001") é mantida como frase, na ordem. Retorna None se não
+    sobrar nada para buscar.
+    """
+    termos = []
+    for palavra in texto.split():
+        tokens = re.findall(r'\w+', palavra)
+        if tokens:
+            termos.append('"%s" *' % ' '.join(tokens))
+    return ' '.join(termos) or None
+
+# Banco histórico: lançamentos e orçamentos de projetos encerrados, movidos por arquivamento.py
+# para um arquivo à parte (mesmo schema), que só é anexado quando a consulta pede o histórico.
+SUFIXO_HISTORICO = '_historico'
+TABELAS_HISTORICO = ('lancamentos', 'orcamentos') + tuple(TABELAS_AGREGADOS)
+
+def caminho_historico(conn):
+    """Caminho do banco histórico que acompanha o banco da conexão (None para bancos em memória)."""
+    banco = conn.execute("PRAGMA database_list").fetchone()[2]
+    if not banco:
+        return None
+    raiz, extensao = os.path.splitext(banco)
+    return raiz + SUFIXO_HISTORICO + (extensao or '.db')
+
+def tem_historico(conn):
+    """Indica se já existe banco histórico (algum projeto foi arquivado)."""
+    caminho = caminho_historico(conn)
+    return caminho is not None and os.path.exists(caminho)
+
+def _sql_view_historico(conn, tabela):
+    """View TEMP `tabela` com as linhas do banco principal e do histórico anexado."""
+    colunas = ', '.join(linha[1] for linha in conn.execute(f"PRAGMA main.table_xinfo({tabela})") if linha[6] != 1)
+    uniao = f"SELECT {colunas} FROM main.{tabela} UNION ALL SELECT {colunas} FROM historico.{tabela}"
+    if tabela == 'orcamentos':
+        # Orçamento regravado no banco principal depois do arquivamento prevalece sobre o histórico
+        uniao += " h WHERE NOT EXISTS (SELECT 1 FROM main.orcamentos o WHERE o.projeto_id = h.projeto_id AND o.categoria = h.categoria)"
+    elif tabela in CONSULTAS_AGREGADOS:
+        # Um projeto pode ter lançamentos nos dois bancos: os totais de cada chave são somados
+        chaves = ', '.join(CONSULTAS_AGREGADOS[tabela][0])
+        uniao = f"SELECT {chaves}, SUM(total_gasto) AS total_gasto, SUM(quantidade) AS quantidade FROM ({uniao}) GROUP BY {chaves}"
+    return f"CREATE TEMP VIEW {tabela} AS {uniao}"
+
+@contextmanager
+def historico_anexado(conn, incluir=True):
+    """Anexa o banco histórico durante o bloco e retorna se anexou.
+
+    Views TEMP com o nome das TABELAS_HISTORICO encobrem as tabelas do banco principal
+    e juntam as duas partes, então as consultas de sempre passam a ler o histórico.
+    Sem `incluir`, ou se ainda não houver banco histórico, não faz nada.
+    """
+    if not (incluir and tem_historico(conn)):
+        yield False
+        return
+    conn.execute("ATTACH DATABASE ? AS historico", (caminho_historico(conn),))
+    # Para o SQLite criar views TEMP é escrita: a conexão de leitura sai do query_only só para isso
+    somente_leitura = conn.execute("PRAGMA query_only").fetchone()[0]
+    try:
+        conn.execute("PRAGMA query_only = OFF")
+        for tabela in TABELAS_HISTORICO:
+            conn.execute(_sql_view_historico(conn, tabela))
+        conn.execute(f"PRAGMA query_only = {somente_leitura}")
+        yield True
+    finally:
+        conn.execute("PRAGMA query_only = OFF")
+        for tabela in TABELAS_HISTORICO:
+            conn.execute(f"DROP VIEW IF EXISTS temp.{tabela}")
+        conn.execute(f"PRAGMA query_only = {somente_leitura}")
+        conn.execute("DETACH DATABASE historico")
+
+def _com_historico(funcao):
+    """Decorador que dá à função get_* o parâmetro `incluir_historico` (False por padrão).
+
+    Com True, a função roda dentro de historico_anexado. Vai abaixo de @_cacheado, para o
+    parâmetro entrar na chave do cache e as respostas em cache não anexarem nada.
+    """
+    @functools.wraps(funcao)
+    def wrapper(conn, *args, incluir_historico=False, **kwargs):
+        with historico_anexado(conn, incluir_historico):
+            return funcao(conn, *args, **kwargs)
+    assinatura = inspect.signature(funcao)
+    wrapper.__signature__ = assinatura.replace(parameters=[
+        *assinatura.parameters.values(),
+        inspect.Parameter('incluir_historico', inspect.Parameter.KEYWORD_ONLY, default=False),
+    ])
+    return wrapper
+
+# Passos do schema, em ordem. PRAGMA user_version guarda quantos o banco já recebeu;
+# novos passos entram sempre no final e precisam ser idempotentes (IF NOT EXISTS etc.).
+MIGRACOES = [
+    _criar_tabelas_base,
+    _sincronizar_indices,
+    _criar_agregados,
+    _sincronizar_indices,  # coluna gerada `mes` e índices por mês
+    _criar_busca,
+    _sincronizar_indices,  # índice coberto dos orçamentos (matriz projeto x categoria)
+    _recriar_triggers_agregados,  # limpeza dos resumos só nas chaves do lançamento apagado
+]
+
+def versao_schema(conn):
+    """Retorna quantas migrações de MIGRACOES o banco já recebeu."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrar(conn, reaplicar=False):
+    """Aplica, numa única transação, as migrações que o banco ainda não recebeu.
+
+    Com `reaplicar`, todas rodam de novo, o que recria índices e triggers
+    removidos à mão (ex.: carga em massa do populate.py).
+    Retorna a versão do schema ao final.
+    """
+    if not reaplicar and versao_schema(conn) >= len(MIGRACOES):
+        return versao_schema(conn)
+    if conn.in_transaction:
         conn.commit()
-        return True
-    except sqlite3.Error as e:
-        print(f"Erro ao salvar fornecedor: {e}")
-        return False
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        # Relido dentro da transação: outro processo pode ter migrado enquanto esperávamos o lock
+        versao = 0 if reaplicar else versao_schema(conn)
+        otimizar = False
+        for passo in MIGRACOES[versao:]:
+            otimizar = passo(cursor) or otimizar
+        cursor.execute(f"PRAGMA user_version = {max(versao, len(MIGRACOES))}")
+        commit_escrita(conn, 'fornecedores', 'projetos', 'lancamentos', 'orcamentos')
+    except BaseException:
+        conn.rollback()
+        raise
+    if otimizar:
+        conn.execute("PRAGMA optimize")
+    return versao_schema(conn)
+
+def create_tables(conn):
+    """Cria as tabelas no banco de dados se não existirem (aplica as migrações pendentes)."""
+    migrar(conn)
+
+# Tipos das colunas nos DataFrames de leitura. Sem eles o pandas guarda um texto por linha
+# para valores que se repetem (classificação, nomes), datas como texto e ids em 64 bits.
+TIPOS_COLUNAS = {
+    'id': 'int32',
+    'projeto_id': 'int32',
+    'fornecedor_id': 'Int32',  # aceita nulo: lançamento sem fornecedor
+    'projeto_nome': 'category',
+    'fornecedor_nome': 'category',
+    'classificacao': 'category',
+    'categoria': 'category',
+    'data_lancamento': 'datetime64[ns]',
+    'emissao': 'datetime64[ns]',
+    'data_inicio': 'datetime64[ns]',
+    'data_fim_prevista': 'datetime64[ns]',
+}
+# Para resultados limitados (uma página, os primeiros da busca): montar as categorias custa
+# mais que o que economizam em poucas linhas, então só ids e datas mudam de tipo.
+TIPOS_PAGINA = {coluna: tipo for coluna, tipo in TIPOS_COLUNAS.items() if tipo != 'category'}
+TAMANHO_LOTE_LEITURA = 50_000
+
+def _converter_coluna(serie, tipo):
+    # Conversões pelo numpy: o astype do pandas tem um custo fixo que pesa nas páginas pequenas
+    valores = serie.to_numpy(dtype=object, na_value=None)
+    if tipo == 'category':
+        codigos, categorias = pd.factorize(valores)
+        return pd.Categorical.from_codes(codigos, dtype=pd.CategoricalDtype(categorias))
+    if tipo.startswith('datetime64'):
+        try:
+            return np.array(valores, dtype='datetime64[D]').astype(tipo)  # datas 'AAAA-MM-DD', o formato gravado
+        except ValueError:
+            return pd.to_datetime(serie, format='ISO8601', errors='coerce').astype(tipo)
+    if tipo[0].isupper():  # inteiro que aceita nulo (Int32)
+        return pd.array(valores, dtype=tipo)
+    return np.asarray(valores).astype(tipo)
+
+def _aplicar_tipos(df, tipos=None):
+    """Converte as colunas de `df` que aparecem em `tipos` (por padrão, TIPOS_COLUNAS)."""
+    tipos = TIPOS_COLUNAS if tipos is None else tipos
+    for coluna in df.columns:
+        if coluna in tipos:
+            df[coluna] = _converter_coluna(df[coluna], tipos[coluna])
+    return df
+
+def ler_sql(conn, query, params=(), tipos=None):
+    """Executa a consulta e retorna o DataFrame com os tipos de TIPOS_COLUNAS (ou `tipos`)."""
+    return _aplicar_tipos(pd.read_sql_query(query, conn, params=params), tipos)
 
+def ler_sql_em_lotes(conn, query, params=(), tamanho_lote=TAMANHO_LOTE_LEITURA, tipos=None):
+    """Como ler_sql, mas entrega o resultado em DataFrames de até `tamanho_lote` linhas.
+
+    Só um lote fica em memória por vez; a conexão precisa continuar aberta
+    enquanto o gerador é percorrido.
+    """
+    for lote in pd.read_sql_query(query, conn, params=params, chunksize=tamanho_lote):
+        yield _aplicar_tipos(lote, tipos)
+
+@_escrita('fornecedores', indice='fornecedores')
+def salvar_fornecedor(conn, nome, cnpj, telefone, email, endereco):
+    """Salva os dados de um novo fornecedor no banco de dados; a operação retorna o id."""
+    return conn.execute(
+        "INSERT INTO fornecedores (nome, cnpj, telefone, email, endereco) VALUES (?, ?, ?, ?, ?)",
+        (nome, cnpj, telefone, email, endereco)
+    ).lastrowid
+
+@_cacheado('fornecedores')
 def get_fornecedores(conn):
     """Retorna todos os fornecedores do banco de dados como um DataFrame."""
-    return pd.read_sql_query("SELECT id, nome FROM fornecedores", conn)
+    return ler_sql(conn, "SELECT id, nome FROM fornecedores")
 
+@_escrita('projetos', indice='projetos')
 def salvar_projeto(conn, nome, descricao, data_inicio, data_fim_prevista):
-    """Salva os dados de um novo projeto no banco de dados."""
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO projetos (nome, descricao, data_inicio, data_fim_prevista) VALUES (?, ?, ?, ?)",
-            (nome, descricao, data_inicio.strftime('%Y-%m-%d'), data_fim_prevista.strftime('%Y-%m-%d'))
-        )
-        conn.commit()
-        return True
-    except sqlite3.Error as e:
-        print(f"Erro ao salvar projeto: {e}")
-        return False
+    """Salva os dados de um novo projeto no banco de dados; a operação retorna o id."""
+    return conn.execute(
+        "INSERT INTO projetos (nome, descricao, data_inicio, data_fim_prevista) VALUES (?, ?, ?, ?)",
+        (nome, descricao, data_inicio.strftime('%Y-%m-%d'), data_fim_prevista.strftime('%Y-%m-%d'))
+    ).lastrowid
 
+@_cacheado('fornecedores')
+def get_fornecedores_por_texto(conn, texto, limite=20):
+    """Busca fornecedores pelo nome ou CNPJ (com ou sem pontuação), com prefixo em cada palavra.
+
+    Retorna (id, nome, cnpj) dos `limite` mais relevantes.
+    """
+    expressao = _expressao_busca(texto)
+    if expressao is None:
+        return pd.DataFrame(columns=['id', 'nome', 'cnpj'])
+    return ler_sql(
+        conn,
+        """
+        SELECT f.id, f.nome, f.cnpj
+        FROM (SELECT rowid, rank FROM busca_fornecedores WHERE busca_fornecedores MATCH ? ORDER BY rank LIMIT ?) b
+        JOIN fornecedores f ON f.id = b.rowid
+        ORDER BY b.rank
+        """,
+        (expressao, limite),
+        TIPOS_PAGINA
+    )
+
+@_cacheado('projetos')
 def get_projetos(conn):
     """Retorna todos os projetos do banco de dados como um DataFrame."""
-    return pd.read_sql_query("SELECT id, nome FROM projetos", conn)
+    return ler_sql(conn, "SELECT id, nome FROM projetos")
+
+class IndiceNomes:
+    """Índice id <-> nome de um cadastro (projetos ou fornecedores), com busca O(1) nos dois sentidos.
+
+    Nomes podem se repetir: `ids_por_nome` devolve todos os ids e `rotulo`
+    acrescenta o id ao nome repetido, para que selectboxes guardem o id sem ambiguidade.
+    """
+
+    def __init__(self, linhas=()):
+        self._lock = threading.Lock()
+        self._nomes = {}  # id -> nome, na ordem de cadastro
+        self._ids_por_nome = {}  # nome -> [ids]
+        for id_, nome in linhas:
+            self._incluir(id_, nome)
+
+    def _incluir(self, id_, nome):
+        self._nomes[id_] = nome
+        self._ids_por_nome.setdefault(nome, []).append(id_)
+
+    def adicionar(self, id_, nome):
+        """Inclui um registro recém-cadastrado sem recarregar o índice."""
+        with self._lock:
+            if id_ not in self._nomes:
+                self._incluir(id_, nome)
+
+    @property
+    def ids(self):
+        """Lista dos ids, na ordem de cadastro (opções dos selectboxes)."""
+        with self._lock:
+            return list(self._nomes)
+
+    def nome(self, id_):
+        return self._nomes[id_]
+
+    def ids_por_nome(self, nome):
+        return tuple(self._ids_por_nome.get(nome, ()))
+
+    def id_por_nome(self, nome):
+        """Retorna o id do nome, ou None se o nome não existir ou se repetir."""
+        ids = self._ids_por_nome.get(nome, ())
+        return ids[0] if len(ids) == 1 else None
+
+    def rotulo(self, id_):
+        """Nome para exibição; nomes repetidos levam o id entre parênteses."""
+        nome = self._nomes[id_]
+        return nome if len(self._ids_por_nome[nome]) == 1 else f"{nome} (#{id_})"
+
+    def __len__(self):
+        return len(self._nomes)
 
+    def __contains__(self, id_):
+        return id_ in self._nomes
+
+# Um índice por banco e tabela, compartilhado pelas sessões; vale enquanto a versão da tabela não mudar
+_indices_nomes = {}  # (banco, tabela) -> (versão, IndiceNomes)
+_indices_nomes_lock = threading.Lock()
+
+def _indice_nomes(conn, tabela):
+    versao = versao_dados(conn, tabela)
+    if versao is not None:
+        with _indices_nomes_lock:
+            entrada = _indices_nomes.get((versao[0], tabela))
+        if entrada is not None and entrada[0] == versao:
+            return entrada[1]
+    indice = IndiceNomes(conn.execute(f"SELECT id, nome FROM {tabela} ORDER BY id"))
+    if versao is not None:
+        with _indices_nomes_lock:
+            _indices_nomes[(versao[0], tabela)] = (versao, indice)
+    return indice
+
+def _acrescentar_ao_indice(conn, tabela, versao_anterior, registros):
+    """Leva ao índice os registros (id, nome) recém-inseridos, se o índice refletia a versão anterior à escrita.
+
+    Caso contrário houve outra escrita no meio, e o índice é recarregado na próxima consulta.
+    """
+    versao = versao_dados(conn, tabela)
+    if versao is None:
+        return
+    with _indices_nomes_lock:
+        entrada = _indices_nomes.get((versao[0], tabela))
+        if entrada is not None and entrada[0] == versao_anterior:
+            for id_, nome in registros:
+                entrada[1].adicionar(id_, nome)
+            _indices_nomes[(versao[0], tabela)] = (versao, entrada[1])
+
+def get_indice_projetos(conn):
+    """Retorna o IndiceNomes compartilhado dos projetos."""
+    return _indice_nomes(conn, 'projetos')
+
+def get_indice_fornecedores(conn):
+    """Retorna o IndiceNomes compartilhado dos fornecedores."""
+    return _indice_nomes(conn, 'fornecedores')
+
+@_escrita('lancamentos')
 def salvar_lancamento(conn, projeto_id, data_lancamento, classificacao, emissao, documento, fornecedor_id, descricao, valor_faturado):
-    """Salva os dados de um novo lançamento no banco de dados."""
+    """Salva os dados de um novo lançamento no banco de dados; a operação retorna o id."""
+    return conn.execute(
+        "INSERT INTO lancamentos (projeto_id, data_lancamento, classificacao, emissao, documento, fornecedor_id, descricao, valor_faturado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (projeto_id, data_lancamento.strftime('%Y-%m-%d'), classificacao, emissao.strftime('%Y-%m-%d') if emissao else None, documento, fornecedor_id, descricao, valor_faturado)
+    ).lastrowid
+
+def salvar_lancamentos_em_lote(conn, lotes):
+    """Insere lançamentos em massa numa única transação.
+
+    `lotes` é um iterável de listas de tuplas no formato (projeto_id, data_lancamento,
+    classificacao, emissao, documento, fornecedor_id, descricao, valor_faturado), com
+    datas já formatadas como 'AAAA-MM-DD'. Cada lote é gravado com `executemany`.
+    Retorna o número de linhas inseridas; em caso de erro desfaz tudo e relança a exceção.
+    """
     cursor = conn.cursor()
+    inseridos = 0
     try:
-        cursor.execute(
-            "INSERT INTO lancamentos (projeto_id, data_lancamento, classificacao, emissao, documento, fornecedor_id, descricao, valor_faturado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (projeto_id, data_lancamento.strftime('%Y-%m-%d'), classificacao, emissao.strftime('%Y-%m-%d') if emissao else None, documento, fornecedor_id, descricao, valor_faturado)
-        )
-        conn.commit()
-        return True
-    except sqlite3.Error as e:
-        print(f"Erro ao salvar lançamento: {e}")
-        return False
+        for registros in lotes:
+            cursor.executemany(
+                "INSERT INTO lancamentos (projeto_id, data_lancamento, classificacao, emissao, documento, fornecedor_id, descricao, valor_faturado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                registros
+            )
+            inseridos += len(registros)
+        commit_escrita(conn, 'lancamentos')
+    except Exception:
+        conn.rollback()
+        raise
+    return inseridos
 
+@_cacheado('lancamentos', 'projetos', 'fornecedores')
+@_com_historico
 def get_lancamentos_por_projeto(conn, projeto_id):
     """Retorna todos os lançamentos de um projeto específico como um DataFrame."""
-    return pd.read_sql_query(
+    return ler_sql(
+        conn,
         "SELECT l.id, p.nome as projeto_nome, f.nome as fornecedor_nome, l.data_lancamento, l.classificacao, l.valor_faturado FROM lancamentos l JOIN projetos p ON l.projeto_id = p.id LEFT JOIN fornecedores f ON l.fornecedor_id = f.id WHERE l.projeto_id = ?",
+        (projeto_id,)
+    )
+
+@_cacheado('lancamentos')
+def get_lancamentos_por_texto(conn, texto, limite=20):
+    """Busca lançamentos pela descrição ou pelo documento, com prefixo em cada palavra.
+
+    Retorna até `limite` lançamentos, os mais recentes primeiro (o índice entrega
+    os ids em ordem, então a resposta não depende de quantos lançamentos casam).
+    """
+    expressao = _expressao_busca(texto)
+    if expressao is None:
+        return _aplicar_tipos(pd.DataFrame(columns=['id', 'projeto_nome', 'fornecedor_nome', 'data_lancamento', 'classificacao', 'documento', 'descricao', 'valor_faturado']), TIPOS_PAGINA)
+    return ler_sql(
         conn,
-        params=(projeto_id,)
+        """
+        SELECT l.id, p.nome as projeto_nome, f.nome as fornecedor_nome, l.data_lancamento, l.classificacao, l.documento, l.descricao, l.valor_faturado
+        FROM (SELECT rowid FROM busca_lancamentos WHERE busca_lancamentos MATCH ? ORDER BY rowid DESC LIMIT ?) b
+        JOIN lancamentos l ON l.id = b.rowid
+        JOIN projetos p ON l.projeto_id = p.id
+        LEFT JOIN fornecedores f ON l.fornecedor_id = f.id
+        ORDER BY l.id DESC
+        """,
+        (expressao, limite),
+        TIPOS_PAGINA
+    )
+
+def _filtros_lancamentos(projeto_id, data_inicio, data_fim, classificacao, fornecedor_id):
+    """Monta o WHERE (sobre o alias `l`) e os parâmetros dos filtros da listagem de lançamentos."""
+    condicoes = ["l.projeto_id = ?"]
+    params = [projeto_id]
+    if data_inicio:
+        condicoes.append("l.data_lancamento >= ?")
+        params.append(data_inicio.strftime('%Y-%m-%d'))
+    if data_fim:
+        condicoes.append("l.data_lancamento <= ?")
+        params.append(data_fim.strftime('%Y-%m-%d'))
+    if classificacao:
+        condicoes.append("l.classificacao = ?")
+        params.append(classificacao)
+    if fornecedor_id:
+        condicoes.append("l.fornecedor_id = ?")
+        params.append(fornecedor_id)
+    return condicoes, params
+
+def iterar_lancamentos(conn, projeto_id, data_inicio=None, data_fim=None, classificacao=None, fornecedor_id=None, tamanho_lote=TAMANHO_LOTE_LEITURA, incluir_historico=False):
+    """Percorre, em lotes tipados, todos os lançamentos do projeto que atendem aos filtros.
+
+    Mesma ordem e filtros da listagem paginada, com todas as colunas; para exportações
+    e leituras grandes sem materializar o resultado inteiro.
+    """
+    condicoes, params = _filtros_lancamentos(projeto_id, data_inicio, data_fim, classificacao, fornecedor_id)
+    with historico_anexado(conn, incluir_historico):
+        yield from ler_sql_em_lotes(
+            conn,
+            f"""
+            SELECT l.id, p.nome as projeto_nome, f.nome as fornecedor_nome, l.data_lancamento, l.classificacao,
+                   l.emissao, l.documento, l.descricao, l.valor_faturado
+            FROM lancamentos l
+            JOIN projetos p ON l.projeto_id = p.id
+            LEFT JOIN fornecedores f ON l.fornecedor_id = f.id
+            WHERE {' AND '.join(condicoes)}
+            ORDER BY l.data_lancamento DESC, l.id DESC
+            """,
+            params,
+            tamanho_lote
+        )
+
+def exportar_lancamentos_csv(conn, destino, projeto_id, tamanho_lote=TAMANHO_LOTE_LEITURA, **filtros):
+    """Grava em `destino` (caminho ou arquivo de texto aberto) o CSV dos lançamentos, lote a lote.
+
+    Retorna o número de linhas exportadas.
+    """
+    linhas = 0
+    for lote in iterar_lancamentos(conn, projeto_id, tamanho_lote=tamanho_lote, **filtros):
+        lote.to_csv(destino, mode='a' if linhas else 'w', header=not linhas, index=False, date_format='%Y-%m-%d')
+        linhas += len(lote)
+    return linhas
+
+@_cacheado('lancamentos', 'projetos', 'fornecedores')
+@_com_historico
+def get_lancamentos_paginados(conn, projeto_id, apos=None, tamanho_pagina=50, data_inicio=None, data_fim=None, classificacao=None, fornecedor_id=None):
+    """Retorna uma página de lançamentos do projeto, do mais recente para o mais antigo.
+
+    A paginação é por chave (keyset) em (data_lancamento, id): `apos` é a chave do
+    último lançamento da página anterior, então cada página custa o mesmo, em vez de
+    crescer com o OFFSET. Retorna o DataFrame da página e se há uma próxima página.
+    """
+    condicoes, params = _filtros_lancamentos(projeto_id, data_inicio, data_fim, classificacao, fornecedor_id)
+    if apos is not None:
+        condicoes.append("(l.data_lancamento, l.id) < (?, ?)")
+        params.extend(apos)
+    df = ler_sql(
+        conn,
+        f"""
+        SELECT l.id, p.nome as projeto_nome, f.nome as fornecedor_nome, l.data_lancamento, l.classificacao, l.valor_faturado
+        FROM lancamentos l
+        JOIN projetos p ON l.projeto_id = p.id
+        LEFT JOIN fornecedores f ON l.fornecedor_id = f.id
+        WHERE {' AND '.join(condicoes)}
+        ORDER BY l.data_lancamento DESC, l.id DESC
+        LIMIT ?
+        """,
+        params + [tamanho_pagina + 1],
+        TIPOS_PAGINA
     )
+    return df.head(tamanho_pagina), len(df) > tamanho_pagina
+
+@_cacheado('lancamentos')
+@_com_historico
+def contar_lancamentos(conn, projeto_id, data_inicio=None, data_fim=None, classificacao=None, fornecedor_id=None):
+    """Retorna o total de lançamentos do projeto que atendem aos filtros.
+
+    Sem filtro de período ou fornecedor a contagem sai das tabelas de resumo.
+    """
+    if not (data_inicio or data_fim or fornecedor_id):
+        query = "SELECT COALESCE(SUM(quantidade), 0) FROM gastos_projeto_classificacao WHERE projeto_id = ?"
+        params = [projeto_id]
+        if classificacao:
+            query += " AND classificacao = ?"
+            params.append(classificacao)
+        return conn.execute(query, params).fetchone()[0]
+    condicoes, params = _filtros_lancamentos(projeto_id, data_inicio, data_fim, classificacao, fornecedor_id)
+    return conn.execute(f"SELECT COUNT(*) FROM lancamentos l WHERE {' AND '.join(condicoes)}", params).fetchone()[0]
+
+# Upsert: insere a categoria ou atualiza o valor; valor igual ao atual não gera escrita
+_SQL_UPSERT_ORCAMENTO = """
+    INSERT INTO orcamentos (projeto_id, categoria, valor_orcado, data_atualizacao)
+    VALUES (?, ?, ?, STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW'))
+    ON CONFLICT (projeto_id, categoria) DO UPDATE
+    SET valor_orcado = excluded.valor_orcado, data_atualizacao = excluded.data_atualizacao
+    WHERE valor_orcado IS NOT excluded.valor_orcado
+"""
 
+@_escrita('orcamentos')
 def salvar_orcamento(conn, projeto_id, categoria, valor_orcado):
     """Salva ou atualiza o orçamento para um projeto e categoria."""
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT OR IGNORE INTO orcamentos (projeto_id, categoria, valor_orcado, data_atualizacao) VALUES (?, ?, ?, STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW'))",
-            (projeto_id, categoria, valor_orcado)
-        )
-        cursor.execute(
-            "UPDATE orcamentos SET valor_orcado = ?, data_atualizacao = STRFTIME('%Y-%m-%d %H:%M:%f', 'NOW') WHERE projeto_id = ? AND categoria = ?",
-            (valor_orcado, projeto_id, categoria)
-        )
-        conn.commit()
-        return True
-    except sqlite3.Error as e:
-        print(f"Erro ao salvar/atualizar orçamento: {e}")
-        return False
+    conn.execute(_SQL_UPSERT_ORCAMENTO, (projeto_id, categoria, valor_orcado))
 
+@_escrita('orcamentos')
+def salvar_orcamentos(conn, projeto_id, valores):
+    """Salva ou atualiza, numa só operação, o orçamento de várias categorias ({categoria: valor}) de um projeto."""
+    conn.executemany(_SQL_UPSERT_ORCAMENTO, [(projeto_id, categoria, valor) for categoria, valor in valores.items()])
+
+@_cacheado('orcamentos')
+@_com_historico
 def get_orcamentos_por_projeto(conn, projeto_id):
     """Retorna os orçamentos de um projeto específico como um DataFrame."""
-    return pd.read_sql_query("SELECT categoria, valor_orcado FROM orcamentos WHERE projeto_id = ?", conn, params=(projeto_id,))
+    return ler_sql(conn, "SELECT categoria, valor_orcado FROM orcamentos WHERE projeto_id = ?", (projeto_id,), TIPOS_PAGINA)
+
+@_cacheado('orcamentos', 'projetos')
+@_com_historico
+def get_orcamentos(conn):
+    """Retorna os orçamentos de todos os projetos (projeto_nome, categoria, valor_orcado)."""
+    return ler_sql(
+        conn,
+        "SELECT p.nome as projeto_nome, o.categoria, o.valor_orcado FROM projetos p JOIN orcamentos o ON o.projeto_id = p.id ORDER BY p.id, o.categoria"
+    )
+
 
+# Categorias de orçamento, na ordem em que aparecem nos relatórios
+CATEGORIAS_ORCAMENTO = ["Aluminio", "Material", "Pintura", "Vidros", "Beneficiamento", "Projetos", "Adiantamentos", "Instalacao"]
 
+@_cacheado('orcamentos', 'lancamentos')
+@_com_historico
 def get_gastos_orcamento_projeto(conn, projeto_id):
     """Retorna um DataFrame comparando gastos e orçamento por categoria para um projeto."""
-    # Buscar o orçamento do projeto selecionado
-    df_orcamento_projeto = pd.read_sql_query(
+    orcado = pd.read_sql_query(
         "SELECT categoria, valor_orcado FROM orcamentos WHERE projeto_id = ?",
         conn,
         params=(projeto_id,)
-    )
-    orcamento_projeto = df_orcamento_projeto.set_index('categoria')['valor_orcado'].to_dict()
-
-    # Buscar os gastos do projeto selecionado
-    df_gastos_projeto = pd.read_sql_query(
-        "SELECT classificacao, SUM(valor_faturado) as total_gasto FROM lancamentos WHERE projeto_id = ? GROUP BY classificacao",
+    ).set_index('categoria')['valor_orcado']
+    gasto = pd.read_sql_query(
+        "SELECT classificacao, total_gasto FROM gastos_projeto_classificacao WHERE projeto_id = ?",
         conn,
         params=(projeto_id,)
+    ).set_index('classificacao')['total_gasto']
+    # Categorias fora da lista (orçadas ou lançadas) entram no fim, em vez de sumir do relatório
+    extras = orcado.index.union(gasto.index).difference(CATEGORIAS_ORCAMENTO).tolist()
+    categorias = CATEGORIAS_ORCAMENTO + sorted(extras)
+    orcado = orcado.reindex(categorias, fill_value=0).to_numpy()
+    gasto = gasto.reindex(categorias, fill_value=0).to_numpy()
+    return pd.DataFrame({'Categoria': categorias, 'Orçado': orcado, 'Gasto': gasto, 'Variação': orcado - gasto})
+
+@_cacheado('orcamentos', 'lancamentos', 'projetos')
+@_com_historico
+def get_matriz_orcamento_gasto(conn):
+    """Retorna orçado, gasto e variação de cada par (projeto, categoria) da carteira, numa só consulta.
+
+    As categorias vêm dos dados (orçadas ou lançadas), não de CATEGORIAS_ORCAMENTO.
+    Uma linha por par; pivotar_matriz monta a tabela projetos x categorias.
+    """
+    df = ler_sql(
+        conn,
+        """
+        SELECT p.id as projeto_id, p.nome as projeto_nome, m.categoria,
+               SUM(m.orcado) as total_orcado, SUM(m.gasto) as total_gasto
+        FROM (
+            SELECT o.projeto_id, o.categoria, o.valor_orcado as orcado, 0.0 as gasto FROM orcamentos o
+            UNION ALL
+            SELECT g.projeto_id, g.classificacao, 0.0, g.total_gasto FROM gastos_projeto_classificacao g
+        ) m
+        JOIN projetos p ON p.id = m.projeto_id
+        GROUP BY p.id, m.categoria
+        ORDER BY p.id, m.categoria
+        """
     )
-    gastos_por_categoria = df_gastos_projeto.set_index('classificacao')['total_gasto'].to_dict()
+    df['variacao'] = df['total_orcado'] - df['total_gasto']
+    return df
+
+def pivotar_matriz(df_matriz, coluna):
+    """Tabela projetos (índice projeto_id) x categorias com os valores de `coluna` de get_matriz_orcamento_gasto.
 
-    categorias_orcamento_lista = ["Aluminio", "Material", "Pintura", "Vidros", "Beneficiamento", "Projetos", "Adiantamentos", "Instalacao"]
-    data_relatorio = []
+    Pares sem orçamento nem gasto ficam NaN.
+    """
+    matriz = df_matriz.pivot(index='projeto_id', columns='categoria', values=coluna)
+    matriz.columns = matriz.columns.astype(str)
+    return matriz
 
-    for categoria in categorias_orcamento_lista:
-        orcado = orcamento_projeto.get(categoria, 0)
-        gasto = gastos_por_categoria.get(categoria, 0)
-        data_relatorio.append({'Categoria': categoria, 'Orçado': orcado, 'Gasto': gasto, 'Variação': orcado - gasto})
+@_cacheado('projetos', 'orcamentos', 'lancamentos')
+@_com_historico
+def get_dados_previsao(conn):
+    """Retorna (projetos, orcamentos, gastos_mensais) de todos os projetos, a entrada de previsao.calcular_previsao.
 
-    return pd.DataFrame(data_relatorio)
+    Os gastos vêm do resumo mensal: o custo depende de projetos x categorias x meses,
+    e não do número de lançamentos.
+    """
+    projetos = ler_sql(conn, "SELECT id, nome, data_inicio, data_fim_prevista FROM projetos")
+    orcamentos = ler_sql(conn, "SELECT o.projeto_id, o.categoria, o.valor_orcado FROM projetos p JOIN orcamentos o ON o.projeto_id = p.id ORDER BY p.id, o.categoria")
+    gastos_mensais = ler_sql(conn, "SELECT projeto_id, classificacao, mes, total_gasto FROM gastos_mensais")
+    return projetos, orcamentos, gastos_mensais
 
+@_cacheado('orcamentos', 'lancamentos', 'projetos')
+@_com_historico
 def get_comparativo_orcamento_gasto_por_projeto(conn):
     """Retorna um DataFrame com o comparativo de orçamento e gasto total por projeto."""
     df_orcamento_total = pd.read_sql_query(
@@ -185,7 +1684,7 @@ def get_comparativo_orcamento_gasto_por_projeto(conn):
         conn
     )
     df_gasto_total = pd.read_sql_query(
-        "SELECT projeto_id, SUM(valor_faturado) as total_gasto FROM lancamentos GROUP BY projeto_id",
+        "SELECT projeto_id, SUM(total_gasto) as total_gasto FROM gastos_projeto_classificacao GROUP BY projeto_id",
         conn
     )
     df_projetos = pd.read_sql_query("SELECT id, nome FROM projetos", conn)
@@ -198,6 +1697,7 @@ def get_comparativo_orcamento_gasto_por_projeto(conn):
     df_comparativo = df_comparativo[['Projeto', 'total_orcado', 'total_gasto']]
     return df_comparativo
 
+@_cacheado('projetos')
 def get_resumo_projetos(conn):
     """Retorna um DataFrame com o resumo dos projetos (nome, data de início, data de fim prevista)."""
     return pd.read_sql_query(
@@ -205,67 +1705,176 @@ def get_resumo_projetos(conn):
         conn
     )
 
-def get_comparativo_orcamento_gasto_por_projeto(conn):
-    """Retorna um DataFrame com o comparativo de orçamento e gasto total por projeto."""
-    df_orcamento_total = pd.read_sql_query(
-        "SELECT projeto_id, SUM(valor_orcado) as total_orcado FROM orcamentos GROUP BY projeto_id",
-        conn
-    )
-    df_gasto_total = pd.read_sql_query(
-        "SELECT projeto_id, SUM(valor_faturado) as total_gasto FROM lancamentos GROUP BY projeto_id",
-        conn
-    )
-    df_projetos = pd.read_sql_query("SELECT id, nome FROM projetos", conn)
-
-    df_comparativo = pd.merge(df_projetos, df_orcamento_total, left_on='id', right_on='projeto_id', how='left')
-    df_comparativo = pd.merge(df_comparativo, df_gasto_total, on='projeto_id', how='left')
-
-    df_comparativo.rename(columns={'nome': 'Projeto'}, inplace=True)
-    df_comparativo.fillna(0, inplace=True)
-    df_comparativo = df_comparativo[['Projeto', 'total_orcado', 'total_gasto']]
-    return df_comparativo
-
+@_cacheado('lancamentos')
+@_com_historico
 def get_gasto_por_classificacao(conn):
     """Retorna um DataFrame com o gasto total por classificação."""
     return pd.read_sql_query(
-        "SELECT classificacao, SUM(valor_faturado) as total_gasto FROM lancamentos GROUP BY classificacao ORDER BY total_gasto DESC",
+        "SELECT classificacao, SUM(total_gasto) as total_gasto FROM gastos_projeto_classificacao GROUP BY classificacao ORDER BY total_gasto DESC",
         conn
     )
 
 
+@_cacheado('lancamentos', 'fornecedores')
+@_com_historico
 def get_gasto_por_fornecedor(conn):
     """Retorna um DataFrame com o gasto total por fornecedor."""
     return pd.read_sql_query(
         """
-        SELECT f.nome as fornecedor, SUM(l.valor_faturado) as total_gasto
-        FROM lancamentos l
-        JOIN fornecedores f ON l.fornecedor_id = f.id
+        SELECT f.nome as fornecedor, SUM(g.total_gasto) as total_gasto
+        FROM gastos_fornecedor g
+        JOIN fornecedores f ON g.fornecedor_id = f.id
         GROUP BY f.nome
         ORDER BY total_gasto DESC
         """,
         conn
     )
 
-def get_gastos_mensais(conn, classificacao=None):
-    """Retorna um DataFrame com os gastos mensais, opcionalmente filtrado por classificação."""
-    query = """
-        SELECT STRFTIME('%Y-%m', data_lancamento) as mes_ano, SUM(valor_faturado) as total_gasto
-        FROM lancamentos
+@_cacheado('lancamentos')
+@_com_historico
+def get_gastos_mensais(conn, projeto_id=None, classificacao=None, data_inicio=None, data_fim=None):
+    """Retorna a série mensal de gastos (mes_ano, total_gasto), com um registro por mês.
+
+    Os filtros são opcionais. Meses sem gasto aparecem com zero, do início ao fim
+    do período (ou do primeiro ao último mês com lançamentos). Meses inteiros vêm
+    da tabela de resumo gastos_mensais; só os meses cortados pelo período
+    leem lançamentos, pelo índice da coluna `mes`.
     """
+    mes_inicio = data_inicio.strftime('%Y-%m') if data_inicio else None
+    mes_fim = data_fim.strftime('%Y-%m') if data_fim else None
+    parciais = set()
+    if data_inicio and data_inicio.day != 1:
+        parciais.add(mes_inicio)
+    if data_fim and (data_fim + timedelta(days=1)).day != 1:
+        parciais.add(mes_fim)
+
+    condicoes = []
     params = []
+    if projeto_id:
+        condicoes.append("projeto_id = ?")
+        params.append(projeto_id)
     if classificacao:
-        query += " WHERE classificacao = ?"
+        condicoes.append("classificacao = ?")
         params.append(classificacao)
-    query += " GROUP BY mes_ano ORDER BY mes_ano"
-    return pd.read_sql_query(query, conn, params=params)
+    condicoes_resumo = list(condicoes)
+    params_resumo = list(params)
+    if mes_inicio:
+        condicoes_resumo.append("mes >= ?")
+        params_resumo.append(mes_inicio)
+    if mes_fim:
+        condicoes_resumo.append("mes <= ?")
+        params_resumo.append(mes_fim)
+    if parciais:
+        condicoes_resumo.append(f"mes NOT IN ({', '.join('?' * len(parciais))})")
+        params_resumo.extend(sorted(parciais))
+    query = "SELECT mes, total_gasto FROM gastos_mensais"
+    if condicoes_resumo:
+        query += " WHERE " + " AND ".join(condicoes_resumo)
 
+    if parciais:
+        condicoes_parciais = condicoes + [f"mes IN ({', '.join('?' * len(parciais))})"]
+        params_parciais = params + sorted(parciais)
+        if data_inicio:
+            condicoes_parciais.append("data_lancamento >= ?")
+            params_parciais.append(data_inicio.strftime('%Y-%m-%d'))
+        if data_fim:
+            condicoes_parciais.append("data_lancamento <= ?")
+            params_parciais.append(data_fim.strftime('%Y-%m-%d'))
+        query += " UNION ALL SELECT mes, valor_faturado FROM lancamentos WHERE " + " AND ".join(condicoes_parciais)
+        params_resumo += params_parciais
+
+    df = pd.read_sql_query(
+        f"SELECT mes as mes_ano, SUM(total_gasto) as total_gasto FROM ({query}) GROUP BY mes_ano ORDER BY mes_ano",
+        conn, params=params_resumo
+    )
+    return completar_meses(df, mes_inicio, mes_fim)
+
+def completar_meses(df, mes_inicio=None, mes_fim=None):
+    """Completa uma série (mes_ano, total_gasto) ordenada com os meses sem gasto, zerados.
+
+    Sem `mes_inicio`/`mes_fim` ('AAAA-MM'), vai do primeiro ao último mês da série.
+    """
+    if df.empty and not (mes_inicio and mes_fim):
+        return df
+    inicio = mes_inicio or df['mes_ano'].iloc[0]
+    fim = mes_fim or df['mes_ano'].iloc[-1]
+    meses = pd.period_range(inicio, fim, freq='M').strftime('%Y-%m')
+    serie = df.set_index('mes_ano')['total_gasto'].reindex(meses, fill_value=0.0)
+    return pd.DataFrame({'mes_ano': meses, 'total_gasto': serie.to_numpy(dtype=float)})
+
+@_cacheado('orcamentos')
+@_com_historico
 def get_orcamento_total_projeto(conn, projeto_id):
-    """Retorna o orçamento total de um projeto."""
+    """Retorna o orçamento total de um projeto (0 se não houver orçamento cadastrado)."""
     df_orcamento = pd.read_sql_query(
-        "SELECT SUM(valor_orcado) as total_orcado FROM orcamentos WHERE projeto_id = ?",
+        "SELECT COALESCE(SUM(valor_orcado), 0) as total_orcado FROM orcamentos WHERE projeto_id = ?",
         conn,
         params=(projeto_id,)
     )
     return df_orcamento['total_orcado'].iloc[0] if not df_orcamento.empty else 0
 
+class SnapshotDashboard:
+    """Todos os agregados do Dashboard, calculados numa única passada.
+
+    Os totais por projeto e por classificação saem do mesmo DataFrame
+    (gastos_projeto_classificacao), agrupado uma vez por dimensão em pandas.
+    A série mensal, que depende do projeto e do período escolhidos, vem de
+    get_gastos_mensais.
+    """
+
+    def __init__(self, projetos, orcamentos, gastos_projeto_classificacao, gasto_por_fornecedor):
+        self.projetos = projetos
+        self.gasto_por_fornecedor = gasto_por_fornecedor
+        self.orcamento_por_projeto = orcamentos.set_index('projeto_id')['total_orcado']
+
+        gasto_por_projeto = gastos_projeto_classificacao.groupby('projeto_id')['total_gasto'].sum()
+        self.comparativo = pd.DataFrame({
+            'Projeto': projetos['nome'],
+            'total_orcado': projetos['id'].map(self.orcamento_por_projeto).fillna(0).to_numpy(dtype=float),
+            'total_gasto': projetos['id'].map(gasto_por_projeto).fillna(0).to_numpy(dtype=float),
+        })
+        self.gasto_por_classificacao = (
+            gastos_projeto_classificacao.groupby('classificacao', as_index=False)['total_gasto'].sum()
+            .sort_values('total_gasto', ascending=False, ignore_index=True)
+        )
+        self.classificacoes = sorted(self.gasto_por_classificacao['classificacao'])
+
+    def orcamento_total(self, projeto_id):
+        """Orçamento total de um projeto (0 se não houver orçamento cadastrado)."""
+        return float(self.orcamento_por_projeto.get(projeto_id, 0))
+
+    def copy(self):
+        copia = object.__new__(SnapshotDashboard)
+        for nome, valor in vars(self).items():
+            setattr(copia, nome, valor.copy())
+        return copia
+
+@_cacheado('lancamentos', 'orcamentos', 'projetos', 'fornecedores')
+@_com_historico
+def get_dashboard_snapshot(conn):
+    """Retorna um SnapshotDashboard com todos os dados do Dashboard.
+
+    Lê cada tabela de resumo uma única vez, em vez de uma consulta por gráfico.
+    """
+    projetos = pd.read_sql_query("SELECT id, nome FROM projetos", conn)
+    orcamentos = pd.read_sql_query(
+        "SELECT projeto_id, SUM(valor_orcado) as total_orcado FROM orcamentos GROUP BY projeto_id",
+        conn
+    )
+    gastos_projeto_classificacao = pd.read_sql_query(
+        "SELECT projeto_id, classificacao, total_gasto FROM gastos_projeto_classificacao",
+        conn
+    )
+    gasto_por_fornecedor = pd.read_sql_query(
+        """
+        SELECT f.nome as fornecedor, SUM(g.total_gasto) as total_gasto
+        FROM gastos_fornecedor g
+        JOIN fornecedores f ON g.fornecedor_id = f.id
+        GROUP BY f.nome
+        ORDER BY total_gasto DESC
+        """,
+        conn
+    )
+    return SnapshotDashboard(projetos, orcamentos, gastos_projeto_classificacao, gasto_por_fornecedor)
+
 # Adicionaremos outras funções aqui conforme avançamos
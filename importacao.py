@@ -0,0 +1,208 @@
+import argparse
+import csv
+import sys
+import time
+import pandas as pd
+import database
+
+TAMANHO_LOTE = 50_000
+COLUNAS_OBRIGATORIAS = ('data_lancamento', 'classificacao', 'valor_faturado')
+
+def _detectar_separador(arquivo):
+    """Descobre o separador do CSV (',' ou ';') pela primeira linha, sem consumir o arquivo."""
+    if hasattr(arquivo, 'read'):
+        posicao = arquivo.tell()
+        primeira_linha = arquivo.readline()
+        arquivo.seek(posicao)
+    else:
+        with open(arquivo, 'rb') as f:
+            primeira_linha = f.readline()
+    if isinstance(primeira_linha, bytes):
+        primeira_linha = primeira_linha.decode('utf-8-sig', errors='replace')
+    try:
+        return csv.Sniffer().sniff(primeira_linha, delimiters=',;\t').delimiter
+    except csv.Error:
+        return ','
+
+def ler_arquivo(arquivo, nome=None, tamanho_lote=TAMANHO_LOTE):
+    """Lê um CSV ou XLSX em DataFrames de até `tamanho_lote` linhas, com todas as colunas como texto.
+
+    `arquivo` pode ser um caminho ou um objeto de arquivo (ex.: upload do Streamlit);
+    nesse caso `nome` indica a extensão.
+    """
+    nome = nome or getattr(arquivo, 'name', str(arquivo))
+    if nome.lower().endswith(('.xlsx', '.xlsm', '.xls')):
+        # O formato não permite leitura parcial: carrega a planilha e a fatia em lotes
+        df = pd.read_excel(arquivo, dtype=str)
+        for inicio in range(0, len(df), tamanho_lote):
+            yield df.iloc[inicio:inicio + tamanho_lote]
+    else:
+        separador = _detectar_separador(arquivo)
+        yield from pd.read_csv(arquivo, sep=separador, dtype=str, chunksize=tamanho_lote, encoding='utf-8-sig')
+
+def _normalizar(valores):
+    return valores.astype('string').str.strip().str.casefold()
+
+def _mapa_nomes(df_cadastro):
+    """Retorna o mapa nome normalizado -> id e o conjunto de nomes que aparecem mais de uma vez."""
+    nomes = _normalizar(df_cadastro['nome'])
+    duplicados = set(nomes[nomes.duplicated(keep=False)])
+    unicos = ~nomes.isin(duplicados)
+    return dict(zip(nomes[unicos], df_cadastro['id'][unicos])), duplicados
+
+def _converter_datas(valores):
+    """Converte datas em 'AAAA-MM-DD' (ISO) ou 'DD/MM/AAAA'; inválidas viram NaT."""
+    datas = pd.to_datetime(valores, format='ISO8601', errors='coerce')
+    faltantes = datas.isna() & valores.notna()
+    if faltantes.any():
+        datas[faltantes] = pd.to_datetime(valores[faltantes], format='%d/%m/%Y', errors='coerce')
+    return datas
+
+def _converter_valores(valores):
+    """Converte valores em formato '1234.56' ou brasileiro '1.234,56' / '1234,56'; inválidos viram NaN.
+
+    A vírgula só é tomada como separador decimal quando vem depois do último ponto.
+    Valores mistos ou ambíguos, como o americano '1,234.56' ou '1,234,56', são rejeitados.
+    """
+    texto = valores.astype('string').str.strip()
+    virgula = texto.str.rfind(',')
+    brasileiro = (virgula > texto.str.rfind('.')).fillna(False)
+    ambiguo = ((virgula >= 0) & ~brasileiro).fillna(False) | (texto.str.count(',') > 1).fillna(False)
+    texto[brasileiro] = texto[brasileiro].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    texto[ambiguo] = pd.NA
+    return pd.to_numeric(texto, errors='coerce')
+
+def _resolver_ids(df, coluna_nome, coluna_id, mapa, duplicados, ids_validos, entidade, motivo):
+    """Resolve a coluna de nomes (ou de ids) para ids, anotando o motivo das linhas não resolvidas."""
+    ids = pd.Series(float('nan'), index=df.index)
+    informado = pd.Series(False, index=df.index)
+    if coluna_id in df:
+        ids_informados = pd.to_numeric(df[coluna_id], errors='coerce')
+        informado = df[coluna_id].notna() & (df[coluna_id].str.strip() != '')
+        ids = ids_informados.where(ids_informados.isin(ids_validos))
+    if coluna_nome in df:
+        nomes = _normalizar(df[coluna_nome])
+        por_nome = informado.eq(False) & nomes.notna() & (nomes != '')
+        ids[por_nome] = nomes[por_nome].map(mapa).astype(float)
+        _anotar(motivo, por_nome & nomes.isin(duplicados), f"nome de {entidade} ambíguo")
+        informado = informado | por_nome
+    _anotar(motivo, informado & ids.isna(), f"{entidade} não encontrado")
+    return ids, informado
+
+def _anotar(motivo, mascara, texto):
+    # Mantém apenas o primeiro problema encontrado em cada linha
+    motivo[mascara & (motivo == '')] = texto
+
+def validar_lote(df, projetos, fornecedores):
+    """Valida um lote de linhas de forma vetorizada.
+
+    `projetos` e `fornecedores` são os DataFrames de get_projetos/get_fornecedores.
+    Retorna a lista de tuplas prontas para salvar_lancamentos_em_lote e um DataFrame
+    com as linhas rejeitadas (número da linha no arquivo e motivo).
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    motivo = pd.Series('', index=df.index, dtype=object)
+
+    mapa_projetos, projetos_duplicados = _mapa_nomes(projetos)
+    mapa_fornecedores, fornecedores_duplicados = _mapa_nomes(fornecedores)
+    projeto_id, projeto_informado = _resolver_ids(
+        df, 'projeto', 'projeto_id', mapa_projetos, projetos_duplicados, projetos['id'], 'projeto', motivo
+    )
+    _anotar(motivo, ~projeto_informado, "projeto não informado")
+    fornecedor_id, _ = _resolver_ids(
+        df, 'fornecedor', 'fornecedor_id', mapa_fornecedores, fornecedores_duplicados, fornecedores['id'], 'fornecedor', motivo
+    )
+
+    data_lancamento = _converter_datas(df['data_lancamento'])
+    _anotar(motivo, data_lancamento.isna(), "data_lancamento inválida")
+    emissao = _converter_datas(df['emissao']) if 'emissao' in df else pd.Series(pd.NaT, index=df.index)
+    if 'emissao' in df:
+        _anotar(motivo, emissao.isna() & df['emissao'].notna() & (df['emissao'].str.strip() != ''), "emissao inválida")
+    classificacao = df['classificacao'].astype('string').str.strip()
+    _anotar(motivo, classificacao.isna() | (classificacao == ''), "classificacao vazia")
+    valor_faturado = _converter_valores(df['valor_faturado'])
+    _anotar(motivo, valor_faturado.isna(), "valor_faturado inválido")
+
+    validos = motivo == ''
+    vazio = pd.Series(None, index=df.index, dtype=object)
+    colunas = [
+        projeto_id[validos].astype('int64').tolist(),
+        data_lancamento[validos].dt.strftime('%Y-%m-%d').tolist(),
+        classificacao[validos].tolist(),
+        emissao[validos].dt.strftime('%Y-%m-%d').astype(object).where(emissao[validos].notna(), None).tolist(),
+        df.get('documento', vazio)[validos].astype(object).where(lambda s: s.notna(), None).tolist(),
+        fornecedor_id[validos].astype(object).where(fornecedor_id[validos].notna(), None).tolist(),
+        df.get('descricao', vazio)[validos].astype(object).where(lambda s: s.notna(), None).tolist(),
+        valor_faturado[validos].tolist(),
+    ]
+    registros = list(zip(*colunas))
+
+    rejeitados = df[~validos].copy()
+    rejeitados.insert(0, 'motivo', motivo[~validos])
+    rejeitados.insert(0, 'linha', rejeitados.index + 2)  # +1 do cabeçalho, +1 por começar em 1
+    return registros, rejeitados
+
+def importar_lancamentos(conn, arquivo, nome=None, tamanho_lote=TAMANHO_LOTE):
+    """Importa lançamentos de um CSV/XLSX numa única transação.
+
+    Projetos e fornecedores podem vir por nome (colunas `projeto`/`fornecedor`) ou
+    por id (`projeto_id`/`fornecedor_id`). Linhas inválidas não interrompem a
+    importação: são devolvidas em `rejeitados` com o motivo.
+    Retorna um dicionário com `importados`, `rejeitados` (DataFrame) e `segundos`.
+    """
+    inicio = time.perf_counter()
+    projetos = database.get_projetos(conn)
+    fornecedores = database.get_fornecedores(conn)
+    rejeitados = []
+
+    def lotes():
+        for df in ler_arquivo(arquivo, nome, tamanho_lote):
+            colunas = {str(c).strip().lower() for c in df.columns}
+            faltantes = [c for c in COLUNAS_OBRIGATORIAS if c not in colunas]
+            if faltantes:
+                raise ValueError(f"Colunas obrigatórias ausentes no arquivo: {', '.join(faltantes)}")
+            if not colunas & {'projeto', 'projeto_id'}:
+                raise ValueError("O arquivo precisa de uma coluna 'projeto' ou 'projeto_id'.")
+            registros, rejeitados_lote = validar_lote(df, projetos, fornecedores)
+            if not rejeitados_lote.empty:
+                rejeitados.append(rejeitados_lote)
+            yield registros
+
+    importados = database.salvar_lancamentos_em_lote(conn, lotes())
+    return {
+        'importados': importados,
+        'rejeitados': pd.concat(rejeitados, ignore_index=True) if rejeitados else pd.DataFrame(columns=['linha', 'motivo']),
+        'segundos': time.perf_counter() - inicio,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa lançamentos em massa a partir de um arquivo CSV ou XLSX.")
+    parser.add_argument('arquivo', help="Arquivo .csv ou .xlsx com os lançamentos.")
+    parser.add_argument('--banco', default=database.DATABASE_NAME, help="Arquivo SQLite de destino.")
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="Linhas lidas e gravadas por lote.")
+    parser.add_argument('--rejeitados', help="Grava as linhas rejeitadas neste CSV.")
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = args.banco
+    conn = database.create_connection()
+    database.create_tables(conn)
+    try:
+        resultado = importar_lancamentos(conn, args.arquivo, tamanho_lote=args.lote)
+    except ValueError as e:
+        print(f"Erro: {e}")
+        return 1
+    finally:
+        conn.close()
+
+    print(f"{resultado['importados']} lançamento(s) importado(s) em {resultado['segundos']:.1f}s.")
+    rejeitados = resultado['rejeitados']
+    if not rejeitados.empty:
+        print(f"{len(rejeitados)} linha(s) rejeitada(s).")
+        if args.rejeitados:
+            rejeitados.to_csv(args.rejeitados, index=False)
+        else:
+            print(rejeitados[['linha', 'motivo']].head(20).to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
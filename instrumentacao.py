@@ -0,0 +1,172 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import pandas as pd
+import database
+import visualizations
+
+# Liga a instrumentação ao iniciar o processo (ex.: OBRA_INSTRUMENTACAO=1 streamlit run app.py)
+VARIAVEL_AMBIENTE = 'OBRA_INSTRUMENTACAO'
+LIMITE_LENTA_MS = float(os.environ.get('OBRA_LIMITE_LENTA_MS', 200))
+ARQUIVO_LENTAS = os.environ.get('OBRA_LOG_LENTAS', 'consultas_lentas.log')
+MAX_PARAMETROS = 300  # caracteres dos parâmetros gravados no log de consultas lentas
+
+# Funções medidas em cada módulo, pelo prefixo do nome (as de database só se recebem uma conexão)
+PREFIXOS = {
+    database: ('get_', 'salvar_', 'contar_'),
+    visualizations: ('plot_',),
+}
+
+_lock = threading.Lock()
+_originais = {}  # (módulo, nome) -> função original, enquanto a instrumentação está ativa
+_estatisticas = {}  # nome -> {'chamadas', 'total_ms', 'max_ms', 'lentas'}
+_local = threading.local()  # linha do tempo da página em execução nesta thread (uma por sessão)
+_log_lentas = logging.getLogger('obra_controle.consultas_lentas')
+
+def ativa():
+    """Indica se as funções de database e visualizations estão sendo medidas."""
+    return bool(_originais)
+
+def _medir_resultado(resultado):
+    """Retorna (linhas, bytes) do resultado de uma função medida."""
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado), int(resultado.memory_usage(index=True, deep=True).sum())
+    if isinstance(resultado, pd.Series):
+        return len(resultado), int(resultado.memory_usage(index=True, deep=True))
+    if isinstance(resultado, tuple) and resultado and isinstance(resultado[0], pd.DataFrame):
+        return _medir_resultado(resultado[0])  # ex.: get_lancamentos_paginados -> (df, tem_proxima)
+    if isinstance(resultado, database.SnapshotDashboard):
+        medidas = [_medir_resultado(valor) for valor in vars(resultado).values()]
+        return sum(m[0] or 0 for m in medidas), sum(m[1] or 0 for m in medidas)
+    if hasattr(resultado, 'to_json'):  # figuras do plotly: o que vai para o navegador
+        return None, visualizations.tamanho_figura(resultado)
+    if isinstance(resultado, int) and not isinstance(resultado, bool):
+        return resultado, None  # ex.: salvar_lancamentos_em_lote -> linhas inseridas
+    return None, None
+
+def _parametros(args, kwargs):
+    # A conexão não interessa ao log; o resto vai resumido
+    args = [a for a in args if not hasattr(a, 'execute')]
+    texto = ', '.join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()])
+    return texto if len(texto) <= MAX_PARAMETROS else texto[:MAX_PARAMETROS] + '...'
+
+def _registrar(nome, inicio, duracao_ms, resultado, args, kwargs):
+    linhas, tamanho = _medir_resultado(resultado)
+    with _lock:
+        estat = _estatisticas.setdefault(nome, {'chamadas': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'lentas': 0})
+        estat['chamadas'] += 1
+        estat['total_ms'] += duracao_ms
+        estat['max_ms'] = max(estat['max_ms'], duracao_ms)
+        if duracao_ms >= LIMITE_LENTA_MS:
+            estat['lentas'] += 1
+    if duracao_ms >= LIMITE_LENTA_MS:
+        _log_lentas.warning(json.dumps({
+            'funcao': nome,
+            'ms': round(duracao_ms, 2),
+            'linhas': linhas,
+            'bytes': tamanho,
+            'parametros': _parametros(args, kwargs),
+        }, ensure_ascii=False))
+    linha_do_tempo = getattr(_local, 'linha_do_tempo', None)
+    if linha_do_tempo is not None:
+        linha_do_tempo['eventos'].append({
+            'funcao': nome,
+            'inicio_ms': round((inicio - linha_do_tempo['inicio']) * 1000, 2),
+            'duracao_ms': round(duracao_ms, 2),
+            'linhas': linhas,
+            'bytes': tamanho,
+        })
+
+def _instrumentar(nome, funcao):
+    @functools.wraps(funcao)
+    def medida(*args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = funcao(*args, **kwargs)
+        _registrar(nome, inicio, (time.perf_counter() - inicio) * 1000, resultado, args, kwargs)
+        return resultado
+    if hasattr(funcao, 'operacao'):
+        # Funções salvar_*: a fila de escrita (database.gravar) chama só a operação, sem passar
+        # por `medida`; a chamada direta usa a operação original, então nada é contado duas vezes
+        medida.operacao = _instrumentar(nome, funcao.operacao)
+    return medida
+
+def ativar(arquivo_lentas=ARQUIVO_LENTAS):
+    """Passa a medir as funções de database e visualizations.
+
+    As funções são substituídas no próprio módulo, então chamadas como
+    `database.get_projetos(conn)` já passam pela medição; desativada, nada
+    fica no caminho das chamadas.
+    """
+    with _lock:
+        if _originais:
+            return
+        for modulo, prefixos in PREFIXOS.items():
+            for nome, funcao in inspect.getmembers(modulo, inspect.isfunction):
+                if not nome.startswith(prefixos) or funcao.__module__ != modulo.__name__:
+                    continue
+                if modulo is database and list(inspect.signature(funcao).parameters)[:1] != ['conn']:
+                    continue  # ex.: get_pool
+                _originais[(modulo, nome)] = funcao
+                setattr(modulo, nome, _instrumentar(f"{modulo.__name__}.{nome}", funcao))
+        if arquivo_lentas and not _log_lentas.handlers:
+            handler = logging.FileHandler(arquivo_lentas, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            _log_lentas.addHandler(handler)
+            _log_lentas.propagate = False
+
+def desativar():
+    """Restaura as funções originais."""
+    with _lock:
+        for (modulo, nome), funcao in _originais.items():
+            setattr(modulo, nome, funcao)
+        _originais.clear()
+
+def estatisticas():
+    """Retorna, por função, chamadas, tempo total/máximo (ms) e quantas passaram do limite de lentidão."""
+    with _lock:
+        return {nome: dict(valores) for nome, valores in _estatisticas.items()}
+
+def limpar_estatisticas():
+    with _lock:
+        _estatisticas.clear()
+
+def inicio_pagina(pagina):
+    """Começa a linha do tempo da execução atual da página (nada faz se a instrumentação estiver desligada)."""
+    if _originais:
+        _local.linha_do_tempo = {'pagina': pagina, 'inicio': time.perf_counter(), 'eventos': []}
+
+def linha_do_tempo():
+    """Retorna a página, o tempo decorrido (ms) e os eventos da execução atual, ou None."""
+    dados = getattr(_local, 'linha_do_tempo', None)
+    if dados is None:
+        return None
+    return {
+        'pagina': dados['pagina'],
+        'decorrido_ms': round((time.perf_counter() - dados['inicio']) * 1000, 2),
+        'eventos': list(dados['eventos']),
+    }
+
+def painel_debug():
+    """Mostra na barra lateral a linha do tempo da página; chame ao final do script da página."""
+    if not _originais:
+        return
+    import streamlit as st
+
+    dados = linha_do_tempo()
+    _local.linha_do_tempo = None
+    if dados is None:
+        return
+    with st.sidebar.expander(f"Desempenho: {dados['decorrido_ms']:.0f} ms"):
+        eventos = pd.DataFrame(dados['eventos'], columns=['funcao', 'inicio_ms', 'duracao_ms', 'linhas', 'bytes'])
+        medido = eventos['duracao_ms'].sum()
+        st.caption(f"{dados['pagina']}: {len(eventos)} chamada(s) medida(s), {medido:.0f} ms; "
+                   f"{dados['decorrido_ms'] - medido:.0f} ms no restante do script.")
+        st.dataframe(eventos, hide_index=True)
+        st.caption(f"Chamadas com {LIMITE_LENTA_MS:.0f} ms ou mais são gravadas em {ARQUIVO_LENTAS}.")
+
+if os.environ.get(VARIAVEL_AMBIENTE, '').lower() in ('1', 'true', 'sim'):
+    ativar()
@@ -1,14 +1,19 @@
 import streamlit as st
+import analitico
 import database
+import instrumentacao
 
 st.title("Visão Geral dos Projetos")
+instrumentacao.inicio_pagina("Visão Geral")
+if analitico.descricao():
+    st.caption(analitico.descricao())
 
-conn = database.create_connection()
+with database.conexao_leitura() as conn:
+    df_projetos_resumo = database.get_resumo_projetos(conn)
 
-df_projetos_resumo = database.get_resumo_projetos(conn)
 if not df_projetos_resumo.empty:
     st.dataframe(df_projetos_resumo)
 else:
     st.info("Nenhum projeto cadastrado.")
 
-conn.close()
\ No newline at end of file
+instrumentacao.painel_debug()
\ No newline at end of file
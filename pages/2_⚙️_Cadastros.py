@@ -1,126 +1,200 @@
+import io
+import sqlite3
 import streamlit as st
 import database
-import pandas as pd
+import importacao
+import instrumentacao
+
+LIMITE_OPCOES_FORNECEDOR = 50
 
 st.title("Cadastros")
+instrumentacao.inicio_pagina("Cadastros")
 
-conn = database.create_connection()
-database.create_tables(conn) # Garante que as tabelas existem
-
-with st.expander("Cadastrar Fornecedor"):
-    st.subheader("Cadastro de Fornecedores")
-    with st.form("novo_fornecedor"):
-        nome_fornecedor = st.text_input("Nome do Fornecedor:")
-        cnpj_fornecedor = st.text_input("CNPJ (opcional):")
-        telefone_fornecedor = st.text_input("Telefone (opcional):")
-        email_fornecedor = st.text_input("Email (opcional):")
-        endereco_fornecedor = st.text_area("Endereço (opcional):")
-        submitted_fornecedor = st.form_submit_button("Salvar Fornecedor")
-        if submitted_fornecedor:
-            if nome_fornecedor:
-                if database.salvar_fornecedor(conn, nome_fornecedor, cnpj_fornecedor, telefone_fornecedor, email_fornecedor, endereco_fornecedor):
-                    st.success(f"Fornecedor '{nome_fornecedor}' cadastrado com sucesso!")
+with database.conexao_leitura() as conn:
+    with st.expander("Cadastrar Fornecedor"):
+        st.subheader("Cadastro de Fornecedores")
+        with st.form("novo_fornecedor"):
+            nome_fornecedor = st.text_input("Nome do Fornecedor:")
+            cnpj_fornecedor = st.text_input("CNPJ (opcional):")
+            telefone_fornecedor = st.text_input("Telefone (opcional):")
+            email_fornecedor = st.text_input("Email (opcional):")
+            endereco_fornecedor = st.text_area("Endereço (opcional):")
+            submitted_fornecedor = st.form_submit_button("Salvar Fornecedor")
+            if submitted_fornecedor:
+                if nome_fornecedor:
+                    try:
+                        database.gravar(database.salvar_fornecedor, nome_fornecedor, cnpj_fornecedor, telefone_fornecedor, email_fornecedor, endereco_fornecedor)
+                    except sqlite3.Error as e:
+                        st.error(f"Erro ao cadastrar o fornecedor: {e}")
+                    else:
+                        st.success(f"Fornecedor '{nome_fornecedor}' cadastrado com sucesso!")
                 else:
-                    st.error(f"Erro ao cadastrar o fornecedor.")
-            else:
-                st.error("O nome do fornecedor é obrigatório.")
-    st.subheader("Fornecedores Cadastrados")
-    df_fornecedores = database.get_fornecedores(conn)
-    st.dataframe(df_fornecedores)
-
-with st.expander("Cadastrar Projeto"):
-    st.title("Cadastro de Projetos")
-    with st.form("novo_projeto"):
-        nome_projeto = st.text_input("Nome do Projeto:")
-        descricao_projeto = st.text_area("Descrição:")
-        data_inicio_projeto = st.date_input("Data de Início:")
-        data_fim_prevista_projeto = st.date_input("Data de Fim Prevista:")
-        submitted_projeto = st.form_submit_button("Salvar Projeto")
-        if submitted_projeto:
-            if nome_projeto:
-                if database.salvar_projeto(conn, nome_projeto, descricao_projeto, data_inicio_projeto, data_fim_prevista_projeto):
-                    st.success(f"Projeto '{nome_projeto}' cadastrado com sucesso!")
+                    st.error("O nome do fornecedor é obrigatório.")
+        st.subheader("Fornecedores Cadastrados")
+        df_fornecedores = database.get_fornecedores(conn)
+        st.dataframe(df_fornecedores)
+
+    with st.expander("Cadastrar Projeto"):
+        st.title("Cadastro de Projetos")
+        with st.form("novo_projeto"):
+            nome_projeto = st.text_input("Nome do Projeto:")
+            descricao_projeto = st.text_area("Descrição:")
+            data_inicio_projeto = st.date_input("Data de Início:")
+            data_fim_prevista_projeto = st.date_input("Data de Fim Prevista:")
+            submitted_projeto = st.form_submit_button("Salvar Projeto")
+            if submitted_projeto:
+                if nome_projeto:
+                    try:
+                        database.gravar(database.salvar_projeto, nome_projeto, descricao_projeto, data_inicio_projeto, data_fim_prevista_projeto)
+                    except sqlite3.Error as e:
+                        st.error(f"Erro ao cadastrar o projeto: {e}")
+                    else:
+                        st.success(f"Projeto '{nome_projeto}' cadastrado com sucesso!")
                 else:
-                    st.error(f"Erro ao cadastrar o projeto.")
+                    st.error("O nome do projeto é obrigatório.")
+        st.subheader("Projetos Cadastrados")
+        df_projetos = database.get_projetos(conn)
+        st.dataframe(df_projetos)
+
+    # Selectboxes guardam o id; o nome vem do índice compartilhado, sem varrer listas
+    indice_projetos = database.get_indice_projetos(conn)
+    indice_fornecedores = database.get_indice_fornecedores(conn)
+
+    with st.expander("Cadastrar Lançamento"):
+        st.subheader("Cadastro de Lançamentos")
+        projeto_selecionado_id_lancamento = st.selectbox("Selecionar Projeto para Lançamento:", indice_projetos.ids, format_func=indice_projetos.rotulo, key="selectbox_lancamento_projeto_cadastro")
+
+        if projeto_selecionado_id_lancamento:
+            # Buscar categorias de orçamento para o projeto selecionado
+            df_categorias_orcamento = database.get_orcamentos_por_projeto(conn, projeto_selecionado_id_lancamento)
+            categorias_orcamento = df_categorias_orcamento['categoria'].tolist()
+
+            # Autocompletar: o selectbox recebe só os fornecedores que casam com o texto, não o cadastro inteiro
+            busca_fornecedor = st.text_input("Buscar fornecedor (nome ou CNPJ):", key="busca_fornecedor_lancamento")
+            if busca_fornecedor.strip():
+                encontrados = database.get_fornecedores_por_texto(conn, busca_fornecedor, LIMITE_OPCOES_FORNECEDOR)['id']
+                opcoes_fornecedor = [i for i in encontrados if i in indice_fornecedores]
+            elif len(indice_fornecedores) <= LIMITE_OPCOES_FORNECEDOR:
+                opcoes_fornecedor = indice_fornecedores.ids
             else:
-                st.error("O nome do projeto é obrigatório.")
-    st.subheader("Projetos Cadastrados")
-    df_projetos = database.get_projetos(conn)
-    st.dataframe(df_projetos)
-
-    projetos_dict = df_projetos.set_index('id')['nome'].to_dict()
-    projetos_nomes = list(projetos_dict.values())
-
-with st.expander("Cadastrar Lançamento"):
-    st.subheader("Cadastro de Lançamentos")
-    projeto_selecionado_nome_lancamento = st.selectbox("Selecionar Projeto para Lançamento:", projetos_nomes, key="selectbox_lancamento_projeto_cadastro")
-    projeto_selecionado_id_lancamento = [k for k, v in projetos_dict.items() if v == projeto_selecionado_nome_lancamento][0] if projetos_dict else None
-
-    if projeto_selecionado_id_lancamento:
-        # Buscar categorias de orçamento para o projeto selecionado
-        df_categorias_orcamento = database.get_orcamentos_por_projeto(conn, projeto_selecionado_id_lancamento)
-        categorias_orcamento = df_categorias_orcamento['categoria'].tolist()
-
-        with st.form("novo_lancamento"):
-            data_lancamento = st.date_input("Data do Lançamento:")
-            # Usar selectbox para classificação
-            classificacao = st.selectbox("Classificação:", categorias_orcamento)
-            emissao = st.date_input("Data de Emissão (opcional):", value=None)
-            documento = st.text_input("Documento (NF, Recibo, etc.):")
-            df_fornecedores_lancamento = database.get_fornecedores(conn)
-            fornecedores_dict = df_fornecedores_lancamento.set_index('id')['nome'].to_dict()
-            fornecedores_nomes = list(fornecedores_dict.values())
-            fornecedor_selecionado_nome = st.selectbox("Fornecedor:", fornecedores_nomes)
-            fornecedor_selecionado_id = [k for k, v in fornecedores_dict.items() if v == fornecedor_selecionado_nome][0] if fornecedores_dict else None
-            descricao = st.text_area("Descrição:")
-            valor_faturado = st.number_input("Valor Faturado:")
-            submitted_lancamento = st.form_submit_button("Salvar Lançamento")
-            if submitted_lancamento:
-                if classificacao and valor_faturado is not None and fornecedor_selecionado_id:
-                    if database.salvar_lancamento(conn, projeto_selecionado_id_lancamento, data_lancamento, classificacao, emissao, documento, fornecedor_selecionado_id, descricao, valor_faturado):
-                        st.success(f"Lançamento para o projeto '{projeto_selecionado_nome_lancamento}' com a classificação '{classificacao}' cadastrado com sucesso!")
+                opcoes_fornecedor = []
+                st.caption(f"{len(indice_fornecedores)} fornecedores cadastrados: digite parte do nome ou do CNPJ.")
+
+            with st.form("novo_lancamento"):
+                data_lancamento = st.date_input("Data do Lançamento:")
+                # Usar selectbox para classificação
+                classificacao = st.selectbox("Classificação:", categorias_orcamento)
+                emissao = st.date_input("Data de Emissão (opcional):", value=None)
+                documento = st.text_input("Documento (NF, Recibo, etc.):")
+                fornecedor_selecionado_id = st.selectbox("Fornecedor:", opcoes_fornecedor, format_func=indice_fornecedores.rotulo)
+                descricao = st.text_area("Descrição:")
+                valor_faturado = st.number_input("Valor Faturado:")
+                submitted_lancamento = st.form_submit_button("Salvar Lançamento")
+                if submitted_lancamento:
+                    if classificacao and valor_faturado is not None and fornecedor_selecionado_id:
+                        try:
+                            database.gravar(database.salvar_lancamento, projeto_selecionado_id_lancamento, data_lancamento, classificacao, emissao, documento, fornecedor_selecionado_id, descricao, valor_faturado)
+                        except sqlite3.Error as e:
+                            st.error(f"Erro ao cadastrar o lançamento: {e}")
+                        else:
+                            st.success(f"Lançamento para o projeto '{indice_projetos.rotulo(projeto_selecionado_id_lancamento)}' com a classificação '{classificacao}' cadastrado com sucesso!")
+                    elif not fornecedor_selecionado_id:
+                        st.error("Selecione um fornecedor para o lançamento.")
                     else:
-                        st.error(f"Erro ao cadastrar o lançamento.")
-                elif not fornecedor_selecionado_id:
-                    st.error("Selecione um fornecedor para o lançamento.")
+                        st.error("A classificação e o valor faturado são obrigatórios.")
+        else:
+            st.warning("Cadastre um projeto primeiro para poder adicionar lançamentos.")
+        st.subheader("Lançamentos Cadastrados")
+        if projeto_selecionado_id_lancamento:
+            col_periodo, col_classificacao, col_fornecedor, col_tamanho = st.columns([2, 2, 2, 1])
+            periodo_lancamentos = col_periodo.date_input("Período:", value=(), key="filtro_periodo_lancamentos")
+            classificacao_lancamentos = col_classificacao.selectbox("Classificação:", ["Todas"] + categorias_orcamento, key="filtro_classificacao_lancamentos")
+            fornecedor_lancamentos = col_fornecedor.selectbox("Fornecedor:", [None] + indice_fornecedores.ids, format_func=lambda i: "Todos" if i is None else indice_fornecedores.rotulo(i), key="filtro_fornecedor_lancamentos")
+            tamanho_pagina = col_tamanho.selectbox("Por página:", [25, 50, 100, 250], index=1, key="tamanho_pagina_lancamentos")
+            filtros_lancamentos = {
+                'data_inicio': periodo_lancamentos[0] if len(periodo_lancamentos) > 0 else None,
+                'data_fim': periodo_lancamentos[1] if len(periodo_lancamentos) > 1 else None,
+                'classificacao': classificacao_lancamentos if classificacao_lancamentos != "Todas" else None,
+                'fornecedor_id': fornecedor_lancamentos,
+                # Lançamentos de projeto arquivado estão no banco histórico
+                'incluir_historico': database.tem_historico(conn) and st.checkbox("Incluir lançamentos arquivados", key="incluir_historico_lancamentos"),
+            }
+
+            # Pilha com a chave de início de cada página visitada; volta à primeira se os filtros mudarem
+            chave_filtros = (projeto_selecionado_id_lancamento, tamanho_pagina, tuple(filtros_lancamentos.values()))
+            if st.session_state.get("filtros_paginas_lancamentos") != chave_filtros:
+                st.session_state["filtros_paginas_lancamentos"] = chave_filtros
+                st.session_state["paginas_lancamentos"] = [None]
+            paginas_lancamentos = st.session_state["paginas_lancamentos"]
+
+            df_lancamentos, tem_proxima = database.get_lancamentos_paginados(conn, projeto_selecionado_id_lancamento, apos=paginas_lancamentos[-1], tamanho_pagina=tamanho_pagina, **filtros_lancamentos)
+            total_lancamentos = database.contar_lancamentos(conn, projeto_selecionado_id_lancamento, **filtros_lancamentos)
+            st.dataframe(df_lancamentos, hide_index=True)
+
+            col_anterior, col_pagina, col_proxima = st.columns([1, 3, 1])
+            col_anterior.button("◀ Anterior", disabled=len(paginas_lancamentos) == 1, on_click=paginas_lancamentos.pop, key="pagina_anterior_lancamentos")
+            total_paginas = max(1, -(-total_lancamentos // tamanho_pagina))
+            col_pagina.caption(f"Página {len(paginas_lancamentos)} de {total_paginas} ({total_lancamentos} lançamentos)")
+            proxima_chave = (df_lancamentos['data_lancamento'].iloc[-1].strftime('%Y-%m-%d'), int(df_lancamentos['id'].iloc[-1])) if tem_proxima else None
+            col_proxima.button("Próxima ▶", disabled=not tem_proxima, on_click=paginas_lancamentos.append, args=(proxima_chave,), key="pagina_proxima_lancamentos")
+
+            # Gerado só no clique, lote a lote: a exportação não carrega todos os lançamentos num DataFrame
+            def csv_lancamentos(projeto_id=projeto_selecionado_id_lancamento, filtros=dict(filtros_lancamentos)):
+                arquivo = io.StringIO()
+                with database.conexao_leitura() as conn_exportacao:
+                    database.exportar_lancamentos_csv(conn_exportacao, arquivo, projeto_id, **filtros)
+                return arquivo.getvalue()
+            st.download_button(f"Exportar {total_lancamentos} lançamento(s) em CSV", csv_lancamentos, file_name="lancamentos.csv", mime="text/csv", disabled=not total_lancamentos, key="exportar_lancamentos")
+        else:
+            st.info("Selecione um projeto para ver os lançamentos.")
+
+    with st.expander("Importar Lançamentos (CSV/XLSX)"):
+        st.subheader("Importação em Massa de Lançamentos")
+        st.caption("Colunas: projeto (ou projeto_id), data_lancamento, classificacao, valor_faturado e, opcionalmente, emissao, documento, fornecedor (ou fornecedor_id) e descricao.")
+        arquivo_importacao = st.file_uploader("Arquivo de lançamentos:", type=["csv", "xlsx"], key="uploader_importacao_lancamentos")
+        if arquivo_importacao is not None and st.button("Importar Lançamentos"):
+            try:
+                with database.conexao_escrita() as conn_escrita:
+                    resultado_importacao = importacao.importar_lancamentos(conn_escrita, arquivo_importacao, nome=arquivo_importacao.name)
+            except (ValueError, sqlite3.Error) as e:
+                st.error(f"Erro ao importar o arquivo: {e}")
+            else:
+                st.success(f"{resultado_importacao['importados']} lançamento(s) importado(s) em {resultado_importacao['segundos']:.1f}s.")
+                df_rejeitados = resultado_importacao['rejeitados']
+                if not df_rejeitados.empty:
+                    st.warning(f"{len(df_rejeitados)} linha(s) rejeitada(s).")
+                    st.dataframe(df_rejeitados.head(1000))
+                    st.download_button("Baixar linhas rejeitadas", df_rejeitados.to_csv(index=False), file_name="lancamentos_rejeitados.csv", mime="text/csv")
+
+    with st.expander("Cadastrar Orçamento"):
+        st.title("Cadastro de Orçamento por Projeto")
+        projeto_selecionado_id_orcamento = st.selectbox("Selecionar Projeto para Cadastrar Orçamento:", indice_projetos.ids, format_func=indice_projetos.rotulo, key="selectbox_orcamento_projeto_cadastro")
+
+        if projeto_selecionado_id_orcamento:
+            st.subheader(f"Orçamento para o Projeto: {indice_projetos.rotulo(projeto_selecionado_id_orcamento)}")
+            categorias_orcamento = {
+                "Aluminio": st.number_input("Alumínio:", min_value=0.0, key=f"orc_alu_{projeto_selecionado_id_orcamento}_cadastro"),
+                "Material": st.number_input("Material:", min_value=0.0, key=f"orc_mat_{projeto_selecionado_id_orcamento}_cadastro"),
+                "Pintura": st.number_input("Pintura:", min_value=0.0, key=f"orc_pin_{projeto_selecionado_id_orcamento}_cadastro"),
+                "Vidros": st.number_input("Vidros:", min_value=0.0, key=f"orc_vid_{projeto_selecionado_id_orcamento}_cadastro"),
+                "Beneficiamento": st.number_input("Beneficiamento:", min_value=0.0, key=f"orc_ben_{projeto_selecionado_id_orcamento}_cadastro"),
+                "Projetos": st.number_input("Projetos (custo da empresa):", min_value=0.0, key=f"orc_pro_{projeto_selecionado_id_orcamento}_cadastro"),
+                "Adiantamentos": st.number_input("Adiantamentos (custo da empresa):", min_value=0.0, key=f"orc_adi_{projeto_selecionado_id_orcamento}_cadastro"),
+                "Instalacao": st.number_input("Instalação (custo da empresa):", min_value=0.0, key=f"orc_ins_{projeto_selecionado_id_orcamento}_cadastro"),
+            }
+
+            if st.button("Salvar Orçamento"):
+                try:
+                    database.gravar(database.salvar_orcamentos, projeto_selecionado_id_orcamento, categorias_orcamento)
+                except sqlite3.Error as e:
+                    st.error(f"Erro ao salvar o orçamento: {e}")
                 else:
-                    st.error("A classificação e o valor faturado são obrigatórios.")
-    else:
-        st.warning("Cadastre um projeto primeiro para poder adicionar lançamentos.")
-    st.subheader("Lançamentos Cadastrados")
-    if projeto_selecionado_id_lancamento:
-        df_lancamentos = database.get_lancamentos_por_projeto(conn, projeto_selecionado_id_lancamento)
-        st.dataframe(df_lancamentos)
-    else:
-        st.info("Selecione um projeto para ver os lançamentos.")
-
-with st.expander("Cadastrar Orçamento"):
-    st.title("Cadastro de Orçamento por Projeto")
-    projeto_selecionado_nome_orcamento = st.selectbox("Selecionar Projeto para Cadastrar Orçamento:", projetos_nomes, key="selectbox_orcamento_projeto_cadastro")
-    projeto_selecionado_id_orcamento = [k for k, v in projetos_dict.items() if v == projeto_selecionado_nome_orcamento][0] if projetos_dict else None
-
-    if projeto_selecionado_id_orcamento:
-        st.subheader(f"Orçamento para o Projeto: {projeto_selecionado_nome_orcamento}")
-        categorias_orcamento = {
-            "Aluminio": st.number_input("Alumínio:", min_value=0.0, key=f"orc_alu_{projeto_selecionado_id_orcamento}_cadastro"),
-            "Material": st.number_input("Material:", min_value=0.0, key=f"orc_mat_{projeto_selecionado_id_orcamento}_cadastro"),
-            "Pintura": st.number_input("Pintura:", min_value=0.0, key=f"orc_pin_{projeto_selecionado_id_orcamento}_cadastro"),
-            "Vidros": st.number_input("Vidros:", min_value=0.0, key=f"orc_vid_{projeto_selecionado_id_orcamento}_cadastro"),
-            "Beneficiamento": st.number_input("Beneficiamento:", min_value=0.0, key=f"orc_ben_{projeto_selecionado_id_orcamento}_cadastro"),
-            "Projetos": st.number_input("Projetos (custo da empresa):", min_value=0.0, key=f"orc_pro_{projeto_selecionado_id_orcamento}_cadastro"),
-            "Adiantamentos": st.number_input("Adiantamentos (custo da empresa):", min_value=0.0, key=f"orc_adi_{projeto_selecionado_id_orcamento}_cadastro"),
-            "Instalacao": st.number_input("Instalação (custo da empresa):", min_value=0.0, key=f"orc_ins_{projeto_selecionado_id_orcamento}_cadastro"),
-        }
-
-        if st.button("Salvar Orçamento"):
-            for categoria, valor in categorias_orcamento.items():
-                database.salvar_orcamento(conn, projeto_selecionado_id_orcamento, categoria, valor)
-            st.success(f"Orçamento para o projeto '{projeto_selecionado_nome_orcamento}' salvo com sucesso!")
-    else:
-        st.info("Selecione um projeto para cadastrar o orçamento.")
-
-    st.subheader("Orçamentos Cadastrados")
-    df_orcamentos = pd.read_sql_query("SELECT p.nome as projeto_nome, o.categoria, o.valor_orcado FROM orcamentos o JOIN projetos p ON o.projeto_id = p.id", conn)
-    st.dataframe(df_orcamentos)
-
-conn.close()
\ No newline at end of file
+                    st.success(f"Orçamento para o projeto '{indice_projetos.rotulo(projeto_selecionado_id_orcamento)}' salvo com sucesso!")
+        else:
+            st.info("Selecione um projeto para cadastrar o orçamento.")
+
+        st.subheader("Orçamentos Cadastrados")
+        df_orcamentos = database.get_orcamentos(conn)
+        st.dataframe(df_orcamentos)
+
+instrumentacao.painel_debug()
\ No newline at end of file
@@ -1,62 +1,142 @@
+import functools
 import streamlit as st
+import analitico
 import database
 import visualizations
-import pandas as pd
+import instrumentacao
 
 st.title("Dashboard")
+instrumentacao.inicio_pagina("Dashboard")
+if analitico.descricao():
+    st.caption(analitico.descricao())
 
-conn = database.create_connection()
+top_n = st.sidebar.number_input("Barras por gráfico (as demais vão para 'Outros'):", min_value=1, value=visualizations.TOP_N_PADRAO, step=5, key="top_n_dashboard")
+
+# A versão é lida antes dos dados: se houver escrita entre os dois, a figura só é refeita na próxima execução
+with database.conexao_leitura() as conn:
+    versao_dados = (database.versao_dados(conn, 'lancamentos', 'orcamentos', 'projetos', 'fornecedores'), analitico.versao())
+    tem_historico = database.tem_historico(conn)
+
+# Projetos arquivados ficam no banco histórico e só entram nos gráficos se pedidos
+incluir_historico = tem_historico and st.sidebar.checkbox(
+    "Incluir projetos arquivados", value=False, key="incluir_historico_dashboard",
+    help="Soma os lançamentos e orçamentos movidos para o banco histórico (consultas mais lentas)."
+)
+versao_dados += (incluir_historico,)
+
+def com_historico(funcao):
+    return functools.partial(funcao, incluir_historico=incluir_historico)
+
+# Consultas independentes em paralelo; a falha ou demora de uma não impede os outros gráficos.
+# Os agregados dos três primeiros gráficos vêm de uma única leitura (o snapshot do Dashboard).
+dados, erros = database.carregar_em_paralelo({
+    'snapshot': (com_historico(database.get_dashboard_snapshot),),
+    'indice_projetos': (database.get_indice_projetos,),
+    'matriz': (com_historico(database.get_matriz_orcamento_gasto),),
+})
+snapshot = dados.get('snapshot')
 
 # Gráfico de Comparativo Orçamento vs. Gasto Total por Projeto
 st.subheader("Comparativo Orçamento vs. Gasto Total por Projeto")
-df_comparativo_projetos = database.get_comparativo_orcamento_gasto_por_projeto(conn)
-if not df_comparativo_projetos.empty:
-    fig_comparativo_projetos = visualizations.plot_comparativo_orcamento_gasto_projeto(df_comparativo_projetos)
+if 'snapshot' in erros:
+    st.error(f"Não foi possível carregar o comparativo: {erros['snapshot']}")
+elif not snapshot.comparativo.empty:
+    df_comparativo_projetos = snapshot.comparativo
+    fig_comparativo_projetos = visualizations.figura_cacheada(
+        'comparativo', (), versao_dados,
+        lambda: visualizations.plot_comparativo_orcamento_gasto_projeto(df_comparativo_projetos)
+    )
     st.plotly_chart(fig_comparativo_projetos)
 else:
     st.info("Nenhum projeto cadastrado para exibir o comparativo de orçamento vs. gasto.")
 
 # Gráfico de Gasto por Classificação
 st.subheader("Gasto por Classificação")
-df_gasto_classificacao = database.get_gasto_por_classificacao(conn)
-if not df_gasto_classificacao.empty:
-    fig_gasto_classificacao = visualizations.plot_gasto_por_classificacao(df_gasto_classificacao)
+if 'snapshot' in erros:
+    st.error(f"Não foi possível carregar o gasto por classificação: {erros['snapshot']}")
+elif not snapshot.gasto_por_classificacao.empty:
+    df_gasto_classificacao = snapshot.gasto_por_classificacao
+    fig_gasto_classificacao = visualizations.figura_cacheada(
+        'gasto_por_classificacao', (top_n,), versao_dados,
+        lambda: visualizations.plot_gasto_por_classificacao(df_gasto_classificacao, top_n)
+    )
     st.plotly_chart(fig_gasto_classificacao)
 else:
     st.info("Nenhum lançamento cadastrado para exibir o gasto por classificação.")
 
 # Gráfico de Gasto por Fornecedor
 st.subheader("Gasto por Fornecedor")
-df_gasto_por_fornecedor = database.get_gasto_por_fornecedor(conn)
-if not df_gasto_por_fornecedor.empty:
-    fig_gasto_por_fornecedor = visualizations.plot_gasto_por_fornecedor(df_gasto_por_fornecedor)
+if 'snapshot' in erros:
+    st.error(f"Não foi possível carregar o gasto por fornecedor: {erros['snapshot']}")
+elif not snapshot.gasto_por_fornecedor.empty:
+    df_gasto_por_fornecedor = snapshot.gasto_por_fornecedor
+    fig_gasto_por_fornecedor = visualizations.figura_cacheada(
+        'gasto_por_fornecedor', (top_n,), versao_dados,
+        lambda: visualizations.plot_gasto_por_fornecedor(df_gasto_por_fornecedor, top_n)
+    )
     st.plotly_chart(fig_gasto_por_fornecedor)
 else:
     st.info("Nenhum lançamento cadastrado para exibir o gasto por fornecedor.")
 
 # Gráfico de Evolução Mensal de Gastos vs. Orçamento
 st.subheader("Evolução Mensal de Gastos vs. Orçamento")
-df_projetos_gastos_mensais = database.get_projetos(conn)
-projetos_dict_gastos_mensais = df_projetos_gastos_mensais.set_index('id')['nome'].to_dict()
-projetos_nomes_gastos_mensais = list(projetos_dict_gastos_mensais.values())
-projeto_selecionado_nome_gastos_mensais = st.selectbox("Selecionar Projeto para Análise Mensal:", projetos_nomes_gastos_mensais, key="selectbox_gastos_mensais_projeto")
-projeto_selecionado_id_gastos_mensais = [k for k, v in projetos_dict_gastos_mensais.items() if v == projeto_selecionado_nome_gastos_mensais][0] if projetos_dict_gastos_mensais else None
+if 'indice_projetos' in erros:
+    st.error(f"Não foi possível carregar a lista de projetos: {erros['indice_projetos']}")
+    indice_projetos = database.IndiceNomes()
+else:
+    indice_projetos = dados['indice_projetos']
+classificacoes = snapshot.classificacoes if snapshot is not None else []
+projeto_selecionado_id_gastos_mensais = st.selectbox("Selecionar Projeto para Análise Mensal:", indice_projetos.ids, format_func=indice_projetos.rotulo, key="selectbox_gastos_mensais_projeto")
 
 if projeto_selecionado_id_gastos_mensais:
-    # Filtro por Classificação
-    classificacoes = pd.read_sql_query("SELECT DISTINCT classificacao FROM lancamentos", conn)['classificacao'].tolist()
-    classificacao_selecionada = st.selectbox("Filtrar por Classificação (opcional):", ["Todas"] + classificacoes, key="selectbox_filtro_classificacao")
+    # Filtros por Classificação e Período
+    col_classificacao, col_periodo = st.columns(2)
+    classificacao_selecionada = col_classificacao.selectbox("Filtrar por Classificação (opcional):", ["Todas"] + classificacoes, key="selectbox_filtro_classificacao")
     filtro_classificacao = classificacao_selecionada if classificacao_selecionada != "Todas" else None
+    periodo_gastos_mensais = col_periodo.date_input("Período (opcional):", value=(), key="periodo_gastos_mensais")
+    data_inicio_gastos_mensais = periodo_gastos_mensais[0] if len(periodo_gastos_mensais) > 0 else None
+    data_fim_gastos_mensais = periodo_gastos_mensais[1] if len(periodo_gastos_mensais) > 1 else None
 
-    df_gastos_mensais = database.get_gastos_mensais(conn, filtro_classificacao)
-    orcamento_total = database.get_orcamento_total_projeto(conn, projeto_selecionado_id_gastos_mensais)
+    dados_mensais, erros_mensais = database.carregar_em_paralelo({
+        'gastos_mensais': (com_historico(database.get_gastos_mensais), projeto_selecionado_id_gastos_mensais, filtro_classificacao, data_inicio_gastos_mensais, data_fim_gastos_mensais),
+    })
+    df_gastos_mensais = dados_mensais.get('gastos_mensais')
+    orcamento_total = snapshot.orcamento_total(projeto_selecionado_id_gastos_mensais) if snapshot is not None else 0.0
 
-    if not df_gastos_mensais.empty:
-        fig_gastos_mensais = visualizations.plot_gastos_mensais(df_gastos_mensais, orcamento_total, filtro_classificacao)
+    if erros_mensais:
+        st.error("Não foi possível carregar a evolução mensal: " + "; ".join(str(e) for e in erros_mensais.values()))
+    elif df_gastos_mensais['total_gasto'].any():
+        fig_gastos_mensais = visualizations.figura_cacheada(
+            'gastos_mensais', (projeto_selecionado_id_gastos_mensais, filtro_classificacao, data_inicio_gastos_mensais, data_fim_gastos_mensais), versao_dados,
+            lambda: visualizations.plot_gastos_mensais(df_gastos_mensais, orcamento_total, filtro_classificacao)
+        )
         st.plotly_chart(fig_gastos_mensais)
     else:
-        st.info(f"Nenhum lançamento encontrado para o projeto '{projeto_selecionado_nome_gastos_mensais}'" + (f" e classificação '{filtro_classificacao}'" if filtro_classificacao else "") + ".")
+        st.info(f"Nenhum lançamento encontrado para o projeto '{indice_projetos.rotulo(projeto_selecionado_id_gastos_mensais)}'" + (f" e classificação '{filtro_classificacao}'" if filtro_classificacao else "") + ".")
 else:
     st.info("Selecione um projeto para exibir a evolução mensal de gastos.")
 
-conn.close()
\ No newline at end of file
+# Mapa de calor Orçamento vs. Gasto por Projeto e Categoria
+st.subheader("Orçamento vs. Gasto por Projeto e Categoria")
+df_matriz = dados.get('matriz')
+if 'matriz' in erros:
+    st.error(f"Não foi possível carregar a matriz de orçamento: {erros['matriz']}")
+elif not df_matriz.empty:
+    medida_matriz = st.selectbox("Medida:", ["% do orçamento consumido", "Variação (orçado - gasto)"], key="selectbox_medida_matriz")
+
+    def construir_matriz():
+        if medida_matriz == "% do orçamento consumido":
+            orcado = database.pivotar_matriz(df_matriz, 'total_orcado')
+            matriz = database.pivotar_matriz(df_matriz, 'total_gasto') / orcado.where(orcado > 0) * 100
+            parametros_plot = ('Percentual do Orçamento Consumido', '%', 'RdYlGn_r', 100)
+        else:
+            matriz = database.pivotar_matriz(df_matriz, 'variacao')
+            parametros_plot = ('Variação (Orçado - Gasto)', 'R$', 'RdYlGn', 0)
+        matriz.index = [indice_projetos.rotulo(i) if i in indice_projetos else str(i) for i in matriz.index]
+        return visualizations.plot_matriz_orcamento(matriz, *parametros_plot)
+
+    st.plotly_chart(visualizations.figura_cacheada('matriz', (medida_matriz,), versao_dados, construir_matriz))
+else:
+    st.info("Nenhum orçamento ou lançamento cadastrado para exibir a matriz.")
+
+instrumentacao.painel_debug()
\ No newline at end of file
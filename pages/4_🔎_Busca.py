@@ -0,0 +1,32 @@
+import streamlit as st
+import database
+import instrumentacao
+
+st.title("Busca")
+instrumentacao.inicio_pagina("Busca")
+
+col_texto, col_limite = st.columns([4, 1])
+texto_busca = col_texto.text_input("Documento, descrição, fornecedor ou CNPJ:", key="texto_busca")
+limite_busca = col_limite.selectbox("Resultados:", [20, 50, 100], key="limite_busca")
+
+if texto_busca.strip():
+    with database.conexao_leitura() as conn:
+        df_fornecedores_busca = database.get_fornecedores_por_texto(conn, texto_busca, limite_busca)
+        df_lancamentos_busca = database.get_lancamentos_por_texto(conn, texto_busca, limite_busca)
+
+    st.subheader("Fornecedores")
+    if not df_fornecedores_busca.empty:
+        st.dataframe(df_fornecedores_busca, hide_index=True)
+    else:
+        st.info("Nenhum fornecedor encontrado.")
+
+    st.subheader("Lançamentos")
+    if not df_lancamentos_busca.empty:
+        st.caption("Os mais recentes primeiro.")
+        st.dataframe(df_lancamentos_busca, hide_index=True)
+    else:
+        st.info("Nenhum lançamento encontrado.")
+else:
+    st.info("Digite o começo de uma ou mais palavras; todas precisam aparecer no resultado.")
+
+instrumentacao.painel_debug()
\ No newline at end of file
@@ -0,0 +1,47 @@
+import datetime
+import pandas as pd
+import streamlit as st
+import database
+import previsao
+import visualizations
+import instrumentacao
+
+st.title("Previsão de Estouro do Orçamento")
+instrumentacao.inicio_pagina("Previsão")
+
+col_data, col_janela = st.columns(2)
+data_referencia = pd.Timestamp(col_data.date_input("Data de referência:", value=datetime.date.today(), key="data_referencia_previsao"))
+janela_meses = col_janela.number_input("Meses para medir o ritmo de gasto:", min_value=1, max_value=24, value=previsao.JANELA_MESES, key="janela_previsao")
+
+with database.conexao_leitura() as conn:
+    df_projetos, df_orcamentos, df_gastos_mensais = database.get_dados_previsao(conn)
+    indice_projetos = database.get_indice_projetos(conn)
+
+if df_projetos.empty:
+    st.info("Nenhum projeto cadastrado para calcular a previsão.")
+else:
+    df_por_categoria, df_por_projeto = previsao.calcular_previsao(df_projetos, df_orcamentos, df_gastos_mensais, data_referencia, janela_meses)
+
+    situacoes = [previsao.SITUACAO_ESTOURADO, previsao.SITUACAO_ESTOURO_PREVISTO, previsao.SITUACAO_DENTRO, previsao.SITUACAO_SEM_ORCAMENTO]
+    contagem = df_por_projeto['situacao'].value_counts()
+    for coluna, situacao in zip(st.columns(len(situacoes)), situacoes):
+        coluna.metric(situacao, int(contagem.get(situacao, 0)))
+
+    st.subheader("Carteira de Projetos")
+    situacoes_filtradas = st.multiselect("Situação:", situacoes, default=situacoes[:2], key="situacoes_previsao")
+    colunas_tabela = ['projeto', 'data_fim_prevista', 'valor_orcado', 'gasto_acumulado', 'percentual_consumido', 'ritmo_diario', 'data_estouro_prevista', 'gasto_previsto_fim', 'situacao']
+    df_carteira = df_por_projeto[df_por_projeto['situacao'].isin(situacoes_filtradas)].sort_values(['data_estouro_prevista', 'saldo'])
+    st.dataframe(df_carteira[colunas_tabela], hide_index=True)
+
+    st.subheader("Previsão por Projeto")
+    projeto_selecionado_id = st.selectbox("Projeto:", df_por_projeto['projeto_id'].tolist(), format_func=indice_projetos.rotulo, key="projeto_previsao")
+    linha_projeto = df_por_projeto[df_por_projeto['projeto_id'] == projeto_selecionado_id].iloc[0]
+    curva = previsao.curvas_gasto_acumulado(df_gastos_mensais, [linha_projeto['projeto_id']])
+    if not curva.empty:
+        st.plotly_chart(visualizations.plot_previsao_projeto(curva, linha_projeto, data_referencia))
+    else:
+        st.info("Nenhum gasto lançado para este projeto.")
+    df_categorias_projeto = df_por_categoria[df_por_categoria['projeto_id'] == linha_projeto['projeto_id']]
+    st.dataframe(df_categorias_projeto[['categoria'] + colunas_tabela[2:]], hide_index=True)
+
+instrumentacao.painel_debug()
\ No newline at end of file
@@ -1,6 +1,10 @@
+import argparse
 import sqlite3
 import random
+import sys
 from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
 import database  # Importa seu arquivo database.py
 
 DATABASE_NAME = 'obra_controle.db'
@@ -13,57 +17,218 @@ def gerar_data_aleatoria(start_date, end_date):
     random_date = start_date + timedelta(days=random_number_of_days)
     return random_date
 
+def _salvar(salvar, conn, *args):
+    """Chama `salvar(conn, *args)` e interrompe a carga se a gravação falhar (as salvar_* só retornam False)."""
+    if not salvar(conn, *args):
+        raise sqlite3.DatabaseError(f"{salvar.__name__} falhou; o banco de teste ficou incompleto.")
+
 def popular_banco():
     conn = database.create_connection()
-    cursor = conn.cursor()
+    try:
+        # Aplica as migrações pendentes: as salvar_* dependem de versoes_tabelas, resumos e índices de busca
+        database.create_tables(conn)
+        cursor = conn.cursor()
 
-    # Limpar tabelas existentes (opcional, para recomeçar com dados novos)
-    cursor.execute("DELETE FROM lancamentos")
-    cursor.execute("DELETE FROM orcamentos")
-    cursor.execute("DELETE FROM projetos")
-    cursor.execute("DELETE FROM fornecedores")
-    conn.commit()
+        # Limpar tabelas existentes (opcional, para recomeçar com dados novos)
+        cursor.execute("DELETE FROM lancamentos")
+        cursor.execute("DELETE FROM orcamentos")
+        cursor.execute("DELETE FROM projetos")
+        cursor.execute("DELETE FROM fornecedores")
+        database.commit_escrita(conn, 'lancamentos', 'orcamentos', 'projetos', 'fornecedores')
+
+        # Criar fornecedores genéricos
+        fornecedores_ids = []
+        for i in range(5):
+            _salvar(database.salvar_fornecedor, conn, f"Fornecedor {i+1}", f"CNPJ{i+1}", f"1111-111{i}", f"email{i}@email.com", f"Endereço {i+1}")
+            fornecedores_ids.append(conn.execute("SELECT MAX(id) FROM fornecedores").fetchone()[0])
+
+        # Criar projetos
+        projetos_data = [
+            {"nome": "Projeto Alfa (Concluindo)", "inicio": datetime(2024, 10, 1), "duracao_meses": 6},
+            {"nome": "Projeto Beta (Em Andamento)", "inicio": datetime(2025, 1, 1), "duracao_meses": 4},
+            {"nome": "Projeto Gama (Início)", "inicio": datetime(2025, 4, 1), "duracao_meses": 1},
+        ]
+
+        projetos_ids = []
+        for proj in projetos_data:
+            fim = proj["inicio"] + timedelta(days=proj["duracao_meses"] * 30)
+            _salvar(database.salvar_projeto, conn, proj["nome"], "Descrição do projeto", proj["inicio"].date(), fim.date())
+            projetos_ids.append(conn.execute("SELECT MAX(id) FROM projetos").fetchone()[0])
+
+        categorias_orcamento = ["Aluminio", "Material", "Pintura", "Vidros", "Beneficiamento", "Projetos", "Adiantamentos", "Instalacao"]
+
+        # Gerar orçamentos aleatórios
+        for projeto_id in projetos_ids:
+            for categoria in categorias_orcamento:
+                valor_orcado = round(random.uniform(5000, 50000), 2)
+                _salvar(database.salvar_orcamento, conn, projeto_id, categoria, valor_orcado)
 
-    # Criar fornecedores genéricos
-    for i in range(5):
-        database.salvar_fornecedor(conn, f"Fornecedor {i+1}", f"CNPJ{i+1}", f"1111-111{i}", f"email{i}@email.com", f"Endereço {i+1}")
+        # Gerar lançamentos aleatórios
+        for projeto_id in projetos_ids:
+            projeto_info = next(p for i, p in enumerate(projetos_data) if i == projetos_ids.index(projeto_id))
+            data_inicio = projeto_info["inicio"]
+            data_fim = data_inicio + timedelta(days=projeto_info["duracao_meses"] * 30)
+            num_lancamentos = random.randint(20, 50)
+            for _ in range(num_lancamentos):
+                data_lancamento = gerar_data_aleatoria(data_inicio, data_fim).date()
+                classificacao = random.choice(categorias_orcamento)
+                fornecedor_id = random.choice(fornecedores_ids)
+                valor_faturado = round(random.uniform(100, 10000), 2)
+                _salvar(database.salvar_lancamento, conn, projeto_id, data_lancamento, classificacao, data_lancamento, f"DOC{random.randint(100, 999)}", fornecedor_id, f"Despesa com {classificacao}", valor_faturado)
 
-    # Criar projetos
-    projetos_data = [
-        {"nome": "Projeto Alfa (Concluindo)", "inicio": datetime(2024, 10, 1), "duracao_meses": 6},
-        {"nome": "Projeto Beta (Em Andamento)", "inicio": datetime(2025, 1, 1), "duracao_meses": 4},
-        {"nome": "Projeto Gama (Início)", "inicio": datetime(2025, 4, 1), "duracao_meses": 1},
+    finally:
+        conn.close()
+    print("Banco de dados populado com dados de teste.")
+
+CATEGORIAS = ["Aluminio", "Material", "Pintura", "Vidros", "Beneficiamento", "Projetos", "Adiantamentos", "Instalacao"]
+# Participação típica de cada categoria no número de lançamentos de uma obra
+PESOS_CATEGORIAS = [0.22, 0.25, 0.08, 0.12, 0.10, 0.05, 0.06, 0.12]
+LOTE_GERACAO = 100_000
+INICIO_PERIODO = np.datetime64('2019-01-01')
+DIAS_PERIODO = 7 * 365
+
+def _gerar_fornecedores(num_fornecedores):
+    ids = np.arange(1, num_fornecedores + 1)
+    return [
+        (int(i), f"Fornecedor {i:05d}", f"{i // 1000000:02d}.{i // 1000 % 1000:03d}.{i % 1000:03d}/0001-{i % 97:02d}",
+         f"(11) 3{i % 10000:04d}-{i % 9973:04d}", f"contato{i}@fornecedor{i}.com.br", f"Rua {i}, São Paulo - SP")
+        for i in ids
     ]
 
-    projetos_ids = []
-    for proj in projetos_data:
-        fim = proj["inicio"] + timedelta(days=proj["duracao_meses"] * 30)
-        database.salvar_projeto(conn, proj["nome"], "Descrição do projeto", proj["inicio"].date(), fim.date())
-        projetos_ids.append(cursor.lastrowid)
-
-    categorias_orcamento = ["Aluminio", "Material", "Pintura", "Vidros", "Beneficiamento", "Projetos", "Adiantamentos", "Instalacao"]
-
-    # Gerar orçamentos aleatórios
-    for projeto_id in projetos_ids:
-        for categoria in categorias_orcamento:
-            valor_orcado = round(random.uniform(5000, 50000), 2)
-            database.salvar_orcamento(conn, projeto_id, categoria, valor_orcado)
-
-    # Gerar lançamentos aleatórios
-    for projeto_id in projetos_ids:
-        projeto_info = next(p for i, p in enumerate(projetos_data) if i == projetos_ids.index(projeto_id))
-        data_inicio = projeto_info["inicio"]
-        data_fim = data_inicio + timedelta(days=projeto_info["duracao_meses"] * 30)
-        num_lancamentos = random.randint(20, 50)
-        for _ in range(num_lancamentos):
-            data_lancamento = gerar_data_aleatoria(data_inicio, data_fim).date()
-            classificacao = random.choice(categorias_orcamento)
-            fornecedor_id = random.randint(1, 5)
-            valor_faturado = round(random.uniform(100, 10000), 2)
-            database.salvar_lancamento(conn, projeto_id, data_lancamento, classificacao, data_lancamento, f"DOC{random.randint(100, 999)}", fornecedor_id, f"Despesa com {classificacao}", valor_faturado)
+def _gerar_projetos(rng, num_projetos):
+    """Gera projetos com início espalhado no período e duração entre 1 e 24 meses."""
+    inicio = INICIO_PERIODO + rng.integers(0, DIAS_PERIODO - 30, num_projetos).astype('timedelta64[D]')
+    duracao = np.clip(rng.lognormal(np.log(180), 0.6, num_projetos), 30, 730).astype('int64')
+    fim = inicio + duracao.astype('timedelta64[D]')
+    # Obras maiores recebem mais lançamentos (e orçamentos maiores)
+    porte = rng.lognormal(0, 0.8, num_projetos)
+    return inicio, duracao, fim, porte
+
+def _inserir(conn, sql, registros, lote):
+    for inicio in range(0, len(registros), lote):
+        conn.executemany(sql, registros[inicio:inicio + lote])
+        conn.commit()
+
+def gerar_dados(conn, num_projetos=50, num_fornecedores=500, num_lancamentos=100_000, semente=42):
+    """Substitui o conteúdo do banco por um conjunto sintético reprodutível.
+
+    Os dados dependem apenas da semente e das quantidades: fornecedores seguem uma
+    distribuição de Zipf (poucos concentram a maior parte das notas), os lançamentos
+    se concentram no meio de cada obra e obras maiores recebem mais lançamentos.
+    Índices, triggers de resumo e índices de busca são recriados ao final, de uma vez só.
+    Retorna um dicionário com as quantidades geradas.
+    """
+    rng = np.random.default_rng(semente)
+    database.create_tables(conn)
 
+    # Carga em massa: sem triggers nem índices secundários durante os inserts
+    for trigger in [*database.TRIGGERS_AGREGADOS, *database.TRIGGERS_BUSCA]:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    for indice in database.INDICES:
+        conn.execute(f"DROP INDEX IF EXISTS {indice}")
+    for tabela in ["lancamentos", "orcamentos", "projetos", "fornecedores", *database.TABELAS_AGREGADOS]:
+        conn.execute(f"DELETE FROM {tabela}")
+    conn.execute("DELETE FROM sqlite_sequence")
+    conn.commit()
+
+    _inserir(
+        conn,
+        "INSERT INTO fornecedores (id, nome, cnpj, telefone, email, endereco) VALUES (?, ?, ?, ?, ?, ?)",
+        _gerar_fornecedores(num_fornecedores),
+        LOTE_GERACAO
+    )
+
+    inicio, duracao, fim, porte = _gerar_projetos(rng, num_projetos)
+    datas_inicio = pd.DatetimeIndex(inicio).strftime('%Y-%m-%d')
+    datas_fim = pd.DatetimeIndex(fim).strftime('%Y-%m-%d')
+    _inserir(
+        conn,
+        "INSERT INTO projetos (id, nome, descricao, data_inicio, data_fim_prevista) VALUES (?, ?, ?, ?, ?)",
+        [(i + 1, f"Projeto {i + 1:04d}", "Projeto sintético", datas_inicio[i], datas_fim[i]) for i in range(num_projetos)],
+        LOTE_GERACAO
+    )
+
+    valores_orcados = np.round(rng.uniform(5000, 50000, (num_projetos, len(CATEGORIAS))) * porte[:, None], 2)
+    _inserir(
+        conn,
+        "INSERT INTO orcamentos (projeto_id, categoria, valor_orcado) VALUES (?, ?, ?)",
+        [(p + 1, categoria, float(valores_orcados[p, c])) for p in range(num_projetos) for c, categoria in enumerate(CATEGORIAS)],
+        LOTE_GERACAO
+    )
+
+    pesos_projetos = porte * duracao / (porte * duracao).sum()
+    pesos_fornecedores = 1.0 / np.arange(1, num_fornecedores + 1) ** 1.1
+    pesos_fornecedores /= pesos_fornecedores.sum()
+    categorias = np.array(CATEGORIAS)
+    sql_lancamento = "INSERT INTO lancamentos (id, projeto_id, data_lancamento, classificacao, emissao, documento, fornecedor_id, descricao, valor_faturado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+    for inicio_lote in range(0, num_lancamentos, LOTE_GERACAO):
+        # Um gerador por lote, derivado da semente: o resultado não depende do tamanho do lote anterior
+        rng_lote = np.random.default_rng([semente, inicio_lote])
+        n = min(LOTE_GERACAO, num_lancamentos - inicio_lote)
+        projeto = rng_lote.choice(num_projetos, n, p=pesos_projetos)
+        fornecedor = rng_lote.choice(num_fornecedores, n, p=pesos_fornecedores) + 1
+        classificacao = categorias[rng_lote.choice(len(CATEGORIAS), n, p=PESOS_CATEGORIAS)]
+        # Gastos concentrados no meio da obra (distribuição beta)
+        deslocamento = (rng_lote.beta(2, 2, n) * duracao[projeto]).astype('int64')
+        data_lancamento = inicio[projeto] + deslocamento.astype('timedelta64[D]')
+        emissao = data_lancamento - rng_lote.integers(0, 30, n).astype('timedelta64[D]')
+        valor = np.round(rng_lote.lognormal(np.log(1500), 1.0, n), 2)
+        ids = np.arange(inicio_lote + 1, inicio_lote + n + 1)
+        documento = np.char.add('NF', ids.astype(str))
+        registros = list(zip(
+            ids.tolist(),
+            (projeto + 1).tolist(),
+            pd.DatetimeIndex(data_lancamento).strftime('%Y-%m-%d').tolist(),
+            classificacao.tolist(),
+            pd.DatetimeIndex(emissao).strftime('%Y-%m-%d').tolist(),
+            documento.tolist(),
+            fornecedor.tolist(),
+            np.char.add('Despesa com ', classificacao).tolist(),
+            valor.tolist(),
+        ))
+        _inserir(conn, sql_lancamento, registros, LOTE_GERACAO)
+
+    # Recria índices e triggers e recalcula os resumos a partir dos lançamentos
+    database.migrar(conn, reaplicar=True)
+    database.reconstruir_agregados(conn)
+    database.reconstruir_busca(conn)
+    database.commit_escrita(conn, 'fornecedores', 'projetos', 'orcamentos', 'lancamentos')
+    return {
+        'projetos': num_projetos,
+        'fornecedores': num_fornecedores,
+        'orcamentos': num_projetos * len(CATEGORIAS),
+        'lancamentos': num_lancamentos,
+        'semente': semente,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Popula o banco com dados de teste.")
+    subparsers = parser.add_subparsers(dest='comando')
+    gerar = subparsers.add_parser('gerar', help="Gera um conjunto sintético reprodutível, em qualquer escala.")
+    gerar.add_argument('--banco', default=DATABASE_NAME, help="Arquivo SQLite de destino (o conteúdo é substituído).")
+    gerar.add_argument('--projetos', type=int, default=50)
+    gerar.add_argument('--fornecedores', type=int, default=500)
+    gerar.add_argument('--lancamentos', type=int, default=100_000)
+    gerar.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.comando != 'gerar':
+        try:
+            popular_banco()
+        except sqlite3.Error as e:
+            print(f"Erro ao popular o banco: {e}")
+            return 1
+        return 0
+
+    database.DATABASE_NAME = args.banco
+    conn = database.create_connection()
+    inicio = datetime.now()
+    resumo = gerar_dados(conn, args.projetos, args.fornecedores, args.lancamentos, args.semente)
     conn.close()
-    print("Banco de dados populado com dados de teste.")
+    segundos = (datetime.now() - inicio).total_seconds()
+    print(f"Banco '{args.banco}' gerado em {segundos:.1f}s: " + ", ".join(f"{k}={v}" for k, v in resumo.items()))
+    return 0
 
 if __name__ == "__main__":
-    popular_banco()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
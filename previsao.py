@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Meses mais recentes usados para medir o ritmo de gasto (burn rate)
+JANELA_MESES = 3
+
+SITUACAO_SEM_ORCAMENTO = 'Sem orçamento'
+SITUACAO_ESTOURADO = 'Estourado'
+SITUACAO_ESTOURO_PREVISTO = 'Estouro previsto'
+SITUACAO_DENTRO = 'Dentro do orçamento'
+
+def _meses(mes):
+    """Converte 'AAAA-MM' (ou datas) em meses desde 1970, para comparar e subtrair como inteiros."""
+    return np.asarray(mes, dtype='datetime64[M]').astype('int64')
+
+def _projetar(df, data_referencia):
+    """Calcula saldo, ritmo, data de estouro e gasto previsto no fim, coluna a coluna.
+
+    `df` precisa de valor_orcado, gasto_acumulado, gasto_janela, dias_janela e
+    data_fim_prevista; serve tanto para projeto x categoria quanto para o projeto inteiro.
+    """
+    orcado = df['valor_orcado'].to_numpy(dtype=float)
+    gasto = df['gasto_acumulado'].to_numpy(dtype=float)
+    ritmo = df['gasto_janela'].to_numpy(dtype=float) / df['dias_janela'].to_numpy(dtype=float)
+    saldo = orcado - gasto
+    dias_restantes = np.clip((df['data_fim_prevista'] - data_referencia).dt.days.to_numpy(dtype=float), 0, None)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dias_ate_estouro = np.where((ritmo > 0) & (saldo > 0), np.ceil(saldo / ritmo), np.nan)
+        percentual = np.where(orcado > 0, gasto / orcado, np.nan)
+    data_estouro = data_referencia + pd.to_timedelta(dias_ate_estouro, unit='D')
+    # Ritmo constante até a data prevista de fim (sem data de fim, projeta só o gasto atual)
+    gasto_previsto = gasto + ritmo * np.nan_to_num(dias_restantes)
+
+    resultado = df.assign(
+        saldo=saldo,
+        percentual_consumido=percentual,
+        ritmo_diario=ritmo,
+        data_estouro_prevista=data_estouro,
+        gasto_previsto_fim=gasto_previsto,
+    )
+    resultado['situacao'] = np.select(
+        [
+            orcado <= 0,
+            saldo < 0,
+            np.asarray(resultado['data_estouro_prevista'] <= resultado['data_fim_prevista']),
+        ],
+        [SITUACAO_SEM_ORCAMENTO, SITUACAO_ESTOURADO, SITUACAO_ESTOURO_PREVISTO],
+        default=SITUACAO_DENTRO,
+    )
+    return resultado
+
+def calcular_previsao(projetos, orcamentos, gastos_mensais, data_referencia=None, janela_meses=JANELA_MESES):
+    """Projeta, para todos os projetos de uma vez, quando cada categoria vai estourar o orçamento.
+
+    Entradas (de database.get_dados_previsao): projetos (id, nome, data_inicio,
+    data_fim_prevista), orcamentos (projeto_id, categoria, valor_orcado) e
+    gastos_mensais (projeto_id, classificacao, mes, total_gasto).
+    O ritmo de gasto é a média diária dos últimos `janela_meses` meses até
+    `data_referencia` (hoje, por padrão), contada a partir do início do projeto
+    se ele for mais recente que a janela.
+    Retorna (por_categoria, por_projeto); ambos têm gasto acumulado, saldo,
+    ritmo diário, data prevista de estouro, gasto previsto no fim e situação.
+    """
+    data_referencia = pd.Timestamp(data_referencia or pd.Timestamp.today()).normalize()
+    mes_referencia = int(_meses(data_referencia.to_datetime64()))
+
+    gastos = gastos_mensais.assign(mes=_meses(gastos_mensais['mes']))
+    gastos = gastos[gastos['mes'] <= mes_referencia]
+    na_janela = gastos['mes'] > mes_referencia - janela_meses
+    gastos = gastos.assign(gasto_janela=gastos['total_gasto'].where(na_janela, 0.0))
+    chave = ['projeto_id', 'categoria']
+    gasto_por_categoria = (
+        gastos.rename(columns={'classificacao': 'categoria', 'total_gasto': 'gasto_acumulado'})
+        .astype({'categoria': str})
+        .groupby(chave, as_index=False)[['gasto_acumulado', 'gasto_janela']].sum()
+    )
+
+    # Dias da janela: do 1º dia do mês mais antigo da janela (ou do início do projeto) até a referência
+    inicio_janela = pd.Timestamp(np.datetime64(mes_referencia - janela_meses + 1, 'M'))
+    projetos = projetos.rename(columns={'id': 'projeto_id', 'nome': 'projeto'})
+    inicio = projetos['data_inicio'].where(projetos['data_inicio'] > inicio_janela, inicio_janela)
+    projetos = projetos.assign(dias_janela=np.clip((data_referencia - inicio).dt.days.to_numpy(dtype=float) + 1, 1, None))
+
+    valores = ['valor_orcado', 'gasto_acumulado', 'gasto_janela']
+    por_categoria = (
+        orcamentos.astype({'categoria': str})[chave + ['valor_orcado']]
+        .merge(gasto_por_categoria, on=chave, how='outer')
+        .fillna({coluna: 0.0 for coluna in valores})
+        .merge(projetos, on='projeto_id', how='inner')
+    )
+    # Projetos sem orçamento nem gasto também entram na carteira, zerados
+    por_projeto = projetos.merge(
+        por_categoria.groupby('projeto_id', as_index=False)[valores].sum(), on='projeto_id', how='left'
+    ).fillna({coluna: 0.0 for coluna in valores})
+    return (
+        _projetar(por_categoria, data_referencia).sort_values(chave, ignore_index=True),
+        _projetar(por_projeto, data_referencia).sort_values('projeto_id', ignore_index=True),
+    )
+
+def curvas_gasto_acumulado(gastos_mensais, projeto_ids=None):
+    """Gasto acumulado mês a mês de cada projeto (projeto_id, mes, gasto_acumulado)."""
+    if projeto_ids is not None:
+        gastos_mensais = gastos_mensais[gastos_mensais['projeto_id'].isin(projeto_ids)]
+    por_mes = gastos_mensais.groupby(['projeto_id', 'mes'], as_index=False)['total_gasto'].sum()
+    por_mes['gasto_acumulado'] = por_mes.groupby('projeto_id')['total_gasto'].cumsum()
+    return por_mes[['projeto_id', 'mes', 'gasto_acumulado']]
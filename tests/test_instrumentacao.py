@@ -0,0 +1,37 @@
+from datetime import date
+import pytest
+import database
+import instrumentacao
+
+@pytest.fixture
+def banco_temporario(tmp_path, monkeypatch):
+    """Pool e fila de escrita do processo apontando para um banco novo, fechados ao final."""
+    monkeypatch.setattr(database, 'DATABASE_NAME', str(tmp_path / 'obra_controle.db'))
+    monkeypatch.setattr(database, '_pool', None)
+    monkeypatch.setattr(database, '_fila_escrita', None)
+    yield
+    database.get_fila_escrita().fechar()
+    database.get_pool().fechar()
+
+@pytest.fixture
+def instrumentacao_ativa():
+    instrumentacao.limpar_estatisticas()
+    instrumentacao.ativar(arquivo_lentas=None)
+    yield
+    instrumentacao.desativar()
+    instrumentacao.limpar_estatisticas()
+
+def test_gravar_pela_fila_entra_nas_estatisticas(banco_temporario, instrumentacao_ativa):
+    projeto_id = database.gravar(database.salvar_projeto, "Projeto Teste", "", date(2024, 1, 1), date(2024, 12, 31))
+    database.gravar(database.salvar_orcamentos, projeto_id, {'Material': 1000.0, 'Aluminio': 500.0})
+    database.gravar(database.salvar_lancamento, projeto_id, date(2024, 2, 1), 'Material', None, 'NF1', None, "Compra", 250.0)
+
+    estatisticas = instrumentacao.estatisticas()
+    for nome in ('salvar_projeto', 'salvar_orcamentos', 'salvar_lancamento'):
+        assert estatisticas[f'database.{nome}']['chamadas'] == 1
+
+def test_chamada_direta_conta_uma_vez(banco_temporario, instrumentacao_ativa):
+    with database.conexao_escrita() as conn:
+        assert database.salvar_projeto(conn, "Projeto Direto", "", date(2024, 1, 1), date(2024, 12, 31))
+
+    assert instrumentacao.estatisticas()['database.salvar_projeto']['chamadas'] == 1
@@ -0,0 +1,167 @@
+import argparse
+import inspect
+import re
+import sqlite3
+import sys
+from datetime import date
+import database
+
+# Tabelas de cadastro que algumas consultas listam por inteiro (ex.: selectbox de projetos)
+# e tabelas de resumo, cujo tamanho é o número de grupos: varrê-las é o próprio objetivo
+# da consulta, então não contam como regressão. versoes_tabelas tem uma linha por tabela.
+SCANS_PERMITIDOS = {'projetos', 'fornecedores', 'versoes_tabelas'} | set(database.TABELAS_AGREGADOS)
+# Configuração interna do FTS5 (poucas linhas), lida pelo próprio SQLite ao abrir o índice de busca
+SCANS_PERMITIDOS |= {f'{tabela}_config' for tabela in database.TABELAS_BUSCA}
+# Com o histórico, as consultas da carteira inteira leem orçamentos pela view, cujas partes não
+# têm ordem para aproveitar o índice; são no máximo uma linha por categoria de cada projeto
+SCANS_PERMITIDOS_HISTORICO = SCANS_PERMITIDOS | {'orcamentos'}
+
+PADRAO_SCAN = re.compile(r'^SCAN (?:\w+\.)?(\w+)$')
+PADRAO_TABELA = re.compile(r'\b(?:FROM|JOIN)\s+(?:\w+\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+# Resultado de view ou subconsulta calculado à parte: o "SCAN x" seguinte lê esse resultado
+PADRAO_COROTINA = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\w+)$')
+# Alias de subconsulta no FROM (ex.: "FROM (SELECT ... LIMIT 20) b"): o plano mostra "SCAN b",
+# a leitura do resultado já calculado, e não de uma tabela
+PADRAO_SUBCONSULTA = re.compile(r'\)\s+(?:AS\s+)?(\w+)\s+(?:JOIN|LEFT|INNER|CROSS|WHERE|GROUP|ORDER)\b', re.IGNORECASE)
+PALAVRAS_RESERVADAS = {'WHERE', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'ON', 'GROUP', 'ORDER', 'LIMIT', 'UNION', 'USING'}
+
+def _tabelas_por_alias(sql):
+    """Mapeia os aliases usados no SQL para o nome real da tabela (o plano mostra só o alias)."""
+    tabelas = {}
+    for tabela, alias in PADRAO_TABELA.findall(sql):
+        tabelas[tabela] = tabela
+        if alias and alias.upper() not in PALAVRAS_RESERVADAS:
+            tabelas[alias] = tabela
+    return tabelas
+
+def valores_exemplo(conn):
+    """Retorna valores reais do banco para preencher os parâmetros das funções `get_*`.
+
+    Usa o projeto, a classificação e o fornecedor com mais lançamentos, o pior caso para as
+    consultas. Só contam lançamentos de projetos e fornecedores cadastrados: o banco pode ter
+    lançamentos órfãos (ex.: projeto_id = 0), que nenhuma tela consulta.
+    """
+    projeto = conn.execute(
+        "SELECT p.id FROM projetos p JOIN lancamentos l ON l.projeto_id = p.id GROUP BY p.id ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone() or conn.execute("SELECT id FROM projetos LIMIT 1").fetchone()
+    classificacao = conn.execute(
+        "SELECT l.classificacao FROM lancamentos l JOIN projetos p ON p.id = l.projeto_id GROUP BY l.classificacao ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()
+    projeto_id = projeto[0] if projeto else 1
+    fornecedor = conn.execute(
+        "SELECT f.id FROM fornecedores f JOIN gastos_fornecedor g ON g.fornecedor_id = f.id ORDER BY g.quantidade DESC LIMIT 1"
+    ).fetchone()
+    ultimo = conn.execute(
+        "SELECT data_lancamento, id FROM lancamentos WHERE projeto_id = ? ORDER BY data_lancamento DESC, id DESC LIMIT 1",
+        (projeto_id,)
+    ).fetchone()
+    return {
+        'projeto_id': projeto_id,
+        'classificacao': classificacao[0] if classificacao else 'Material',
+        'fornecedor_id': fornecedor[0] if fornecedor else 1,
+        'apos': tuple(ultimo) if ultimo else ('9999-12-31', 0),
+        'data_inicio': date(2000, 1, 1),
+        'data_fim': date(2100, 12, 31),
+        'texto': 'a',  # prefixo de uma letra: o maior número de termos do índice de busca
+        'incluir_historico': True,  # consultas sobre as views que juntam o banco histórico
+    }
+
+def funcoes_consulta():
+    """Lista as funções de leitura de database.py (as `get_*` que recebem uma conexão)."""
+    funcoes = []
+    for nome, funcao in inspect.getmembers(database, inspect.isfunction):
+        if not nome.startswith('get_') or funcao.__module__ != database.__name__:
+            continue
+        parametros = list(inspect.signature(funcao).parameters)
+        if parametros and parametros[0] == 'conn':
+            # Chama a função original: uma resposta do cache não executaria SQL algum
+            funcoes.append((nome, getattr(funcao, '__wrapped__', funcao)))
+    return funcoes
+
+def chamadas_exemplo(funcao, exemplos):
+    """Gera os conjuntos de argumentos com que cada função é exercitada.
+
+    Parâmetros opcionais são testados com o valor padrão e com um valor de exemplo,
+    pois costumam mudar o WHERE da consulta.
+    """
+    obrigatorios = {}
+    opcionais = {}
+    for nome, parametro in list(inspect.signature(funcao).parameters.items())[1:]:
+        if parametro.default is inspect.Parameter.empty:
+            if nome not in exemplos:
+                raise KeyError(f"Sem valor de exemplo para o parâmetro '{nome}' de {funcao.__name__}")
+            obrigatorios[nome] = exemplos[nome]
+        elif nome in exemplos:
+            opcionais[nome] = exemplos[nome]
+    yield obrigatorios
+    if opcionais:
+        yield {**obrigatorios, **opcionais}
+
+def verificar_planos_consulta(conn):
+    """Executa EXPLAIN QUERY PLAN em todas as consultas de database.py.
+
+    Retorna uma lista de problemas (função, SQL e detalhe do plano) para cada
+    consulta que faz varredura completa de uma tabela sem usar índice.
+    """
+    exemplos = valores_exemplo(conn)
+    problemas = []
+    for nome, funcao in funcoes_consulta():
+        for kwargs in chamadas_exemplo(funcao, exemplos):
+            consultas = []
+            conn.set_trace_callback(consultas.append)
+            try:
+                funcao(conn, **kwargs)
+            finally:
+                conn.set_trace_callback(None)
+            # O plano com o histórico é o das views: elas precisam estar criadas no EXPLAIN
+            with database.historico_anexado(conn, kwargs.get('incluir_historico', False)) as anexado:
+                permitidos = SCANS_PERMITIDOS_HISTORICO if anexado else SCANS_PERMITIDOS
+                views = [linha[0] for linha in conn.execute("SELECT sql FROM sqlite_temp_master WHERE type = 'view'")]
+                for sql in dict.fromkeys(consultas):
+                    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                        continue
+                    tabelas = {}
+                    for texto in views + [sql]:
+                        tabelas.update(_tabelas_por_alias(texto))
+                    subconsultas = set(PADRAO_SUBCONSULTA.findall(sql))
+                    plano = [linha[3] for linha in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+                    subconsultas.update(m.group(1) for m in map(PADRAO_COROTINA.match, plano) if m)
+                    for detalhe in plano:
+                        scan = PADRAO_SCAN.match(detalhe)
+                        if scan is None:
+                            continue
+                        if scan.group(1) in subconsultas:
+                            continue
+                        tabela = tabelas.get(scan.group(1), scan.group(1))
+                        if tabela not in permitidos:
+                            problema = {'funcao': nome, 'sql': ' '.join(sql.split()), 'detalhe': detalhe}
+                            if problema not in problemas:
+                                problemas.append(problema)
+    return problemas
+
+def main():
+    parser = argparse.ArgumentParser(description="Falha se alguma consulta de database.py fizer varredura completa de tabela.")
+    parser.add_argument('--banco', default=database.DATABASE_NAME, help="Arquivo SQLite a verificar (ex.: um gerado por 'populate.py gerar').")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.banco)
+    database.create_tables(conn)
+    # Sem lançamentos de projetos cadastrados os planos não refletem o uso real (o ANALYZE vê
+    # um único projeto_id e o planejador prefere varrer a tabela)
+    if not conn.execute("SELECT 1 FROM lancamentos l JOIN projetos p ON p.id = l.projeto_id LIMIT 1").fetchone():
+        conn.close()
+        print(f"{args.banco} não tem lançamentos de projetos cadastrados; gere um banco com 'python populate.py gerar --banco <arquivo>' e verifique-o.")
+        return 1
+    problemas = verificar_planos_consulta(conn)
+    conn.close()
+
+    for problema in problemas:
+        print(f"{problema['funcao']}: {problema['detalhe']}\n    {problema['sql']}")
+    if problemas:
+        print(f"{len(problemas)} consulta(s) com varredura completa de tabela.")
+        return 1
+    print("Nenhuma consulta faz varredura completa de tabela.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,105 @@
+import threading
+from collections import OrderedDict
 import plotly.graph_objects as go
 import pandas as pd
 
+# Acima de TOP_N barras, o restante é somado numa barra "Outros"
+TOP_N_PADRAO = 20
+ROTULO_OUTROS = 'Outros'
+# A partir deste número de pontos as séries temporais usam traces WebGL (Scattergl)
+LIMITE_WEBGL = 1000
+
+def agrupar_outros(df, coluna_rotulo, coluna_valor, top_n=TOP_N_PADRAO, rotulo_outros=ROTULO_OUTROS):
+    """Mantém as `top_n` maiores linhas e soma as demais numa linha `rotulo_outros`."""
+    if top_n is None or len(df) <= top_n:
+        return df
+    df_ordenado = df.sort_values(coluna_valor, ascending=False)
+    principais = df_ordenado.head(top_n)
+    outros = pd.DataFrame({coluna_rotulo: [f"{rotulo_outros} ({len(df) - top_n})"], coluna_valor: [df_ordenado[coluna_valor].iloc[top_n:].sum()]})
+    return pd.concat([principais[[coluna_rotulo, coluna_valor]], outros], ignore_index=True)
+
+def tamanho_figura(fig):
+    """Retorna o tamanho, em bytes, do JSON que a figura envia ao navegador."""
+    return len(fig.to_json().encode('utf-8'))
+
+# Limites do cache de figuras do Dashboard
+CACHE_FIGURAS_MAX_ENTRADAS = 128
+CACHE_FIGURAS_MAX_BYTES = 32 * 1024 * 1024  # 32 MB de JSON
+
+class CacheFiguras:
+    """Cache LRU de figuras prontas, por tipo de gráfico, parâmetros e versão dos dados.
+
+    Guarda a figura já construída (e não o JSON): reconstruir uma figura a partir do
+    JSON passa pela validação do plotly e custa mais que chamar a função plot_*.
+    O tamanho de cada entrada é o do JSON serializado, que é o que vai ao navegador.
+    As figuras devolvidas são compartilhadas entre sessões e não devem ser alteradas.
+    """
+
+    def __init__(self, max_entradas=CACHE_FIGURAS_MAX_ENTRADAS, max_bytes=CACHE_FIGURAS_MAX_BYTES):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # (tipo, parâmetros) -> (versão, figura, tamanho)
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._remocoes = 0
+
+    def obter(self, tipo, parametros, versao_dados, construir):
+        """Retorna a figura em cache ou chama `construir()` e guarda o resultado."""
+        if versao_dados is None:
+            return construir()
+        chave = (tipo, parametros)
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] == versao_dados:
+                self._entradas.move_to_end(chave)
+                self._hits += 1
+                return entrada[1]
+            self._misses += 1
+
+        fig = construir()
+        tamanho = tamanho_figura(fig)
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[2]
+            if tamanho <= self.max_bytes:
+                self._entradas[chave] = (versao_dados, fig, tamanho)
+                self._bytes += tamanho
+                while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                    _, (_, _, tamanho_removido) = self._entradas.popitem(last=False)
+                    self._bytes -= tamanho_removido
+                    self._remocoes += 1
+        return fig
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'remocoes': self._remocoes,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_entradas': self.max_entradas,
+                'max_bytes': self.max_bytes,
+            }
+
+_cache_figuras = CacheFiguras()
+
+def figura_cacheada(tipo, parametros, versao_dados, construir):
+    """Atalho para o cache de figuras do processo; `parametros` precisa ser hashable."""
+    return _cache_figuras.obter(tipo, parametros, versao_dados, construir)
+
+def estatisticas_cache_figuras():
+    """Retorna as estatísticas do cache de figuras."""
+    return _cache_figuras.estatisticas()
+
 def plot_comparativo_orcamento_gasto_projeto(df_comparativo):
     """Gera um gráfico de barras comparando o orçamento total e o gasto total por projeto."""
     fig = go.Figure(data=[
@@ -16,8 +115,9 @@ def plot_comparativo_orcamento_gasto_projeto(df_comparativo):
     )
     return fig
 
-def plot_gasto_por_classificacao(df_gasto_classificacao):
+def plot_gasto_por_classificacao(df_gasto_classificacao, top_n=TOP_N_PADRAO):
     """Gera um gráfico de barras horizontais mostrando o gasto por classificação."""
+    df_gasto_classificacao = agrupar_outros(df_gasto_classificacao, 'classificacao', 'total_gasto', top_n)
     fig = go.Figure(data=[go.Bar(
         x=df_gasto_classificacao['total_gasto'],
         y=df_gasto_classificacao['classificacao'],
@@ -30,8 +130,9 @@ def plot_gasto_por_classificacao(df_gasto_classificacao):
     )
     return fig
 
-def plot_gasto_por_fornecedor(df_gasto_fornecedor):
+def plot_gasto_por_fornecedor(df_gasto_fornecedor, top_n=TOP_N_PADRAO):
     """Gera um gráfico de barras horizontais mostrando o gasto por fornecedor."""
+    df_gasto_fornecedor = agrupar_outros(df_gasto_fornecedor, 'fornecedor', 'total_gasto', top_n)
     fig = go.Figure(data=[go.Bar(
         x=df_gasto_fornecedor['total_gasto'],
         y=df_gasto_fornecedor['fornecedor'],
@@ -44,17 +145,22 @@ def plot_gasto_por_fornecedor(df_gasto_fornecedor):
     )
     return fig
 
-def plot_gastos_mensais(df_gastos_mensais, orcamento_total, classificacao_filtrada=None):
-    """Gera um gráfico de barras verticais mostrando os gastos mensais e a linha de orçamento."""
+def plot_gastos_mensais(df_gastos_mensais, orcamento_total, classificacao_filtrada=None, limite_webgl=LIMITE_WEBGL):
+    """Gera um gráfico de barras verticais mostrando os gastos mensais e a linha de orçamento.
+
+    Séries com mais de `limite_webgl` pontos viram uma linha WebGL, bem mais leve que barras.
+    """
     fig = go.Figure()
-    fig.add_trace(go.Bar(
-        x=df_gastos_mensais['mes_ano'],
-        y=df_gastos_mensais['total_gasto'],
-        name='Gasto Mensal' + (f' ({classificacao_filtrada})' if classificacao_filtrada else '')
-    ))
+    nome_serie = 'Gasto Mensal' + (f' ({classificacao_filtrada})' if classificacao_filtrada else '')
+    if len(df_gastos_mensais) > limite_webgl:
+        fig.add_trace(go.Scattergl(x=df_gastos_mensais['mes_ano'], y=df_gastos_mensais['total_gasto'], mode='lines', name=nome_serie))
+    else:
+        fig.add_trace(go.Bar(x=df_gastos_mensais['mes_ano'], y=df_gastos_mensais['total_gasto'], name=nome_serie))
+    # Linha constante como shape (dois pontos), não um ponto por mês; o trace vazio só cria a legenda
+    fig.add_hline(y=orcamento_total, line=dict(color='red', dash='dash'))
     fig.add_trace(go.Scatter(
-        x=df_gastos_mensais['mes_ano'],
-        y=[orcamento_total] * len(df_gastos_mensais),
+        x=[None],
+        y=[None],
         mode='lines',
         name='Orçamento Total do Projeto',
         line=dict(color='red', dash='dash')
@@ -65,4 +171,56 @@ def plot_gastos_mensais(df_gastos_mensais, orcamento_total, classificacao_filtra
         yaxis_title='Valor Total (R$)',
         barmode='group'
     )
-    return fig
\ No newline at end of file
+    return fig
+
+def plot_previsao_projeto(curva, previsao_projeto, data_referencia):
+    """Gera o gráfico de gasto acumulado de um projeto com a projeção até o fim previsto.
+
+    `curva` vem de previsao.curvas_gasto_acumulado (um projeto) e `previsao_projeto` é a
+    linha do projeto em previsao.calcular_previsao.
+    """
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=pd.to_datetime(curva['mes']), y=curva['gasto_acumulado'], mode='lines+markers', name='Gasto Acumulado'))
+    fim_previsto = previsao_projeto['data_fim_prevista']
+    if pd.notna(fim_previsto) and fim_previsto > data_referencia:
+        fig.add_trace(go.Scatter(
+            x=[data_referencia, fim_previsto],
+            y=[previsao_projeto['gasto_acumulado'], previsao_projeto['gasto_previsto_fim']],
+            mode='lines',
+            name='Projeção no Ritmo Atual',
+            line=dict(dash='dot')
+        ))
+    fig.add_hline(y=previsao_projeto['valor_orcado'], line=dict(color='red', dash='dash'))
+    fig.add_trace(go.Scatter(x=[None], y=[None], mode='lines', name='Orçamento Total do Projeto', line=dict(color='red', dash='dash')))
+    if pd.notna(previsao_projeto['data_estouro_prevista']):
+        fig.add_vline(x=previsao_projeto['data_estouro_prevista'], line=dict(color='orange', dash='dot'))
+    fig.update_layout(
+        title='Gasto Acumulado e Projeção vs. Orçamento',
+        xaxis_title='Mês/Ano',
+        yaxis_title='Valor Total (R$)'
+    )
+    return fig
+
+
+def plot_matriz_orcamento(matriz, titulo, rotulo_valor, escala='RdYlGn_r', centro=None):
+    """Gera um mapa de calor projetos (linhas) x categorias (colunas) a partir de database.pivotar_matriz.
+
+    Um único trace Heatmap, leve mesmo com centenas de projetos; a altura cresce com o número de linhas.
+    """
+    fig = go.Figure(go.Heatmap(
+        z=matriz.to_numpy(),
+        x=list(matriz.columns),
+        y=list(matriz.index),
+        colorscale=escala,
+        zmid=centro,
+        colorbar=dict(title=rotulo_valor),
+        hovertemplate='%{y}<br>%{x}: %{z:,.2f}<extra></extra>'
+    ))
+    fig.update_layout(
+        title=titulo,
+        xaxis_title='Categoria',
+        yaxis_title='Projeto',
+        yaxis=dict(autorange='reversed'),
+        height=max(400, 20 * len(matriz) + 150)
+    )
+    return fig